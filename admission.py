@@ -0,0 +1,266 @@
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+from serialization import FastJSONResponse
+
+# Request classes, highest priority first
+CONTROL = "control"
+INGEST = "ingest"
+ANALYTICS = "analytics"
+REQUEST_CLASSES = (CONTROL, INGEST, ANALYTICS)
+
+# Rejection reasons; rate limits answer 429, overload 503
+REJECT_REASONS = ("device_rate", "class_rate", "global_rate", "concurrency", "overload")
+
+def classify(path: str) -> Optional[str]:
+    """Request class of a path, or None for endpoints that are never limited (/metrics, /, static files)"""
+    if path.startswith("/purifier/"):
+        # Control commands and status reads share the top priority
+        return CONTROL if path.endswith("/control") or path.endswith("/status") else ANALYTICS
+    if path in ("/purifiers/control", "/purifiers/status"):
+        return CONTROL
+    if path in ("/predict", "/predict/batch", "/ingest", "/ws"):
+        return INGEST
+    if path.startswith("/analytics/") or path.startswith("/debug/"):
+        return ANALYTICS
+    return None
+
+class TokenBucket:
+    """Refills `rate` tokens per second up to `burst`; a rate of 0 never limits"""
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self, now: float) -> bool:
+        if not self.rate:
+            return True
+        self._refill(now)
+        return self.tokens >= 1.0
+
+    def take(self):
+        if self.rate:
+            self.tokens -= 1.0
+
+    def wait_seconds(self) -> float:
+        """Time until the next token"""
+        return max(0.0, (1.0 - self.tokens) / self.rate) if self.rate else 0.0
+
+class DeviceBuckets:
+    """Per-device token buckets, keeping the most recently seen `maxsize` devices"""
+    def __init__(self, rate: float, burst: float, maxsize: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    def get(self, key: str) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def __len__(self):
+        return len(self._buckets)
+
+class ClassLimits:
+    """Limits of one request class
+
+    `rate`/`burst` bound its requests per second (0: unlimited), `concurrency`
+    its requests in flight (0: unlimited) and `share` the fraction of the
+    global in-flight cap it may still be admitted under: low-priority classes
+    are shed first, leaving headroom for control commands.
+    """
+    def __init__(self, rate: float = 0.0, burst: float = 0.0, concurrency: int = 0, share: float = 1.0):
+        self.rate = rate
+        self.burst = burst or max(rate, 1.0)
+        self.concurrency = concurrency
+        self.share = share
+
+class Decision:
+    __slots__ = ("admitted", "status", "reason", "retry_after", "degraded")
+
+    def __init__(self, admitted: bool, status: int = 200, reason: Optional[str] = None,
+                 retry_after: float = 0.0, degraded: bool = False):
+        self.admitted = admitted
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+        self.degraded = degraded
+
+class AdmissionController:
+    """Token-bucket rate limits and priority-aware concurrency caps
+
+    Checks run in order of cost to the caller: the global in-flight cap
+    scaled by the class share (503), the class concurrency cap (503), then
+    the device, class and global token buckets (429). Control requests are
+    exempt from the global bucket so analytics or ingest floods cannot use
+    up their budget. Analytics admitted while the server or the analytics
+    class is past `degrade_share` of its in-flight cap are flagged as
+    degraded, so handlers can answer with a cheaper response instead of
+    being rejected outright.
+    """
+    def __init__(self, limits: Dict[str, ClassLimits], max_in_flight: int = 64,
+                 global_rate: float = 0.0, global_burst: float = 0.0,
+                 device_rate: float = 0.0, device_burst: float = 0.0,
+                 degrade_share: float = 0.5, max_devices: int = 10000):
+        self.limits = {name: limits.get(name, ClassLimits()) for name in REQUEST_CLASSES}
+        self.max_in_flight = max_in_flight
+        self.degrade_share = degrade_share
+        self.global_bucket = TokenBucket(global_rate, global_burst or max(global_rate, 1.0))
+        self.class_buckets = {name: TokenBucket(limit.rate, limit.burst) for name, limit in self.limits.items()}
+        self.device_buckets = DeviceBuckets(device_rate, device_burst or max(device_rate, 1.0), max_devices)
+        self.in_flight = {name: 0 for name in REQUEST_CLASSES}
+        self.total_in_flight = 0
+        self.admitted = {name: 0 for name in REQUEST_CLASSES}
+        self.degraded = {name: 0 for name in REQUEST_CLASSES}
+        self.rejected: Dict[Tuple[str, str], int] = {
+            (name, reason): 0 for name in REQUEST_CLASSES for reason in REJECT_REASONS
+        }
+
+    def _reject(self, request_class: str, reason: str, status: int, retry_after: float) -> Decision:
+        self.rejected[(request_class, reason)] += 1
+        return Decision(False, status, reason, retry_after)
+
+    def admit(self, request_class: str, device_key: Optional[str] = None) -> Decision:
+        """Admit or reject one request; every admitted request must be released"""
+        limits = self.limits[request_class]
+        if self.max_in_flight and self.total_in_flight >= self.max_in_flight * limits.share:
+            return self._reject(request_class, "overload", 503, 1.0)
+        if limits.concurrency and self.in_flight[request_class] >= limits.concurrency:
+            return self._reject(request_class, "concurrency", 503, 1.0)
+
+        now = time.monotonic()
+        buckets = []
+        if device_key is not None and self.device_buckets.rate:
+            buckets.append(("device_rate", self.device_buckets.get(device_key)))
+        buckets.append(("class_rate", self.class_buckets[request_class]))
+        if request_class != CONTROL:
+            buckets.append(("global_rate", self.global_bucket))
+        # Only spend tokens once every bucket has one, so a rejection costs nothing
+        for reason, bucket in buckets:
+            if not bucket.available(now):
+                return self._reject(request_class, reason, 429, bucket.wait_seconds())
+        for _, bucket in buckets:
+            bucket.take()
+
+        degraded = request_class == ANALYTICS and (
+            (self.max_in_flight and self.total_in_flight >= self.max_in_flight * self.degrade_share) or
+            (limits.concurrency and self.in_flight[request_class] >= limits.concurrency * self.degrade_share)
+        )
+        self.in_flight[request_class] += 1
+        self.total_in_flight += 1
+        self.admitted[request_class] += 1
+        if degraded:
+            self.degraded[request_class] += 1
+        return Decision(True, degraded=bool(degraded))
+
+    def release(self, request_class: str):
+        self.in_flight[request_class] -= 1
+        self.total_in_flight -= 1
+
+    def stats(self) -> Dict:
+        return {
+            "in_flight": dict(self.in_flight),
+            "total_in_flight": self.total_in_flight,
+            "max_in_flight": self.max_in_flight,
+            "admitted": dict(self.admitted),
+            "degraded": dict(self.degraded),
+            "rejected": {name: {reason: self.rejected[(name, reason)] for reason in REJECT_REASONS}
+                         for name in REQUEST_CLASSES},
+            "tracked_devices": len(self.device_buckets)
+        }
+
+# Class defaults: (concurrency, share of the global in-flight cap)
+DEFAULT_CLASS_LIMITS = {CONTROL: (0, 1.0), INGEST: (0, 0.9), ANALYTICS: (4, 0.5)}
+
+def controller_from_env() -> AdmissionController:
+    """Controller configured from ADMISSION_* variables
+
+    Global: ADMISSION_MAX_IN_FLIGHT, ADMISSION_GLOBAL_RATE/BURST,
+    ADMISSION_DEVICE_RATE/BURST and ADMISSION_DEGRADE_SHARE. Per class
+    (CONTROL, INGEST, ANALYTICS): ADMISSION_<CLASS>_RATE, _BURST,
+    _CONCURRENCY and _SHARE. Rates are requests per second; 0 disables a limit.
+    """
+    limits = {}
+    for name, (concurrency, share) in DEFAULT_CLASS_LIMITS.items():
+        prefix = f"ADMISSION_{name.upper()}_"
+        limits[name] = ClassLimits(
+            rate=float(os.getenv(prefix + "RATE", "0")),
+            burst=float(os.getenv(prefix + "BURST", "0")),
+            concurrency=int(os.getenv(prefix + "CONCURRENCY", str(concurrency))),
+            share=float(os.getenv(prefix + "SHARE", str(share)))
+        )
+    return AdmissionController(
+        limits,
+        max_in_flight=int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "64")),
+        global_rate=float(os.getenv("ADMISSION_GLOBAL_RATE", "0")),
+        global_burst=float(os.getenv("ADMISSION_GLOBAL_BURST", "0")),
+        device_rate=float(os.getenv("ADMISSION_DEVICE_RATE", "0")),
+        device_burst=float(os.getenv("ADMISSION_DEVICE_BURST", "0")),
+        degrade_share=float(os.getenv("ADMISSION_DEGRADE_SHARE", "0.5"))
+    )
+
+def retry_after_header(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
+
+def device_key(scope) -> Optional[str]:
+    """Purifier ID from the path or the X-Device-ID header, else the client address"""
+    path = scope["path"]
+    if path.startswith("/purifier/"):
+        return path.split("/")[2]
+    for name, value in scope.get("headers", ()):
+        if name == b"x-device-id":
+            return value.decode("latin-1")
+    client = scope.get("client")
+    return client[0] if client else None
+
+class AdmissionMiddleware:
+    """ASGI middleware admitting requests through an AdmissionController
+
+    Rejections are answered before routing or body parsing. WebSocket
+    connections are rate limited when they open but do not hold a slot for
+    their lifetime; the handler admits each message instead.
+    """
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            return await self.app(scope, receive, send)
+        request_class = classify(scope["path"])
+        if request_class is None:
+            return await self.app(scope, receive, send)
+
+        decision = self.controller.admit(request_class, device_key(scope))
+        if not decision.admitted:
+            if scope["type"] == "websocket":
+                # 1013: try again later
+                return await send({"type": "websocket.close", "code": 1013})
+            response = FastJSONResponse(
+                {"detail": f"Request shed ({decision.reason})", "reason": decision.reason},
+                status_code=decision.status,
+                headers={"Retry-After": retry_after_header(decision.retry_after)}
+            )
+            return await response(scope, receive, send)
+
+        if scope["type"] == "websocket":
+            self.controller.release(request_class)
+            return await self.app(scope, receive, send)
+        scope.setdefault("state", {})["degraded"] = decision.degraded
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.controller.release(request_class)
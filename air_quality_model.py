@@ -5,17 +5,24 @@ import joblib
 import os
 from datetime import datetime
 from typing import Dict, List, Tuple
+from aqi_engine import aqi_category
+from energy import DEFAULT_PROFILE
+
+MODEL_PATH = 'air_quality_model.joblib'
+SCALER_PATH = 'scaler.joblib'
 
 class AirQualityModel:
-    def __init__(self):
+    def __init__(self, model_path: str = MODEL_PATH, scaler_path: str = SCALER_PATH):
         self.model = RandomForestRegressor(
             n_estimators=100,
             max_depth=10,
             random_state=42
         )
         self.scaler = StandardScaler()
-        self.model_path = 'air_quality_model.joblib'
-        self.scaler_path = 'scaler.joblib'
+        self.model_path = model_path
+        self.scaler_path = scaler_path
+        # Bumped whenever the fitted model or scaler is replaced, so caches can tell
+        self.version = 0
         
         # Initialize with sample data if model doesn't exist
         if not os.path.exists(self.model_path):
@@ -92,12 +99,22 @@ class AirQualityModel:
         
         # Train model
         self.model.fit(scaled_features, aqi_values)
+        self.version += 1
         
         # Save model and scaler
         self.save_model()
     
     def predict(self, features):
         """Predict AQI value from sensor data"""
+        features = self.to_feature_array(features)
+        
+        # Scale features
+        scaled_features = self.scaler.transform(features)
+        
+        return self.predict_scaled(scaled_features)
+    
+    def to_feature_array(self, features):
+        """Convert a feature list or sensor dict into a (1, 10) feature array"""
         if isinstance(features, (list, tuple)):
             features = np.array(features).reshape(1, -1)
         elif isinstance(features, dict):
@@ -113,16 +130,23 @@ class AirQualityModel:
                 features['wind_speed'],
                 features['traffic_density']
             ]).reshape(1, -1)
-        
-        # Scale features
-        scaled_features = self.scaler.transform(features)
-        
-        # Make prediction
+        return features
+    
+    def predict_scaled(self, scaled_features):
+        """Predict AQI value from already scaled features"""
         aqi_prediction = self.model.predict(scaled_features)[0]
         
         # Ensure prediction is within valid range
         return max(0, min(500, aqi_prediction))
     
+    def predict_batch(self, features):
+        """Predict AQI values for an (n, 10) feature matrix in one scaler and forest call"""
+        features = np.asarray(features, dtype=np.float64)
+        if len(features) == 0:
+            return np.zeros(0)
+        scaled_features = self.scaler.transform(features)
+        return np.clip(self.model.predict(scaled_features), 0, 500)
+    
     def save_model(self):
         """Save model and scaler to disk"""
         try:
@@ -139,6 +163,7 @@ class AirQualityModel:
             if os.path.exists(self.model_path) and os.path.exists(self.scaler_path):
                 self.model = joblib.load(self.model_path)
                 self.scaler = joblib.load(self.scaler_path)
+                self.version += 1
                 return True
             return False
         except Exception as e:
@@ -157,16 +182,7 @@ class PurifierOptimizer:
         
     def get_aqi_category(self, aqi_value: float) -> str:
         """Get AQI category based on value"""
-        if aqi_value <= 50:
-            return 'GOOD'
-        elif aqi_value <= 100:
-            return 'MODERATE'
-        elif aqi_value <= 150:
-            return 'UNHEALTHY'
-        elif aqi_value <= 200:
-            return 'VERY_UNHEALTHY'
-        else:
-            return 'HAZARDOUS'
+        return aqi_category(aqi_value)
     
     def calculate_power_level(self, aqi_value: float, conditions: Dict) -> float:
         """Calculate optimal power level based on AQI and conditions"""
@@ -188,10 +204,10 @@ class PurifierOptimizer:
         return min(1.0, base_power)  # Cap at 100% power
     
     def calculate_energy_cost(self, power_level: float, duration_hours: float, 
-                            rate_per_kwh: float = 0.12) -> float:
+                            rate_per_kwh: float = DEFAULT_PROFILE.tariff_per_kwh) -> float:
         """Calculate energy cost for given power level and duration"""
-        # Assume max power consumption is 50W (0.05 kW)
-        power_consumption = 0.05 * power_level * duration_hours
+        # Max power consumption comes from the default energy profile
+        power_consumption = DEFAULT_PROFILE.max_watts / 1000 * power_level * duration_hours
         return power_consumption * rate_per_kwh
     
     def optimize_schedule(self, daily_aqi_pattern: List[float], 
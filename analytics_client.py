@@ -0,0 +1,98 @@
+import json
+import time
+import requests
+import pandas as pd
+import numpy as np
+from typing import Dict, Iterator, Optional
+from history_export import EXPORT_COLUMNS, npz_to_columns
+
+BASE_URL = "http://127.0.0.1:8000"
+
+# Local hours of the morning and evening traffic peaks, in hour_of_day filter syntax
+PEAK_HOURS = "7-10,16-19"
+
+def fetch_history_columns(base_url: str = BASE_URL, compress: bool = False,
+                          max_points: Optional[int] = None, start: Optional[str] = None,
+                          end: Optional[str] = None, hour_of_day: Optional[str] = None) -> Dict[str, np.ndarray]:
+    """Fetch the analytics history as NumPy columns via the NPZ export, optionally filtered server-side"""
+    params = {"compress": str(compress).lower(), "max_points": max_points,
+              "start": start, "end": end, "hour_of_day": hour_of_day}
+    params = {key: value for key, value in params.items() if value is not None}
+    response = requests.get(f"{base_url}/analytics/export.npz", params=params)
+    response.raise_for_status()
+    return npz_to_columns(response.content)
+
+def fetch_history_frame(base_url: str = BASE_URL, compress: bool = False,
+                        max_points: Optional[int] = None, start: Optional[str] = None,
+                        end: Optional[str] = None, hour_of_day: Optional[str] = None) -> pd.DataFrame:
+    """Fetch the analytics history straight into a DataFrame with parsed timestamps"""
+    return history_frame(fetch_history_columns(base_url, compress, max_points, start, end, hour_of_day))
+
+def local_timestamps(epochs: np.ndarray) -> pd.Series:
+    """Epoch seconds -> naive local-time datetimes, looking up the UTC offset once per hour"""
+    epochs = np.asarray(epochs, dtype=np.float64)
+    hours, inverse = np.unique(np.floor(epochs / 3600).astype(np.int64), return_inverse=True)
+    offsets = np.array([time.localtime(hour * 3600).tm_gmtoff for hour in hours.tolist()], dtype=np.float64)
+    micros = np.round((epochs + offsets[inverse.reshape(-1)]) * 1e6).astype(np.int64)
+    return pd.Series(pd.to_datetime(micros, unit='us'))
+
+def history_frame(columns: Dict[str, np.ndarray]) -> pd.DataFrame:
+    """DataFrame of export columns with `timestamp` as local time derived from `epoch`
+
+    Deriving it from the epoch column avoids parsing mixed naive/offset ISO strings.
+    """
+    df = pd.DataFrame(columns, columns=EXPORT_COLUMNS)
+    df['timestamp'] = local_timestamps(df['epoch'].to_numpy())
+    return df
+
+def iter_history_records(base_url: str = BASE_URL, start: Optional[str] = None,
+                         end: Optional[str] = None, limit: Optional[int] = None,
+                         hour_of_day: Optional[str] = None) -> Iterator[Dict]:
+    """Stream history records one at a time from the NDJSON mode of /analytics/daily"""
+    params = {"stream": "true", "start": start, "end": end, "limit": limit, "hour_of_day": hour_of_day}
+    params = {key: value for key, value in params.items() if value is not None}
+    with requests.get(f"{base_url}/analytics/daily", params=params, stream=True) as response:
+        response.raise_for_status()
+        for line in response.iter_lines():
+            if line:
+                yield json.loads(line)
+
+def fetch_history_since(cursor: str = "0", base_url: str = BASE_URL,
+                        limit: Optional[int] = None) -> Dict:
+    """Fetch only the records added after `cursor`
+
+    Returns {"records": [...], "cursor": next_cursor, "reset": bool}; pass the
+    returned cursor to the next call so polling cost scales with new data.
+    """
+    params = {"since": cursor}
+    if limit is not None:
+        params["limit"] = limit
+    response = requests.get(f"{base_url}/analytics/daily", params=params)
+    response.raise_for_status()
+    return response.json()
+
+def fetch_trends_frame(base_url: str = BASE_URL, start: Optional[str] = None, end: Optional[str] = None,
+                       tier: Optional[str] = None, max_points: int = 2000) -> pd.DataFrame:
+    """Fetch rollup buckets (count and mean/min/max per field) from /analytics/trends"""
+    params = {"start": start, "end": end, "tier": tier, "max_points": max_points}
+    params = {key: value for key, value in params.items() if value is not None}
+    response = requests.get(f"{base_url}/analytics/trends", params=params)
+    response.raise_for_status()
+    df = pd.DataFrame(response.json()["columns"])
+    df['timestamp'] = pd.to_datetime(df['epoch'], unit='s')
+    return df
+
+def peak_windows(timestamps: pd.Series, hours: str = PEAK_HOURS):
+    """(start, end) of each peak-hour window on each day the timestamps cover, clipped to the data"""
+    if timestamps.empty:
+        return []
+    first, last = timestamps.min(), timestamps.max()
+    windows = []
+    for day in pd.date_range(first.normalize(), last.normalize(), freq="D", tz=first.tz):
+        for part in hours.split(","):
+            start_hour, _, end_hour = part.partition("-")
+            start = day + pd.Timedelta(hours=int(start_hour))
+            end = day + pd.Timedelta(hours=int(end_hour or start_hour) + 1)
+            if end > first and start < last:
+                windows.append((max(start, first), min(end, last)))
+    return windows
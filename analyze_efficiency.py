@@ -1,38 +1,28 @@
-import requests
-import pandas as pd
-import plotly.graph_objects as go
+import sys
 from plotly.subplots import make_subplots
-from datetime import datetime
+from dashboards import (DEFAULT_RENDER_MODE, bar_trace, line_trace, max_plot_points, time_values, values,
+                        write_dashboard)
+from downsampling import downsample_frame
+from offline_analytics import add_derived_columns, history_metrics, load_frame
 
-def fetch_data():
-    """Fetch 24-hour analytics data"""
-    response = requests.get("http://127.0.0.1:8000/analytics/daily")
-    return response.json()
+def fetch_data(paths=()):
+    """Load history files as a DataFrame, or fetch the last 24 hours from the server"""
+    return load_frame(list(paths))
 
 def calculate_efficiency_metrics(df):
-    """Calculate energy efficiency metrics"""
-    # Calculate AQI improvement per unit power
-    df['efficiency_ratio'] = df['aqi_value'] / (df['power_level'] * 100)
-    
-    # Calculate energy consumption (simplified model)
-    # Assuming 50W at 100% power
-    MAX_POWER_WATTS = 50
-    df['energy_consumption'] = df['power_level'] * MAX_POWER_WATTS
-    
-    # Calculate cost (assuming $0.12 per kWh)
-    COST_PER_KWH = 0.12
-    df['hourly_cost'] = (df['energy_consumption'] * COST_PER_KWH) / 1000
-    
-    return {
-        'total_energy': df['energy_consumption'].sum(),
-        'total_cost': df['hourly_cost'].sum(),
-        'avg_efficiency': df['efficiency_ratio'].mean(),
-        'peak_efficiency': df.loc[df['efficiency_ratio'].idxmax()],
-        'lowest_efficiency': df.loc[df['efficiency_ratio'].idxmin()]
-    }
+    """Calculate energy efficiency metrics (efficiency ratio, per-reading energy and cost)"""
+    return history_metrics(add_derived_columns(df))
 
-def create_efficiency_dashboard(df, metrics):
-    """Create an interactive efficiency dashboard"""
+def create_efficiency_dashboard(df, metrics, render=DEFAULT_RENDER_MODE):
+    """Create an interactive efficiency dashboard
+
+    `render` is "svg", "webgl" or "auto" (WebGL for long series); series are
+    passed as typed arrays so the HTML stays compact.
+    """
+    # Metrics come from the full history; only the plotted points are downsampled (LTTB).
+    # Efficiency and cost follow from these columns (and efficiency is infinite at zero power)
+    df = downsample_frame(df, max_plot_points(len(df), render), columns=('aqi_value', 'power_level', 'energy_wh'))
+    timestamps = time_values(df['timestamp'])
     fig = make_subplots(
         rows=2, cols=2,
         subplot_titles=(
@@ -45,14 +35,15 @@ def create_efficiency_dashboard(df, metrics):
     
     # Power vs AQI scatter plot
     fig.add_trace(
-        go.Scatter(
-            x=df['power_level'] * 100,
-            y=df['aqi_value'],
+        line_trace(
+            values(df['power_level'] * 100),
+            values(df['aqi_value']),
+            render,
             mode='markers',
             name='AQI vs Power',
             marker=dict(
                 size=8,
-                color=df['efficiency_ratio'],
+                color=values(df['efficiency_ratio']),
                 colorscale='Viridis',
                 showscale=True
             )
@@ -62,9 +53,10 @@ def create_efficiency_dashboard(df, metrics):
     
     # Efficiency ratio over time
     fig.add_trace(
-        go.Scatter(
-            x=df['timestamp'],
-            y=df['efficiency_ratio'],
+        line_trace(
+            timestamps,
+            values(df['efficiency_ratio']),
+            render,
             name='Efficiency Ratio',
             line=dict(color='#2ecc71')
         ),
@@ -73,20 +65,22 @@ def create_efficiency_dashboard(df, metrics):
     
     # Energy consumption bar chart
     fig.add_trace(
-        go.Bar(
-            x=df['timestamp'],
-            y=df['energy_consumption'],
-            name='Energy (Wh)',
-            marker_color='#3498db'
+        bar_trace(
+            timestamps,
+            values(df['energy_wh']),
+            '#3498db',
+            render,
+            name='Energy (Wh)'
         ),
         row=2, col=1
     )
     
     # Cost analysis
     fig.add_trace(
-        go.Scatter(
-            x=df['timestamp'],
-            y=df['hourly_cost'],
+        line_trace(
+            timestamps,
+            values(df['cost']),
+            render,
             name='Cost ($)',
             fill='tozeroy',
             line=dict(color='#e74c3c')
@@ -106,24 +100,22 @@ def create_efficiency_dashboard(df, metrics):
     fig.update_xaxes(title_text="Power Level (%)", row=1, col=1)
     fig.update_yaxes(title_text="AQI Value", row=1, col=1)
     
-    fig.update_xaxes(title_text="Time", row=1, col=2)
+    fig.update_xaxes(title_text="Time", type="date", row=1, col=2)
     fig.update_yaxes(title_text="Efficiency Ratio", row=1, col=2)
     
-    fig.update_xaxes(title_text="Time", row=2, col=1)
+    fig.update_xaxes(title_text="Time", type="date", row=2, col=1)
     fig.update_yaxes(title_text="Energy (Wh)", row=2, col=1)
     
-    fig.update_xaxes(title_text="Time", row=2, col=2)
+    fig.update_xaxes(title_text="Time", type="date", row=2, col=2)
     fig.update_yaxes(title_text="Cost ($)", row=2, col=2)
     
     return fig
 
-def main():
+def main(paths=()):
     print("Analyzing energy efficiency...")
     
     # Fetch and process data
-    data = fetch_data()
-    df = pd.DataFrame(data)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    df = fetch_data(paths)
     
     # Calculate metrics
     metrics = calculate_efficiency_metrics(df)
@@ -131,7 +123,7 @@ def main():
     # Print efficiency report
     print("\nEfficiency Report")
     print("=" * 50)
-    print(f"Total Energy Consumption: {metrics['total_energy']:.2f} Wh")
+    print(f"Total Energy Consumption: {metrics['total_energy_wh']:.2f} Wh")
     print(f"Total Operating Cost: ${metrics['total_cost']:.2f}")
     print(f"Average Efficiency Ratio: {metrics['avg_efficiency']:.2f}")
     
@@ -152,8 +144,8 @@ def main():
     # Create and save dashboard
     fig = create_efficiency_dashboard(df, metrics)
     output_file = "efficiency_dashboard.html"
-    fig.write_html(output_file)
+    write_dashboard(fig, output_file)
     print(f"\nEfficiency dashboard saved to {output_file}")
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1:])
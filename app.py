@@ -1,14 +1,35 @@
-from fastapi import FastAPI, WebSocket, HTTPException
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Request
+from fastapi.responses import HTMLResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.staticfiles import StaticFiles
+from fastapi.middleware.gzip import GZipMiddleware
 from fastapi.templating import Jinja2Templates
+from starlette.websockets import WebSocketState
 from pydantic import BaseModel
-from datetime import datetime, timedelta
-import json
+from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
 import random
+import time
+import uuid
 import numpy as np
-from typing import Dict, List, Optional
+from typing import Dict, Iterator, List, Optional
 from air_quality_model import AirQualityModel
+from metrics import MetricsRegistry, CONTENT_TYPE as METRICS_CONTENT_TYPE
+from profiling import DebugMode, SamplingProfiler, span, tracing
+from history_export import NPZ_MEDIA_TYPE, history_to_columns, columns_to_npz
+from downsampling import downsample_indices
+from serialization import FastJSONResponse, dumps, dumps_text, loads, parse_timestamp, validate_batch, sensor_dicts
+from ingest import IngestItem, IngestQueue, run_worker
+from prediction_cache import PredictionCache, parse_tolerances
+from retention import RAW_RETENTION_SECONDS, RetentionTiers, rollup_values
+from energy import ledger_from_env
+from history_index import HistoryIndex, parse_hours, trim_expired
+from device_history import DeviceHistory, HistoryPartitions
+from history_archive import HistoryArchive
+from status_store import StatusStore
+from fleet import CommandCoalescer, SortedIds, groups_from_env, page
+from admission import INGEST, AdmissionMiddleware, controller_from_env, device_key, retry_after_header
+from aqi_engine import LatencyFallback, aqi_categories, aqi_category, compute_aqi
+import asyncio
 import aiml
 import os
 
@@ -20,7 +41,10 @@ PURIFIER_CONFIG = {
     "device_id": os.getenv("PURIFIER_ID", ""),              # Your purifier's ID
 }
 
-app = FastAPI(title="Smart Air Purifier API")
+app = FastAPI(title="Smart Air Purifier API", default_response_class=FastJSONResponse)
+
+# Compress responses larger than GZIP_MIN_SIZE bytes for clients that accept gzip
+app.add_middleware(GZipMiddleware, minimum_size=int(os.getenv("GZIP_MIN_SIZE", "1000")))
 
 # Mount static files and templates
 app.mount("/static", StaticFiles(directory="."), name="static")
@@ -30,15 +54,148 @@ templates = Jinja2Templates(directory=".")
 air_quality_model = AirQualityModel()
 air_quality_model.load_model()
 
+# "model" scores with the forest, "epa" with the EPA breakpoint tables. With the model as
+# primary, scoring falls back to the tables while model calls average over the budget.
+AQI_SCORER = os.getenv("AQI_SCORER", "model")
+if AQI_SCORER not in ("model", "epa"):
+    raise ValueError(f"Unknown AQI_SCORER '{AQI_SCORER}', expected 'model' or 'epa'")
+aqi_fallback = LatencyFallback(budget=float(os.getenv("AQI_LATENCY_BUDGET_MS", "250")) / 1000)
+
 # Initialize AIML brain
 kernel = aiml.Kernel()
 kernel.learn("aiml_brain/purifier_rules.aiml")
 
+# Optional write-behind persistence of purifier status; restored here from snapshot + log
+PURIFIER_STATE_DIR = os.getenv("PURIFIER_STATE_DIR")
+status_store = StatusStore(
+    PURIFIER_STATE_DIR,
+    flush_seconds=float(os.getenv("PURIFIER_STATE_FLUSH_SECONDS", "1")),
+    snapshot_records=int(os.getenv("PURIFIER_STATE_SNAPSHOT_RECORDS", "10000"))
+) if PURIFIER_STATE_DIR else None
+
 # Store historical data
 historical_data = []
-purifier_status = {}
+purifier_status = status_store.load() if status_store is not None else {}
+
+# Group/zone membership for bulk control (PURIFIER_GROUPS), repeated-command coalescing
+# and the sorted purifier IDs that paged status reads walk
+fleet_groups = groups_from_env()
+command_coalescer = CommandCoalescer(window=float(os.getenv("CONTROL_COALESCE_SECONDS", "5")))
+purifier_ids = SortedIds()
+
+# Sorted-epoch and hour-of-day index over historical_data for range queries
+history_index = HistoryIndex()
+
+# The same records partitioned by purifier ID; per-device queries only read their partition
+history_partitions = HistoryPartitions()
+
+# Monotonic sequence number of the last history record, used as the delta-sync cursor
+history_seq = 0
+
+# Bumped on every history change; drives ETag/Last-Modified on the analytics endpoints.
+# The boot ID keeps validators from a previous process from matching after a restart.
+history_version = 0
+history_modified_at = time.time()
+HISTORY_BOOT_ID = uuid.uuid4().hex[:8]
+
+# Optional on-disk archive of every history record, read by offline_analytics.py
+HISTORY_ARCHIVE_DIR = os.getenv("HISTORY_ARCHIVE_DIR")
+history_archive = HistoryArchive(
+    HISTORY_ARCHIVE_DIR,
+    segment_seconds=float(os.getenv("HISTORY_ARCHIVE_SEGMENT_SECONDS", "3600"))
+) if HISTORY_ARCHIVE_DIR else None
+
+# 1-minute rollups for 7 days and 1-hour rollups for a year, fed on every append
+retention_tiers = RetentionTiers()
+
+# Per-device energy ledger integrating power over time, kept for ENERGY_RETENTION_DAYS
+energy_ledger = ledger_from_env()
+ENERGY_RETENTION_SECONDS = float(os.getenv("ENERGY_RETENTION_DAYS", "7")) * 24 * 3600
+
+# Readings that don't name their purifier are filed under the configured one
+DEFAULT_DEVICE_ID = PURIFIER_CONFIG["device_id"] or "default"
+
+# Prometheus metrics
+metrics = MetricsRegistry()
+stage_latency = metrics.histogram(
+    "purifier_predict_stage_seconds",
+    "Latency of each stage of the AQI prediction path",
+    "stage"
+)
+ws_connections = metrics.counter("purifier_ws_connections_total", "WebSocket connections accepted")
+ws_messages = metrics.counter("purifier_ws_messages_total", "WebSocket messages received")
+ws_errors = metrics.counter("purifier_ws_errors_total", "WebSocket connections closed by an error")
+metrics.gauge("purifier_history_size", "Records held in the 24-hour history", lambda: len(historical_data))
+metrics.gauge("purifier_history_devices", "Purifiers with records in the history", lambda: len(history_partitions))
+metrics.gauge("purifier_fleet_size", "Purifiers with known status", lambda: len(purifier_status))
+metrics.counter("purifier_control_coalesced_total", "Control commands dropped as repeats",
+                lambda: command_coalescer.coalesced)
+if status_store is not None:
+    metrics.gauge("purifier_state_pending_records", "Status changes waiting to be written",
+                  lambda: status_store.pending)
+    metrics.counter("purifier_state_flushes_total", "Status log appends, one fsync each",
+                    lambda: status_store.flushes)
+    metrics.counter("purifier_state_snapshots_total", "Status snapshots written", lambda: status_store.snapshots)
+if history_archive is not None:
+    metrics.counter("purifier_archive_segments_total", "History archive segments written",
+                    lambda: history_archive.segments_written)
+    metrics.counter("purifier_archive_write_failures_total", "History archive segment writes that failed",
+                    lambda: history_archive.write_failures)
+
+# Bounded queue between sensor intake (/ingest) and inference workers
+ingest_queue = IngestQueue(
+    maxsize=int(os.getenv("INGEST_QUEUE_SIZE", "10000")),
+    policy=os.getenv("INGEST_OVERFLOW_POLICY", "drop_oldest")
+)
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "1"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+ingest_tasks = []
+metrics.gauge("purifier_ingest_queue_depth", "Readings waiting for inference", lambda: ingest_queue.depth)
+metrics.gauge("purifier_ingest_queue_lag_seconds", "Age of the oldest queued reading", ingest_queue.lag)
+metrics.counter("purifier_ingest_accepted_total", "Readings accepted at intake", lambda: ingest_queue.accepted)
+metrics.counter("purifier_ingest_dropped_total", "Readings evicted by the overflow policy", lambda: ingest_queue.dropped)
+metrics.counter("purifier_ingest_rejected_total", "Readings rejected with 429", lambda: ingest_queue.rejected)
+
+# Memoized predictions for near-identical readings, dropped whenever the model version changes
+prediction_cache = PredictionCache(
+    tolerances=parse_tolerances(os.getenv("PREDICTION_CACHE_TOLERANCES", "")),
+    maxsize=int(os.getenv("PREDICTION_CACHE_SIZE", "4096")),
+    ttl=float(os.getenv("PREDICTION_CACHE_TTL", "300")),
+    boundary_margin=float(os.getenv("PREDICTION_CACHE_BOUNDARY_MARGIN", "5"))
+)
+metrics.counter("purifier_prediction_cache_hits_total", "Predictions served from the cache", lambda: prediction_cache.hits)
+metrics.counter("purifier_prediction_cache_misses_total", "Predictions computed by the model", lambda: prediction_cache.misses)
+metrics.gauge("purifier_prediction_cache_size", "Entries in the prediction cache", lambda: len(prediction_cache))
+metrics.gauge("purifier_prediction_cache_hit_ratio", "Cache hits over lookups since start", prediction_cache.hit_rate)
+metrics.gauge("purifier_aqi_fallback_active", "1 while scoring falls back to the EPA tables",
+              lambda: int(aqi_fallback.engaged))
+metrics.counter("purifier_aqi_fallback_activations_total", "Times model latency went over budget",
+                lambda: aqi_fallback.activations)
+
+# Opt-in tracing and sampling profiler, enabled per request or for a time window
+debug_mode = DebugMode(SamplingProfiler(
+    interval=float(os.getenv("PROFILER_INTERVAL", "0.005")),
+    request_interval=float(os.getenv("PROFILER_REQUEST_INTERVAL", "0.0005"))
+))
+
+# Rate limits and concurrency caps applied before routing. Under overload analytics is
+# shed (or degraded) first and control/status last; see controller_from_env for ADMISSION_*
+admission = controller_from_env()
+app.add_middleware(AdmissionMiddleware, controller=admission)
+metrics.labeled_counter("purifier_admission_admitted_total", "Requests admitted per class", ("class",),
+                        lambda: {(name,): count for name, count in admission.admitted.items()})
+metrics.labeled_counter("purifier_admission_rejected_total", "Requests shed per class and reason",
+                        ("class", "reason"), lambda: admission.rejected)
+metrics.labeled_counter("purifier_admission_degraded_total", "Requests answered with a cheaper response",
+                        ("class",), lambda: {(name,): count for name, count in admission.degraded.items()})
+metrics.gauge("purifier_admission_in_flight", "Requests in flight across all classes",
+              lambda: admission.total_in_flight)
+
+# Analytics admitted under load are downsampled to at most this many points
+DEGRADED_MAX_POINTS = int(os.getenv("ADMISSION_DEGRADED_MAX_POINTS", "500"))
 
 class SensorData(BaseModel):
+    device_id: Optional[str] = None
     pm25: float
     pm10: float
     no2: float
@@ -56,6 +213,14 @@ class PurifierControl(BaseModel):
     mode: str
     fan_speed: int
 
+class BulkControl(BaseModel):
+    """A control command for the purifiers picked by exactly one selector"""
+    control: PurifierControl
+    device_ids: Optional[List[str]] = None
+    group: Optional[str] = None
+    zone: Optional[str] = None
+    all: bool = False
+
 def generate_recommendations(aqi: float, sensor_data: Dict, power_level: float) -> Dict:
     """Generate AI-powered recommendations based on current conditions"""
     conditions = []
@@ -80,9 +245,12 @@ def generate_recommendations(aqi: float, sensor_data: Dict, power_level: float)
     
     # Get AIML recommendations
     aiml_input = " ".join(conditions)
-    air_quality_rec = kernel.respond(f"AIR {aiml_input}")
-    energy_rec = kernel.respond(f"ENERGY {aiml_input}")
-    weather_rec = kernel.respond(f"WEATHER {aiml_input}")
+    with stage_latency.time("aiml_air"):
+        air_quality_rec = kernel.respond(f"AIR {aiml_input}")
+    with stage_latency.time("aiml_energy"):
+        energy_rec = kernel.respond(f"ENERGY {aiml_input}")
+    with stage_latency.time("aiml_weather"):
+        weather_rec = kernel.respond(f"WEATHER {aiml_input}")
     
     return {
         "air_quality": air_quality_rec or "Maintain current air quality levels",
@@ -95,144 +263,889 @@ async def root(request):
     """Serve the dashboard"""
     return templates.TemplateResponse("index.html", {"request": request})
 
-@app.post("/predict")
-async def predict_aqi(data: SensorData):
-    """Predict AQI and get recommendations"""
-    global historical_data
-    try:
-        # Prepare features for prediction
-        features = [
-            data.pm25, data.pm10, data.no2, data.so2, data.co, data.o3,
-            data.temperature, data.humidity, data.wind_speed, data.traffic_density
-        ]
-        
-        # Get predictions
-        aqi_value = air_quality_model.predict(features)
-        
-        # Calculate power level (0-1) based on AQI
-        power_level = min(aqi_value / 200, 1.0)
-        
-        # Get AQI category
-        if aqi_value <= 50:
-            category = "GOOD"
-        elif aqi_value <= 100:
-            category = "MODERATE"
-        elif aqi_value <= 150:
-            category = "UNHEALTHY"
-        elif aqi_value <= 200:
-            category = "VERY_UNHEALTHY"
+def append_history(entries: List[Dict], epochs: Optional[List[float]] = None):
+    """Append history records, then drop everything older than 24 hours
+
+    Each record needs a `device_id`; it goes into the fleet-wide log and its
+    device's partition. `epochs` are the records' timestamps already parsed at
+    intake; they are kept on each record so trimming never re-parses ISO strings.
+    Timestamps are all parsed before anything is stored, so a bad one raises
+    ValueError with every store left untouched.
+    """
+    global historical_data, history_seq, history_version, history_modified_at
+    if epochs is None:
+        epochs = [parse_timestamp(entry["timestamp"]) for entry in entries]
+    # Store historical data
+    with stage_latency.time("history_append"):
+        for entry, epoch in zip(entries, epochs):
+            history_seq += 1
+            entry["seq"] = history_seq
+            entry["epoch"] = epoch
+            historical_data.append(entry)
+            history_index.append(entry["epoch"])
+        touched = history_partitions.append(entries)
+        if history_archive is not None:
+            history_archive.add(entries)
+    with stage_latency.time("history_rollup"):
+        epoch_values = [entry["epoch"] for entry in entries]
+        retention_tiers.add(np.array(epoch_values), rollup_values(entries))
+        energy_ledger.record_many((entry["device_id"] for entry in entries),
+                                  epoch_values, (entry["power_level"] for entry in entries))
+    
+    # Keep only last 24 hours of data
+    with stage_latency.time("history_trim"):
+        cutoff = time.time() - RAW_RETENTION_SECONDS
+        historical_data = trim_expired(historical_data, history_index, cutoff)
+        history_partitions.trim(cutoff, touched)
+        energy_ledger.trim(time.time() - ENERGY_RETENTION_SECONDS)
+        history_version += 1
+        history_modified_at = time.time()
+
+def predict_features(features: np.ndarray, sensor_dict: Dict) -> Dict:
+    """Score one (1, 10) feature row and build its recommendations, bypassing the cache"""
+    with span("model"):
+        if use_epa_scorer():
+            scorer = "epa"
+            with stage_latency.time("epa_scoring"):
+                aqi_value = float(compute_aqi(features)[0])
         else:
-            category = "HAZARDOUS"
-        
-        # Generate recommendations
+            scorer = "model"
+            start = time.perf_counter()
+            # Get predictions
+            with stage_latency.time("scaling"):
+                scaled_features = air_quality_model.scaler.transform(features)
+            with stage_latency.time("forest_inference"):
+                aqi_value = air_quality_model.predict_scaled(scaled_features)
+            aqi_fallback.record(time.perf_counter() - start)
+    
+    # Calculate power level (0-1) based on AQI
+    power_level = min(aqi_value / 200, 1.0)
+    
+    # Get AQI category
+    with stage_latency.time("category_mapping"):
+        category = aqi_category(aqi_value)
+    
+    # Generate recommendations
+    with span("aiml"):
         recommendations = generate_recommendations(
             aqi_value,
-            data.dict(),
+            sensor_dict,
             power_level
         )
-        
-        # Store historical data
-        historical_data.append({
+    
+    return {
+        "aqi_value": aqi_value,
+        "aqi_category": category,
+        "power_level": power_level,
+        "recommendations": recommendations,
+        "scorer": scorer
+    }
+
+def use_epa_scorer() -> bool:
+    """Whether the next readings are scored with the EPA tables instead of the model"""
+    return AQI_SCORER == "epa" or aqi_fallback.active()
+
+def score_batch(features: np.ndarray):
+    """AQI values for an (n, 10) feature matrix and the name of the scorer that produced them"""
+    if use_epa_scorer():
+        with stage_latency.time("epa_scoring"):
+            return compute_aqi(features), "epa"
+    start = time.perf_counter()
+    aqi_values = air_quality_model.predict_batch(features)
+    aqi_fallback.record(time.perf_counter() - start)
+    return aqi_values, "model"
+
+def process_sensor_data(data: SensorData, epoch: Optional[float] = None) -> Dict:
+    """Run validated sensor data through the prediction cache (or model and AIML rules) and history"""
+    if epoch is None:
+        epoch = parse_timestamp(data.timestamp)
+    # Convert the validated model once and share the dict
+    sensor_dict = data.dict(exclude={"device_id"})
+    # Prepare features for prediction
+    with stage_latency.time("feature_assembly"):
+        features = air_quality_model.to_feature_array([
+            data.pm25, data.pm10, data.no2, data.so2, data.co, data.o3,
+            data.temperature, data.humidity, data.wind_speed, data.traffic_density
+        ])
+    
+    with stage_latency.time("cache_lookup"):
+        cache_key = prediction_cache.key(features)
+        # Traced requests always run the model and rules, so their spans show where time goes
+        prediction = None if tracing() else prediction_cache.get(cache_key, air_quality_model.version)
+    if prediction is None:
+        prediction = predict_features(features, sensor_dict)
+        # Fallback scores are a stopgap; don't let them outlive the slow spell
+        if prediction["scorer"] == AQI_SCORER:
+            prediction_cache.put(cache_key, prediction, air_quality_model.version)
+    
+    with span("history"):
+        append_history([{
             "timestamp": data.timestamp,
-            "aqi_value": aqi_value,
-            "power_level": power_level,
-            "sensor_data": data.dict()
+            "device_id": data.device_id or DEFAULT_DEVICE_ID,
+            "aqi_value": prediction["aqi_value"],
+            "power_level": prediction["power_level"],
+            "sensor_data": sensor_dict
+        }], [epoch])
+    
+    # Callers add fields to the result, so never hand out the cached dict itself
+    return dict(prediction)
+
+def process_sensor_batch(features: np.ndarray, timestamps: List[str],
+                         epochs: Optional[List[float]] = None,
+                         device_ids: Optional[List[str]] = None) -> List[Dict]:
+    """Run a validated batch through the prediction cache, one model call for the misses,
+    then AIML rules for the misses and history for every reading"""
+    model_version = air_quality_model.version
+    readings = sensor_dicts(features, timestamps)
+    with stage_latency.time("cache_lookup"):
+        keys = prediction_cache.keys(features)
+        predictions = [None] * len(keys) if tracing() else \
+            [prediction_cache.get(key, model_version) for key in keys]
+    
+    # Score each distinct missing key once, even if it repeats within the batch
+    missing = {}
+    for i, (key, prediction) in enumerate(zip(keys, predictions)):
+        if prediction is None and key not in missing:
+            missing[key] = i
+    if missing:
+        rows = list(missing.values())
+        with span("model"):
+            aqi_values, scorer = score_batch(features[rows])
+            categories = aqi_categories(aqi_values).tolist()
+        with span("aiml"):
+            for key, i, aqi_value, category in zip(missing, rows, aqi_values.tolist(), categories):
+                power_level = min(aqi_value / 200, 1.0)
+                prediction = {
+                    "aqi_value": aqi_value,
+                    "aqi_category": category,
+                    "power_level": power_level,
+                    "recommendations": generate_recommendations(aqi_value, readings[i], power_level),
+                    "scorer": scorer
+                }
+                if scorer == AQI_SCORER:
+                    prediction_cache.put(key, prediction, model_version)
+                missing[key] = prediction
+        predictions = [missing[key] if prediction is None else prediction
+                       for key, prediction in zip(keys, predictions)]
+    
+    if device_ids is None:
+        device_ids = [DEFAULT_DEVICE_ID] * len(readings)
+    results = []
+    entries = []
+    for prediction, sensor_dict, device_id in zip(predictions, readings, device_ids):
+        results.append(dict(prediction))
+        entries.append({
+            "timestamp": sensor_dict["timestamp"],
+            "device_id": device_id,
+            "aqi_value": prediction["aqi_value"],
+            "power_level": prediction["power_level"],
+            "sensor_data": sensor_dict
         })
-        
-        # Keep only last 24 hours of data
-        cutoff_time = datetime.now() - timedelta(hours=24)
-        historical_data = [
-            d for d in historical_data
-            if datetime.fromisoformat(d["timestamp"]) > cutoff_time
-        ]
-        
-        return {
-            "aqi_value": aqi_value,
-            "aqi_category": category,
-            "power_level": power_level,
-            "recommendations": recommendations
-        }
+    
+    with span("history"):
+        append_history(entries, epochs)
+    return results
+
+def _debug_requested(value) -> bool:
+    """Interpret a debug flag from a header, query parameter or message field"""
+    return str(value).lower() in ("1", "true", "yes", "on")
+
+@app.post("/predict")
+async def predict_aqi(data: SensorData, request: Request):
+    """Predict AQI and get recommendations
+
+    Send `X-Debug: 1` to trace and profile this request; `X-Correlation-ID`
+    is echoed back and attached to the recorded spans.
+    """
+    # Request validation happens in FastAPI before this handler runs;
+    # the validation stage is timed on the WebSocket path where we parse ourselves
+    correlation_id = request.headers.get("x-correlation-id")
+    try:
+        epoch = parse_timestamp(data.timestamp)
+    except ValueError:
+        raise HTTPException(status_code=422, detail=f"invalid timestamp '{data.timestamp}'")
+    try:
+        with debug_mode.request(_debug_requested(request.headers.get("x-debug")), correlation_id) as trace:
+            result = process_sensor_data(data, epoch)
+            if trace is not None:
+                correlation_id = trace.correlation_id
+                result["trace"] = trace.to_dict()
+        with stage_latency.time("serialization"):
+            response = FastJSONResponse(result)
+        if correlation_id:
+            response.headers["X-Correlation-ID"] = correlation_id
+        return response
     
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/purifier/{purifier_id}/status")
-async def get_purifier_status(purifier_id: str):
-    """Get current status of a specific purifier"""
+def row_device_ids(rows: List[Dict]) -> List[str]:
+    """Purifier ID of each raw batch row, defaulting to DEFAULT_DEVICE_ID"""
+    return [str(row.get("device_id") or DEFAULT_DEVICE_ID) for row in rows]
+
+@app.post("/predict/batch")
+async def predict_batch(request: Request):
+    """Predict AQI for a JSON array of readings, validated and scored in bulk
+
+    `X-Debug` and `X-Correlation-ID` work as on /predict; the spans are on
+    /debug/traces under the echoed correlation ID.
+    """
+    try:
+        rows = loads(await request.body())
+        features, timestamps, epochs = validate_batch(rows)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    correlation_id = request.headers.get("x-correlation-id")
+    try:
+        with debug_mode.request(_debug_requested(request.headers.get("x-debug")), correlation_id) as trace:
+            results = process_sensor_batch(features, timestamps, epochs, row_device_ids(rows))
+            if trace is not None:
+                correlation_id = trace.correlation_id
+        response = FastJSONResponse(results)
+        if correlation_id:
+            response.headers["X-Correlation-ID"] = correlation_id
+        return response
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+def process_ingest_batch(items: List[IngestItem]):
+    """Ingest worker handler: score a drained batch and record it in history"""
+    features = np.vstack([item.features for item in items])
+    process_sensor_batch(features, [item.timestamp for item in items], [item.epoch for item in items],
+                         [item.device_id for item in items])
+
+def _log_ingest_error(e: Exception):
+    print(f"Ingest worker error: {str(e)}")
+
+@app.on_event("startup")
+async def start_ingest_workers():
+    for _ in range(INGEST_WORKERS):
+        ingest_tasks.append(asyncio.create_task(
+            run_worker(ingest_queue, process_ingest_batch, INGEST_BATCH_SIZE, _log_ingest_error)
+        ))
+
+@app.on_event("shutdown")
+async def stop_ingest_workers():
+    for task in ingest_tasks:
+        task.cancel()
+    ingest_tasks.clear()
+
+@app.on_event("shutdown")
+async def close_history_archive():
+    if history_archive is not None:
+        history_archive.close()
+
+@app.on_event("shutdown")
+async def close_status_store():
+    if status_store is not None:
+        status_store.close()
+
+@app.post("/ingest", status_code=202)
+async def ingest_readings(request: Request):
+    """Accept one reading or an array of readings for asynchronous processing
+
+    Readings are validated, their timestamps parsed once, and queued; workers
+    drain the queue into the model and history. Each reading may carry an
+    optional `device_id`; it selects the history partition and is used by the
+    latest_per_device overflow policy.
+    """
+    try:
+        payload = loads(await request.body())
+        rows = payload if isinstance(payload, list) else [payload]
+        features, timestamps, epochs = validate_batch(rows)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    accepted = 0
+    for device_id, feature_row, timestamp, epoch in zip(row_device_ids(rows), features, timestamps, epochs):
+        if ingest_queue.put(IngestItem(device_id, feature_row, timestamp, epoch)):
+            accepted += 1
+    
+    result = {"accepted": accepted, "rejected": len(rows) - accepted, "queue_depth": ingest_queue.depth}
+    if accepted < len(rows):
+        return FastJSONResponse(result, status_code=429, headers={"Retry-After": "1"})
+    return result
+
+@app.get("/ingest/stats")
+async def get_ingest_stats():
+    """Queue depth, lag and overflow counters of the ingest stage"""
+    return ingest_queue.stats()
+
+@app.get("/admission/stats")
+async def get_admission_stats():
+    """In-flight requests and admitted, degraded and shed counts per request class"""
+    return admission.stats()
+
+@app.get("/predict/cache")
+async def get_prediction_cache_stats():
+    """Size, hit rate and tolerances of the prediction cache"""
+    return prediction_cache.stats()
+
+@app.delete("/predict/cache")
+async def clear_prediction_cache():
+    """Drop every cached prediction"""
+    prediction_cache.invalidate()
+    return prediction_cache.stats()
+
+def update_status(purifier_id: str, changes: Dict) -> Dict:
+    """Apply changes to a purifier's status and queue them for the status store"""
+    status = purifier_status.setdefault(purifier_id, {})
+    status.update(changes)
+    if status_store is not None:
+        status_store.record(purifier_id, changes)
+    return status
+
+def update_statuses(purifier_ids: List[str], changes: Dict):
+    """Apply the same changes to many purifiers, stored as one record"""
+    for purifier_id in purifier_ids:
+        purifier_status.setdefault(purifier_id, {}).update(changes)
+    if status_store is not None and purifier_ids:
+        status_store.record_many(purifier_ids, changes)
+
+def ensure_status(purifier_id: str) -> Dict:
+    """Status of a purifier, created with defaults on first sight"""
     if purifier_id not in purifier_status:
-        purifier_status[purifier_id] = {
+        # Persisted like a control update, so the defaults survive a restart
+        update_status(purifier_id, {
             "power_level": 0.5,
             "mode": "auto",
             "fan_speed": 2,
             "last_maintenance": datetime.now().isoformat(),
             "filter_life": random.uniform(0.3, 1.0)
-        }
+        })
     return purifier_status[purifier_id]
 
+@app.get("/purifier/{purifier_id}/status")
+async def get_purifier_status(purifier_id: str):
+    """Get current status of a specific purifier"""
+    return ensure_status(purifier_id)
+
 @app.post("/purifier/{purifier_id}/control")
 async def control_purifier(purifier_id: str, control: PurifierControl):
-    """Update purifier controls"""
-    if purifier_id not in purifier_status:
-        purifier_status[purifier_id] = {}
-    
-    purifier_status[purifier_id].update(control.dict())
-    return purifier_status[purifier_id]
+    """Update purifier controls; a repeat of the last command within CONTROL_COALESCE_SECONDS is dropped"""
+    changes = control.dict()
+    selected, _ = command_coalescer.select([purifier_id], changes)
+    if selected:
+        return update_status(purifier_id, changes)
+    return purifier_status.setdefault(purifier_id, {})
+
+def select_purifiers(device_ids: Optional[List[str]], group: Optional[str],
+                     zone: Optional[str], all_devices: bool) -> List[str]:
+    """Purifier IDs picked by one of an ID list, a group, a zone or the whole fleet"""
+    if sum(selector is not None for selector in (device_ids, group, zone)) + all_devices != 1:
+        raise HTTPException(status_code=400, detail="Give exactly one of device_ids, group, zone or all")
+    if device_ids is not None:
+        return device_ids
+    if all_devices:
+        return purifier_ids.get(purifier_status)
+    try:
+        return fleet_groups.members(group, zone)
+    except KeyError:
+        kind, name = ("group", group) if group is not None else ("zone", zone)
+        raise HTTPException(status_code=404, detail=f"Unknown {kind} '{name}'")
+
+@app.post("/purifiers/control")
+async def control_purifiers(command: BulkControl):
+    """Apply one control command to many purifiers
+
+    Select them with `device_ids`, a `group` or `zone` from PURIFIER_GROUPS,
+    or `all: true` for every known purifier. Devices that got the same
+    command within CONTROL_COALESCE_SECONDS are skipped and counted as coalesced.
+    """
+    targets = select_purifiers(command.device_ids, command.group, command.zone, command.all)
+    changes = command.control.dict()
+    selected, coalesced = command_coalescer.select(targets, changes)
+    update_statuses(selected, changes)
+    return {"applied": len(selected), "coalesced": coalesced}
+
+@app.get("/purifiers/status")
+async def get_purifiers_status(ids: Optional[str] = None, group: Optional[str] = None,
+                               zone: Optional[str] = None, cursor: Optional[str] = None, limit: int = 100):
+    """Status of many purifiers, one page at a time
+
+    `ids` (comma-separated), `group` or `zone` pick the purifiers, by default
+    the whole fleet. Pages hold up to `limit` purifiers in ID order; pass the
+    returned `next_cursor` as `cursor` for the next page.
+    """
+    if not 1 <= limit <= 1000:
+        raise HTTPException(status_code=400, detail="limit must be between 1 and 1000")
+    device_ids = [i for i in ids.split(",") if i] if ids is not None else None
+    selectors = (device_ids, group, zone)
+    if all(selector is None for selector in selectors):
+        sorted_ids = purifier_ids.get(purifier_status)
+    else:
+        sorted_ids = sorted(set(select_purifiers(device_ids, group, zone, False)))
+    selected, next_cursor = page(sorted_ids, cursor, limit)
+    return {
+        "devices": {purifier_id: ensure_status(purifier_id) for purifier_id in selected},
+        "next_cursor": next_cursor,
+        "total": len(sorted_ids)
+    }
+
+@app.get("/state/stats")
+async def get_status_store_stats():
+    """Write-behind log and snapshot counters of the status store"""
+    if status_store is None:
+        raise HTTPException(status_code=404, detail="PURIFIER_STATE_DIR is not set")
+    return status_store.stats()
+
+# Records serialized per chunk when streaming NDJSON
+NDJSON_CHUNK_SIZE = 500
+
+def _index_after_seq(records: List[Dict], seq: int) -> int:
+    """Binary search for the first record whose sequence number is greater than `seq`"""
+    lo, hi = 0, len(records)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if records[mid]["seq"] <= seq:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+def select_history(start: Optional[str] = None, end: Optional[str] = None,
+                   hour_of_day: Optional[str] = None, since: Optional[int] = None):
+    """Current history list and the positions, in sequence order, of records within
+    [start, end] whose local hour is in `hour_of_day` (e.g. "7-10,16-19")
+
+    `since` skips records with a sequence number at or below the cursor. The
+    index answers with binary searches, so the cost follows the rows selected.
+    """
+    start_epoch = parse_timestamp(start) if start else None
+    end_epoch = parse_timestamp(end) if end else None
+    hours = parse_hours(hour_of_day) if hour_of_day else None
+    # Bind the current list; trimming rebinds historical_data, so the snapshot
+    # and the positions stay valid while a slow client reads from it
+    records = historical_data
+    first = _index_after_seq(records, since) if since else 0
+    return records, history_index.select(start_epoch, end_epoch, hours, first)
+
+def iter_history(start: Optional[str] = None, end: Optional[str] = None,
+                 limit: Optional[int] = None, since: Optional[int] = None,
+                 hour_of_day: Optional[str] = None) -> Iterator[Dict]:
+    """Return an iterator over history records within [start, end], up to `limit` records
+
+    Bounds are parsed up front so malformed timestamps fail before streaming starts.
+    """
+    if limit is not None and limit < 0:
+        raise ValueError("limit must not be negative")
+    records, positions = select_history(start, end, hour_of_day, since)
+    return _iter_records(records, positions, limit)
+
+def _iter_records(records: List[Dict], positions, limit: Optional[int]) -> Iterator[Dict]:
+    if limit is not None:
+        positions = positions[:limit]
+    for i in positions:
+        yield records[i]
+
+def iter_ndjson(records: Iterator[Dict], chunk_size: int = NDJSON_CHUNK_SIZE) -> Iterator[bytes]:
+    """Serialize records as newline-delimited JSON, `chunk_size` lines per chunk"""
+    lines = []
+    for record in records:
+        lines.append(dumps(record))
+        if len(lines) >= chunk_size:
+            yield b"\n".join(lines) + b"\n"
+            lines = []
+    if lines:
+        yield b"\n".join(lines) + b"\n"
+
+def downsample_records(records: List[Dict], max_points: int) -> List[Dict]:
+    """Keep at most `max_points` records, preserving the shape of the AQI and power traces (LTTB)
+
+    Records are in arrival order, where late readings break epoch order, so
+    LTTB runs over them sorted by epoch; the kept records stay in arrival order.
+    """
+    if len(records) <= max_points:
+        return records
+    n = len(records)
+    x = np.fromiter((r["epoch"] for r in records), dtype=np.float64, count=n)
+    aqi = np.fromiter((r["aqi_value"] for r in records), dtype=np.float64, count=n)
+    power = np.fromiter((r["power_level"] for r in records), dtype=np.float64, count=n)
+    if np.all(x[1:] >= x[:-1]):
+        return [records[i] for i in downsample_indices(x, [aqi, power], max_points)]
+    order = np.argsort(x, kind="stable")
+    kept = order[downsample_indices(x[order], [aqi[order], power[order]], max_points)]
+    return [records[i] for i in np.sort(kept)]
+
+def _check_max_points(max_points: Optional[int]):
+    if max_points is not None and max_points < 3:
+        raise HTTPException(status_code=400, detail="max_points must be at least 3")
+
+def history_cursor(seq: int) -> str:
+    """Delta-sync cursor for a sequence number; the boot ID tells cursors of earlier processes apart"""
+    return f"{HISTORY_BOOT_ID}-{seq}"
+
+def parse_history_cursor(cursor: str) -> Optional[int]:
+    """Sequence number of a cursor from this process ("0" starts from the beginning),
+    or None for a cursor from another process"""
+    if cursor == "0":
+        return 0
+    boot_id, _, seq = cursor.rpartition("-")
+    if boot_id != HISTORY_BOOT_ID:
+        return None
+    try:
+        return int(seq)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {cursor}")
+
+def history_validators(partition: Optional[DeviceHistory] = None) -> Dict[str, str]:
+    """ETag and Last-Modified headers for the current history version, or for one device's partition"""
+    version, modified_at = (history_version, history_modified_at) if partition is None else \
+        (f"{partition.device_id}-{partition.generation}-{partition.version}", partition.modified_at)
+    return {
+        "ETag": f'W/"{HISTORY_BOOT_ID}-{version}"',
+        "Last-Modified": formatdate(modified_at, usegmt=True),
+        "Cache-Control": "no-cache"
+    }
+
+def is_not_modified(request: Request, validators: Dict[str, str]) -> bool:
+    """Check If-None-Match (preferred) or If-Modified-Since against the validators' version"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        # Weak comparison: W/"x" and "x" refer to the same version
+        current = validators["ETag"].replace("W/", "")
+        return any(tag.strip().replace("W/", "") == current for tag in if_none_match.split(","))
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        # HTTP dates have one-second resolution, so compare the formatted Last-Modified
+        return parsedate_to_datetime(validators["Last-Modified"]).timestamp() <= since
+    return False
+
+def degrade_response(request: Request, max_points: Optional[int],
+                     validators: Dict[str, str]):
+    """(max_points, headers) for a response, capped to DEGRADED_MAX_POINTS when admitted under load
+
+    Degraded responses drop the validators so clients never cache them as the full history.
+    """
+    if not getattr(request.state, "degraded", False):
+        return max_points, validators
+    return min(max_points or DEGRADED_MAX_POINTS, DEGRADED_MAX_POINTS), \
+        {"Cache-Control": "no-store", "X-Degraded": "1"}
+
+def not_modified_response(validators: Dict[str, str]) -> Response:
+    return Response(status_code=304, headers=validators)
 
 @app.get("/analytics/daily")
-async def get_daily_analytics():
-    """Get analytics data for the last 24 hours"""
-    return historical_data
+async def get_daily_analytics(request: Request, start: Optional[str] = None, end: Optional[str] = None,
+                              limit: Optional[int] = None, stream: bool = False,
+                              max_points: Optional[int] = None, since: Optional[str] = None,
+                              hour_of_day: Optional[str] = None):
+    """Get analytics data for the last 24 hours
+
+    `start`/`end` are ISO timestamps bounding the range, `hour_of_day` keeps
+    records from the given local hours (e.g. "7-10,16-19") and `limit` caps the
+    number of records. `max_points` downsamples the result for charting.
+    With `stream=true` the records are sent as NDJSON in chunks, so the full
+    response is never built in memory.
+
+    With `since=<cursor>` only records added after the cursor are returned, as
+    {"records": [...], "cursor": next_cursor, "reset": bool}; start with
+    `since=0`. Every record carries its `seq`. Cursors are "<boot ID>-<seq>", so
+    a cursor from before a restart (or ahead of the server) sets `reset` and
+    returns the whole history.
+
+    Responses carry ETag/Last-Modified; a matching conditional request gets
+    304 without the history being read or serialized. Under load, responses
+    without `since` are downsampled and marked with X-Degraded.
+    """
+    _check_max_points(max_points)
+    validators = history_validators()
+    if is_not_modified(request, validators):
+        return not_modified_response(validators)
+    if since is None:
+        # Load never downsamples delta syncs: records left out would be skipped for good
+        # (an explicit max_points still applies; the dashboard does not send one with since)
+        max_points, validators = degrade_response(request, max_points, validators)
+    latest_seq = history_seq
+    reset = False
+    if since is not None:
+        since = parse_history_cursor(since)
+        reset = since is None or since > latest_seq
+        if reset:
+            since = 0
+    try:
+        records = iter_history(start, end, limit, since, hour_of_day)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if stream:
+        if max_points is not None:
+            records = iter(downsample_records(list(records), max_points))
+        headers = dict(validators)
+        if limit is None:
+            headers["X-Next-Cursor"] = history_cursor(latest_seq)
+        return StreamingResponse(iter_ndjson(records), media_type="application/x-ndjson",
+                                 headers=headers)
+    if since is None and start is None and end is None and hour_of_day is None and \
+            limit is None and max_points is None:
+        return FastJSONResponse(historical_data, headers=validators)
+    
+    selected = list(records)
+    # A limit may stop short of the newest record; resume right after the last one sent
+    cursor = latest_seq
+    if limit is not None and selected and len(selected) >= limit:
+        cursor = selected[-1]["seq"]
+    if max_points is not None:
+        selected = downsample_records(selected, max_points)
+    if since is None:
+        return FastJSONResponse(selected, headers=validators)
+    return FastJSONResponse({"records": selected, "cursor": history_cursor(cursor), "reset": reset},
+                            headers=validators)
+
+@app.get("/analytics/trends")
+async def get_trend_analytics(request: Request, start: Optional[str] = None, end: Optional[str] = None,
+                              tier: Optional[str] = None, max_points: int = 2000):
+    """Long-term trends from the rollup tiers
+
+    Returns per-bucket count and mean/min/max of AQI, power level and every
+    sensor as columns. Defaults to the last 7 days; without `tier` ("1m" or
+    "1h") the finest tier covering `start` within `max_points` buckets is used.
+    """
+    _check_max_points(max_points)
+    validators = history_validators()
+    if is_not_modified(request, validators):
+        return not_modified_response(validators)
+    max_points, validators = degrade_response(request, max_points, validators)
+    now = time.time()
+    try:
+        end_epoch = parse_timestamp(end) if end else now
+        start_epoch = parse_timestamp(start) if start else end_epoch - 7 * 24 * 3600
+        selected = retention_tiers.get(tier) if tier else \
+            retention_tiers.select(start_epoch, end_epoch, now, max_points)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return FastJSONResponse({
+        "tier": selected.name,
+        "resolution_seconds": selected.resolution,
+        "columns": selected.query(start_epoch, end_epoch)
+    }, headers=validators)
+
+@app.get("/analytics/export.npz")
+async def export_history_npz(request: Request, compress: bool = False, max_points: Optional[int] = None,
+                             start: Optional[str] = None, end: Optional[str] = None,
+                             hour_of_day: Optional[str] = None):
+    """Export the history as columnar NPZ with sensor_data flattened into columns
+
+    `start`, `end` and `hour_of_day` filter the records as on /analytics/daily.
+    """
+    _check_max_points(max_points)
+    validators = history_validators()
+    if is_not_modified(request, validators):
+        return not_modified_response(validators)
+    max_points, validators = degrade_response(request, max_points, validators)
+    records = historical_data
+    if start is not None or end is not None or hour_of_day is not None:
+        try:
+            records, positions = select_history(start, end, hour_of_day)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+        records = [records[i] for i in positions]
+    if max_points is not None:
+        records = downsample_records(records, max_points)
+    content = columns_to_npz(history_to_columns(records), compress=compress)
+    return Response(
+        content,
+        media_type=NPZ_MEDIA_TYPE,
+        headers={"Content-Disposition": 'attachment; filename="history.npz"', **validators}
+    )
+
+# (history_version, metrics) of the last efficiency computation
+_efficiency_cache = (None, None)
 
 @app.get("/analytics/efficiency")
-async def get_efficiency_metrics():
-    """Calculate efficiency metrics"""
-    if not historical_data:
+async def get_efficiency_metrics(request: Request):
+    """Calculate efficiency metrics, recomputed only when the history changes"""
+    global _efficiency_cache
+    validators = history_validators()
+    if is_not_modified(request, validators):
+        return not_modified_response(validators)
+    version, result = _efficiency_cache
+    if version != history_version:
+        result = fleet_efficiency_metrics()
+        _efficiency_cache = (history_version, result)
+    return FastJSONResponse(result, headers=validators)
+
+def efficiency_metrics(summary: Dict, energy: Optional[Dict]) -> Dict:
+    """Energy, AQI and cost metrics from a history summary and the energy over its span"""
+    if not summary["records"]:
         return {
             "total_energy_consumption": 0,
             "average_aqi": 0,
             "peak_power_usage": 0,
             "estimated_daily_cost": 0
         }
-    
-    # Calculate metrics
-    power_levels = [d["power_level"] for d in historical_data]
-    aqi_values = [d["aqi_value"] for d in historical_data]
-    
-    # Assume each power level unit consumes 100W
-    total_energy = sum(power_levels) * 0.1  # kWh
-    avg_aqi = sum(aqi_values) / len(aqi_values)
-    peak_power = max(power_levels)
-    
-    # Assume electricity cost of $0.12 per kWh
-    daily_cost = total_energy * 0.12
-    
     return {
-        "total_energy_consumption": total_energy * 1000,  # Convert to Wh
-        "average_aqi": avg_aqi,
-        "peak_power_usage": peak_power,
-        "estimated_daily_cost": daily_cost
+        "total_energy_consumption": energy["energy_wh"],
+        "average_aqi": summary["aqi_sum"] / summary["records"],
+        "peak_power_usage": summary["peak_power"],
+        "estimated_daily_cost": energy["cost"]
     }
 
+def fleet_efficiency_metrics() -> Dict:
+    """Fleet-wide metrics merged from the per-device summaries
+
+    Energy and cost come from the ledger's time-integrated power over the
+    history span.
+    """
+    summary = history_partitions.fleet_summary()
+    energy = energy_ledger.energy(summary["start"], summary["end"]) if summary["records"] else None
+    return efficiency_metrics(summary, energy)
+
+def device_partition(purifier_id: str) -> DeviceHistory:
+    partition = history_partitions.get(purifier_id)
+    if partition is None:
+        raise HTTPException(status_code=404, detail=f"No history for purifier '{purifier_id}'")
+    return partition
+
+@app.get("/purifier/{purifier_id}/analytics")
+async def get_purifier_analytics(request: Request, purifier_id: str,
+                                 start: Optional[str] = None, end: Optional[str] = None,
+                                 limit: Optional[int] = None, max_points: Optional[int] = None,
+                                 hour_of_day: Optional[str] = None):
+    """History records of one purifier, filtered as on /analytics/daily
+
+    Served from the purifier's own partition and index, so other devices'
+    records are never read.
+    """
+    _check_max_points(max_points)
+    if limit is not None and limit < 0:
+        raise HTTPException(status_code=400, detail="limit must not be negative")
+    partition = device_partition(purifier_id)
+    validators = history_validators(partition)
+    if is_not_modified(request, validators):
+        return not_modified_response(validators)
+    max_points, validators = degrade_response(request, max_points, validators)
+    try:
+        records, positions = partition.select(
+            parse_timestamp(start) if start else None,
+            parse_timestamp(end) if end else None,
+            parse_hours(hour_of_day) if hour_of_day else None
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    selected = list(_iter_records(records, positions, limit))
+    if max_points is not None:
+        selected = downsample_records(selected, max_points)
+    return FastJSONResponse(selected, headers=validators)
+
+@app.get("/purifier/{purifier_id}/efficiency")
+async def get_purifier_efficiency(request: Request, purifier_id: str):
+    """Efficiency metrics of one purifier over its history"""
+    partition = device_partition(purifier_id)
+    validators = history_validators(partition)
+    if is_not_modified(request, validators):
+        return not_modified_response(validators)
+    summary = partition.summary()
+    energy = energy_ledger.device_energy(purifier_id, summary["start"], summary["end"]) \
+        if summary["records"] else None
+    return FastJSONResponse(efficiency_metrics(summary, energy), headers=validators)
+
+@app.get("/analytics/energy")
+async def get_energy(start: Optional[str] = None, end: Optional[str] = None,
+                     device_id: Optional[str] = None):
+    """Energy (Wh) and cost over a time range, per device and in total
+
+    Defaults to the last 24 hours. Each device's ledger answers with two binary
+    searches over its cumulative energy, whatever the history length. A start
+    after the end is rejected with 400.
+    """
+    try:
+        end_epoch = parse_timestamp(end) if end else time.time()
+        start_epoch = parse_timestamp(start) if start else end_epoch - 24 * 3600
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if start_epoch > end_epoch:
+        raise HTTPException(status_code=400, detail="start must not be after end")
+    if device_id is not None and device_id not in energy_ledger.devices:
+        raise HTTPException(status_code=404, detail=f"No energy readings for device '{device_id}'")
+    return energy_ledger.energy(start_epoch, end_epoch, device_id)
+
+@app.get("/metrics")
+async def get_metrics():
+    """Expose latency histograms, counters and gauges in Prometheus text format"""
+    return Response(metrics.render(), media_type=METRICS_CONTENT_TYPE)
+
+@app.post("/debug/profile/window")
+async def open_debug_window(seconds: float = 60.0):
+    """Trace and profile every request for the next `seconds`"""
+    if not 0 < seconds <= 3600:
+        raise HTTPException(status_code=400, detail="seconds must be between 0 and 3600")
+    debug_mode.open_window(seconds)
+    return {"debug_window_seconds": seconds}
+
+@app.delete("/debug/profile/window")
+async def close_debug_window():
+    """Stop an open debug window early"""
+    debug_mode.close_window()
+    return {"debug_window_seconds": 0}
+
+@app.get("/debug/profile")
+async def get_profile(reset: bool = False):
+    """Sampled stacks in folded format, ready for flamegraph.pl or speedscope"""
+    return PlainTextResponse(debug_mode.profiler.collapsed(reset=reset))
+
+@app.get("/debug/traces")
+async def get_traces():
+    """Most recent traced requests with their spans"""
+    return list(debug_mode.recent_traces)
+
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """Handle WebSocket connections for real-time updates"""
     await websocket.accept()
+    ws_connections.inc()
+    key = device_key(websocket.scope)
     try:
         while True:
             # Receive sensor data
             data = await websocket.receive_text()
-            sensor_data = json.loads(data)
-            
-            # Process data through prediction endpoint
-            prediction_data = SensorData(**sensor_data)
-            result = await predict_aqi(prediction_data)
+            ws_messages.inc()
             
-            # Send back results
-            await websocket.send_json(result)
+            # Each message is admitted like a /predict request; shed ones get an error frame
+            decision = admission.admit(INGEST, key)
+            if not decision.admitted:
+                await websocket.send_text(dumps_text({
+                    "error": "Request shed",
+                    "reason": decision.reason,
+                    "retry_after": int(retry_after_header(decision.retry_after))
+                }))
+                continue
+            try:
+                with stage_latency.time("validation"):
+                    sensor_data = loads(data)
+                    # Optional debug fields travel alongside the readings
+                    debug_flag = sensor_data.pop("debug", False)
+                    correlation_id = sensor_data.pop("correlation_id", None)
+                    prediction_data = SensorData(**sensor_data)
+                
+                # Process data through the prediction pipeline
+                with debug_mode.request(_debug_requested(debug_flag), correlation_id) as trace:
+                    result = process_sensor_data(prediction_data)
+                    if trace is not None:
+                        correlation_id = trace.correlation_id
+                        result["trace"] = trace.to_dict()
+                if correlation_id:
+                    result["correlation_id"] = correlation_id
+                
+                # Send back results
+                with stage_latency.time("serialization"):
+                    message = dumps_text(result)
+                await websocket.send_text(message)
+            finally:
+                admission.release(INGEST)
+    except WebSocketDisconnect:
+        pass
     except Exception as e:
+        ws_errors.inc()
         print(f"WebSocket error: {str(e)}")
     finally:
-        await websocket.close()
+        if websocket.client_state == WebSocketState.CONNECTED:
+            await websocket.close()
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,119 @@
+import time
+from typing import Dict, List, Optional
+import numpy as np
+
+# Category names used across the API, with the upper AQI bound of each but the last
+CATEGORIES = np.array(["GOOD", "MODERATE", "UNHEALTHY", "VERY_UNHEALTHY", "HAZARDOUS"])
+CATEGORY_BOUNDS = np.array([50, 100, 150, 200])
+
+# EPA breakpoints per pollutant in the units the sensors report:
+# (concentration low, concentration high, index low, index high) rows.
+# PM2.5 follows the 2024 revision; O3 uses the 8-hour table up to 200 ppb and the
+# 1-hour table's hazardous bands above it, holding 300 in between; NO2 and SO2 use
+# the 1-hour tables.
+BREAKPOINTS = {
+    "pm25": [  # µg/m³, truncated to 0.1
+        (0.0, 9.0, 0, 50), (9.1, 35.4, 51, 100), (35.5, 55.4, 101, 150),
+        (55.5, 125.4, 151, 200), (125.5, 225.4, 201, 300), (225.5, 325.4, 301, 500)
+    ],
+    "pm10": [  # µg/m³, truncated to integer
+        (0, 54, 0, 50), (55, 154, 51, 100), (155, 254, 101, 150), (255, 354, 151, 200),
+        (355, 424, 201, 300), (425, 504, 301, 400), (505, 604, 401, 500)
+    ],
+    "no2": [  # ppb, truncated to integer
+        (0, 53, 0, 50), (54, 100, 51, 100), (101, 360, 101, 150), (361, 649, 151, 200),
+        (650, 1249, 201, 300), (1250, 1649, 301, 400), (1650, 2049, 401, 500)
+    ],
+    "so2": [  # ppb, truncated to integer
+        (0, 35, 0, 50), (36, 75, 51, 100), (76, 185, 101, 150), (186, 304, 151, 200),
+        (305, 604, 201, 300), (605, 804, 301, 400), (805, 1004, 401, 500)
+    ],
+    "co": [  # ppm, truncated to 0.1
+        (0.0, 4.4, 0, 50), (4.5, 9.4, 51, 100), (9.5, 12.4, 101, 150), (12.5, 15.4, 151, 200),
+        (15.5, 30.4, 201, 300), (30.5, 40.4, 301, 400), (40.5, 50.4, 401, 500)
+    ],
+    "o3": [  # ppb, truncated to integer
+        (0, 54, 0, 50), (55, 70, 51, 100), (71, 85, 101, 150), (86, 105, 151, 200),
+        (106, 200, 201, 300), (201, 404, 300, 300), (405, 504, 301, 400), (505, 604, 401, 500)
+    ]
+}
+POLLUTANTS = list(BREAKPOINTS)
+
+# Decimal places each concentration is truncated to before the table lookup
+TRUNCATION = {"pm25": 1, "pm10": 0, "no2": 0, "so2": 0, "co": 1, "o3": 0}
+
+_TABLES = {name: np.array(rows, dtype=np.float64).T for name, rows in BREAKPOINTS.items()}
+
+def _sub_index(concentration: np.ndarray, pollutant: str) -> np.ndarray:
+    """EPA sub-index for one pollutant over an array of concentrations"""
+    c_lo, c_hi, i_lo, i_hi = _TABLES[pollutant]
+    scale = 10.0 ** TRUNCATION[pollutant]
+    c = np.floor(np.clip(concentration, 0, c_hi[-1]) * scale + 1e-9) / scale
+    band = np.searchsorted(c_hi, c, side="left")
+    return np.rint((i_hi[band] - i_lo[band]) / (c_hi[band] - c_lo[band]) * (c - c_lo[band]) + i_lo[band])
+
+def sub_indices(features: np.ndarray) -> np.ndarray:
+    """(n, 6) per-pollutant sub-indices from an (n, 10) feature matrix in model order"""
+    features = np.atleast_2d(np.asarray(features, dtype=np.float64))
+    return np.column_stack([_sub_index(features[:, i], name) for i, name in enumerate(POLLUTANTS)])
+
+def compute_aqi(features: np.ndarray) -> np.ndarray:
+    """Overall AQI (the largest sub-index) for each row of an (n, 10) feature matrix"""
+    if len(features) == 0:
+        return np.zeros(0)
+    return sub_indices(features).max(axis=1)
+
+def breakdown(features: np.ndarray) -> List[Dict]:
+    """Per-row sub-indices, overall AQI and the dominant pollutant"""
+    indices = sub_indices(features)
+    dominant = indices.argmax(axis=1)
+    return [
+        {"aqi": row.max(), "dominant_pollutant": POLLUTANTS[d], "sub_indices": dict(zip(POLLUTANTS, row.tolist()))}
+        for row, d in zip(indices, dominant)
+    ]
+
+def aqi_categories(aqi_values: np.ndarray) -> np.ndarray:
+    """Vectorized AQI -> category name"""
+    return CATEGORIES[np.searchsorted(CATEGORY_BOUNDS, aqi_values, side="left")]
+
+def aqi_category(aqi_value: float) -> str:
+    """Get AQI category based on value"""
+    return str(CATEGORIES[np.searchsorted(CATEGORY_BOUNDS, aqi_value, side="left")])
+
+class LatencyFallback:
+    """Decides when to score with the breakpoint tables instead of the model
+
+    Keeps an exponentially weighted average of model call latency. While it is
+    over `budget` seconds the fallback is active, except for one probe call to
+    the model every `probe_interval` seconds so recovery is noticed.
+    budget=0 disables the fallback.
+    """
+    def __init__(self, budget: float, probe_interval: float = 5.0, alpha: float = 0.2):
+        self.budget = budget
+        self.probe_interval = probe_interval
+        self.alpha = alpha
+        self.average: Optional[float] = None
+        self.engaged = False
+        self.activations = 0
+        self._next_probe = 0.0
+
+    def active(self) -> bool:
+        if not self.engaged:
+            return False
+        now = time.monotonic()
+        if now >= self._next_probe:
+            self._next_probe = now + self.probe_interval
+            return False
+        return True
+
+    def record(self, seconds: float):
+        """Record the latency of one model call"""
+        if self.average is None:
+            self.average = seconds
+        else:
+            self.average = self.alpha * seconds + (1 - self.alpha) * self.average
+        engaged = self.budget > 0 and self.average > self.budget
+        if engaged and not self.engaged:
+            self.activations += 1
+            self._next_probe = time.monotonic() + self.probe_interval
+        self.engaged = engaged
@@ -0,0 +1,183 @@
+import argparse
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+from analytics_client import PEAK_HOURS
+from dashboards import DEFAULT_RENDER_MODE, RENDER_MODES, shared_plotlyjs, write_dashboard
+from energy import DEFAULT_MAX_GAP_SECONDS
+from offline_analytics import add_derived_columns, history_metrics, read_history
+
+# Bump when report contents change so cached days are rebuilt
+REPORT_VERSION = 2
+
+MANIFEST_FILE = "manifest.json"
+
+def day_fingerprint(day_df: pd.DataFrame, options: str) -> str:
+    """Hash of everything a device-day report is built from"""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(f"{REPORT_VERSION}:{options}".encode())
+    for column in ("epoch", "aqi_value", "power_level", "energy_wh", "cost"):
+        digest.update(np.ascontiguousarray(day_df[column].to_numpy(dtype=np.float64)).tobytes())
+    return digest.hexdigest()
+
+def load_manifest(out_dir: str) -> Dict[str, Dict]:
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_manifest(out_dir: str, manifest: Dict[str, Dict]):
+    path = os.path.join(out_dir, MANIFEST_FILE)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(path + ".tmp", path)
+
+# Per-process state, set up once by the pool initializer
+_kernel = None
+
+def _init_worker():
+    global _kernel
+    import aiml
+    _kernel = aiml.Kernel()
+    _kernel.learn("aiml_brain/purifier_rules.aiml")
+
+def render_device_days(device_id: str, days: List[Dict], out_dir: str, peak_hours: str,
+                       render: str = DEFAULT_RENDER_MODE) -> List[Dict]:
+    """Write the efficiency, 24-hour and recommendation reports of one device for the given days
+
+    Each day is {"day", "fingerprint", "frame"} with derived columns already added.
+    Returns one manifest entry per day.
+    """
+    from analyze_efficiency import create_efficiency_dashboard
+    from generate_recommendations import calculate_potential_savings, get_aiml_recommendations
+    from show_24hr_analytics import create_24hr_dashboard
+
+    entries = []
+    for task in days:
+        day, df = task["day"], task["frame"].reset_index(drop=True)
+        # Running totals restart at midnight for a day report
+        df['cumulative_energy_wh'] = df['energy_wh'].cumsum()
+        df['cumulative_cost'] = df['cost'].cumsum()
+        metrics = history_metrics(df, peak_hours)
+        day_dir = os.path.join(out_dir, day)
+        os.makedirs(day_dir, exist_ok=True)
+        title = f"{device_id} {day}"
+
+        # All reports load one plotly.js from the output directory instead of embedding it
+        fig = create_efficiency_dashboard(df, metrics, render)
+        fig.update_layout(title_text=f"Smart Air Purifier Efficiency Analysis - {title}")
+        write_dashboard(fig, os.path.join(day_dir, f"{device_id}-efficiency.html"), out_dir)
+        fig = create_24hr_dashboard(df, render)
+        fig.update_layout(title_text=f"24-Hour Smart Air Purifier Analytics Dashboard - {title}")
+        write_dashboard(fig, os.path.join(day_dir, f"{device_id}-24hr.html"), out_dir)
+
+        summary = {
+            "device_id": device_id,
+            "day": day,
+            "readings": metrics["readings"],
+            "avg_aqi": metrics["avg_aqi"],
+            "max_aqi": metrics["max_aqi"],
+            "avg_power": metrics["avg_power"],
+            "peak_hours_avg_power": metrics["peak_hours_avg_power"],
+            "energy_wh": metrics["total_energy_wh"],
+            "cost": metrics["total_cost"],
+            "avg_efficiency": metrics["avg_efficiency"],
+            "savings": calculate_potential_savings(metrics),
+            "recommendations": get_aiml_recommendations(_kernel, metrics)
+        }
+        with open(os.path.join(day_dir, f"{device_id}-recommendations.json"), "w") as f:
+            json.dump(summary, f, indent=2)
+        entries.append({"fingerprint": task["fingerprint"], "summary": summary})
+    return entries
+
+def day_bounds(start: date, end: date):
+    """Local epoch seconds of midnight on `start` and of midnight after `end`"""
+    first = datetime.combine(start, datetime.min.time()).timestamp()
+    last = datetime.combine(end + timedelta(days=1), datetime.min.time()).timestamp()
+    return first, last
+
+def plan_reports(df: pd.DataFrame, manifest: Dict[str, Dict], options: str, force: bool = False):
+    """Split derived history into device-days; returns (tasks per device, unchanged count)
+
+    Days whose fingerprint matches the manifest are skipped, so only new or
+    changed device-days reach the pool.
+    """
+    tasks: Dict[str, List[Dict]] = {}
+    unchanged = 0
+    days = df['timestamp'].dt.strftime("%Y-%m-%d")
+    for (device_id, day), day_df in df.groupby([df['device_id'], days], sort=True):
+        fingerprint = day_fingerprint(day_df, options)
+        if not force and manifest.get(f"{day}/{device_id}", {}).get("fingerprint") == fingerprint:
+            unchanged += 1
+            continue
+        tasks.setdefault(device_id, []).append({"day": day, "fingerprint": fingerprint, "frame": day_df})
+    return tasks, unchanged
+
+def generate_reports(paths: List[str], start: date, end: date, out_dir: str,
+                     workers: Optional[int] = None, device_id: Optional[str] = None,
+                     peak_hours: str = PEAK_HOURS, force: bool = False,
+                     render: str = DEFAULT_RENDER_MODE) -> Dict:
+    """Build every device-day report in [start, end] from history files across a process pool"""
+    first, last = day_bounds(start, end)
+    # Read a little before the range so the first reading of the range has its energy segment
+    df = read_history(paths, first - DEFAULT_MAX_GAP_SECONDS, last, device_id)
+    df = add_derived_columns(df)
+    df = df[(df['epoch'] >= first) & (df['epoch'] < last)]
+
+    os.makedirs(out_dir, exist_ok=True)
+    manifest = load_manifest(out_dir)
+    # The shared plotly.js is written once here rather than raced for by the workers
+    shared_plotlyjs(out_dir)
+    tasks, unchanged = plan_reports(df, manifest, f"{peak_hours}:{render}", force)
+    built = 0
+    if not tasks:
+        return {"built": 0, "unchanged": unchanged, "devices": len(df['device_id'].unique())}
+    try:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            futures = [pool.submit(render_device_days, device, days, out_dir, peak_hours, render)
+                       for device, days in tasks.items()]
+            for future in as_completed(futures):
+                for entry in future.result():
+                    summary = entry["summary"]
+                    manifest[f"{summary['day']}/{summary['device_id']}"] = entry
+                    built += 1
+    finally:
+        # Keep what finished even if a worker failed, so a rerun resumes
+        save_manifest(out_dir, manifest)
+    return {"built": built, "unchanged": unchanged, "devices": len(df['device_id'].unique())}
+
+def parse_day(value: str) -> date:
+    return date.fromisoformat(value)
+
+def main():
+    parser = argparse.ArgumentParser(description="Efficiency, 24-hour and recommendation reports per device and day")
+    parser.add_argument("paths", nargs="+",
+                        help="HISTORY_ARCHIVE_DIR directories, .npz exports or .jsonl history records")
+    parser.add_argument("--start", type=parse_day, help="First day (YYYY-MM-DD), default yesterday")
+    parser.add_argument("--end", type=parse_day, help="Last day (YYYY-MM-DD), default --start")
+    parser.add_argument("--out", default="reports", help="Output directory")
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    parser.add_argument("--device", help="Only this purifier")
+    parser.add_argument("--peak-hours", default=PEAK_HOURS)
+    parser.add_argument("--force", action="store_true", help="Rebuild reports even if unchanged")
+    parser.add_argument("--render", choices=RENDER_MODES, default=DEFAULT_RENDER_MODE,
+                        help="Dashboard traces: svg, webgl or auto (WebGL for long series)")
+    args = parser.parse_args()
+
+    start = args.start or date.today() - timedelta(days=1)
+    end = args.end or start
+    began = time.perf_counter()
+    result = generate_reports(args.paths, start, end, args.out, args.workers, args.device,
+                              args.peak_hours, args.force, args.render)
+    print(f"Built {result['built']} device-day reports for {result['devices']} device(s), "
+          f"{result['unchanged']} unchanged, in {time.perf_counter() - began:.1f} s -> {args.out}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import json
+import time
+from datetime import datetime
+from fastapi.encoders import jsonable_encoder
+from pydantic import BaseModel
+from serialization import dumps, loads, validate_batch, sensor_dicts
+
+# Same shape as app.SensorData; redefined so the benchmark does not load the model
+class SensorData(BaseModel):
+    pm25: float
+    pm10: float
+    no2: float
+    so2: float
+    co: float
+    o3: float
+    temperature: float
+    humidity: float
+    wind_speed: float
+    traffic_density: float
+    timestamp: str
+
+READING = {
+    "pm25": 35.5,
+    "pm10": 75.2,
+    "no2": 45.0,
+    "so2": 20.0,
+    "co": 1.2,
+    "o3": 35.0,
+    "temperature": 25.5,
+    "humidity": 65.0,
+    "wind_speed": 3.5,
+    "traffic_density": 0.4,
+    "timestamp": datetime.now().isoformat()
+}
+
+RESPONSE = {
+    "aqi_value": 152.78667504852655,
+    "aqi_category": "VERY_UNHEALTHY",
+    "power_level": 0.7639333752426328,
+    "recommendations": {
+        "air_quality": "Maintain current air quality levels",
+        "energy": "Current power level: 76.4%",
+        "weather": "No weather-specific recommendations"
+    }
+}
+
+def time_per_call(fn, iterations):
+    """Average seconds per call of fn over `iterations` runs"""
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) / iterations
+
+def before():
+    """Previous path: json parse, pydantic model, two .dict() calls, FastAPI's default encoder"""
+    data = SensorData(**json.loads(raw_message))
+    data.dict()
+    data.dict()
+    json.dumps(jsonable_encoder(RESPONSE)).encode()
+
+def after():
+    """Fast path: orjson parse, pydantic model, one .dict() call, orjson response"""
+    data = SensorData(**loads(raw_message))
+    data.dict()
+    dumps(RESPONSE)
+
+def batch_pydantic():
+    """A batch validated one pydantic model per reading"""
+    [SensorData(**row).dict() for row in loads(raw_batch)]
+
+def batch_bulk():
+    """A batch validated with one NumPy conversion"""
+    features, timestamps, _ = validate_batch(loads(raw_batch))
+    sensor_dicts(features, timestamps)
+
+raw_message = json.dumps(READING)
+BATCH_SIZE = 1000
+raw_batch = json.dumps([READING] * BATCH_SIZE)
+
+def main():
+    print("Serialization Microbenchmark")
+    print("=" * 50)
+
+    iterations = 20000
+    before_time = time_per_call(before, iterations)
+    after_time = time_per_call(after, iterations)
+    print("\nPer-request serialization overhead:")
+    print(f"Before (json + jsonable_encoder, 2x dict): {before_time * 1e6:.1f} µs")
+    print(f"After  (orjson, 1x dict):                  {after_time * 1e6:.1f} µs")
+    print(f"Speedup: {before_time / after_time:.2f}x")
+
+    iterations = 50
+    pydantic_time = time_per_call(batch_pydantic, iterations)
+    bulk_time = time_per_call(batch_bulk, iterations)
+    print(f"\nBatch validation ({BATCH_SIZE} readings):")
+    print(f"Per-reading pydantic: {pydantic_time / BATCH_SIZE * 1e6:.2f} µs/reading")
+    print(f"Bulk NumPy:           {bulk_time / BATCH_SIZE * 1e6:.2f} µs/reading")
+    print(f"Speedup: {pydantic_time / bulk_time:.2f}x")
+
+if __name__ == "__main__":
+    main()
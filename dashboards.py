@@ -0,0 +1,71 @@
+import os
+import numpy as np
+import plotly.graph_objects as go
+from plotly.offline import get_plotlyjs, get_plotlyjs_version
+from downsampling import DEFAULT_MAX_POINTS
+
+# "svg" always uses SVG traces, "webgl" always uses WebGL ones and "auto"
+# switches to WebGL for series longer than an SVG chart handles smoothly
+RENDER_MODES = ("auto", "svg", "webgl")
+DEFAULT_RENDER_MODE = os.getenv("DASHBOARD_RENDER", "auto")
+
+# Points per series above which "auto" draws with WebGL, and the cap per WebGL series
+WEBGL_THRESHOLD = DEFAULT_MAX_POINTS
+WEBGL_MAX_POINTS = 50000
+
+def check_render_mode(render: str):
+    if render not in RENDER_MODES:
+        raise ValueError(f"Invalid render mode '{render}', expected one of {list(RENDER_MODES)}")
+
+def use_webgl(n_points: int, render: str = DEFAULT_RENDER_MODE) -> bool:
+    check_render_mode(render)
+    return render == "webgl" or (render == "auto" and n_points > WEBGL_THRESHOLD)
+
+def max_plot_points(n_points: int, render: str = DEFAULT_RENDER_MODE) -> int:
+    """Downsampling cap per series: WebGL charts keep far more points than SVG ones"""
+    return WEBGL_MAX_POINTS if use_webgl(n_points, render) else DEFAULT_MAX_POINTS
+
+def time_values(timestamps) -> np.ndarray:
+    """Datetimes as float64 milliseconds since epoch
+
+    Plotly date axes accept them, and unlike date strings they are written to
+    the HTML as a compact binary typed array. Naive local times stay local.
+    """
+    return np.asarray(timestamps, dtype="datetime64[ms]").astype(np.int64).astype(np.float64)
+
+def values(series) -> np.ndarray:
+    """A series as a contiguous float32 array, written to the HTML as a typed array"""
+    return np.ascontiguousarray(series, dtype=np.float32)
+
+def line_trace(x, y, render: str = DEFAULT_RENDER_MODE, **kwargs):
+    """Scatter trace, drawn with WebGL for long series"""
+    trace = go.Scattergl if use_webgl(len(y), render) else go.Scatter
+    return trace(x=x, y=y, **kwargs)
+
+def bar_trace(x, y, color: str, render: str = DEFAULT_RENDER_MODE, **kwargs):
+    """Bar trace; long series become a filled WebGL step line, as there are no WebGL bars"""
+    if use_webgl(len(y), render):
+        return go.Scattergl(x=x, y=y, mode='lines', fill='tozeroy',
+                            line=dict(shape='hv', color=color, width=1), **kwargs)
+    return go.Bar(x=x, y=y, marker_color=color, **kwargs)
+
+def shared_plotlyjs(directory: str) -> str:
+    """Path of plotly.js in `directory`, written once per plotly.js version"""
+    path = os.path.join(directory, f"plotly-{get_plotlyjs_version()}.min.js")
+    if not os.path.exists(path):
+        os.makedirs(directory, exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(get_plotlyjs())
+        os.replace(path + ".tmp", path)
+    return path
+
+def write_dashboard(fig, path: str, plotlyjs_dir: str = None):
+    """Write a figure as HTML that loads a shared local plotly.js instead of inlining it
+
+    `plotlyjs_dir` defaults to the file's own directory; dashboards written
+    to several directories can share one copy by passing a common parent.
+    """
+    html_dir = os.path.dirname(os.path.abspath(path))
+    plotlyjs = shared_plotlyjs(plotlyjs_dir or html_dir)
+    src = os.path.relpath(plotlyjs, html_dir).replace(os.sep, "/")
+    fig.write_html(path, include_plotlyjs=src)
@@ -0,0 +1,120 @@
+import time
+from typing import Dict, Iterable, List, Optional, Set
+from history_index import HistoryIndex, trim_expired
+
+def summarize_records(records: List[Dict]) -> Dict:
+    """Mergeable summary of history records: count, AQI sum, peak power and time span"""
+    if not records:
+        return {"records": 0, "aqi_sum": 0.0, "peak_power": 0.0, "start": None, "end": None}
+    epochs = [d["epoch"] for d in records]
+    return {
+        "records": len(records),
+        "aqi_sum": sum(d["aqi_value"] for d in records),
+        "peak_power": max(d["power_level"] for d in records),
+        "start": min(epochs),
+        "end": max(epochs)
+    }
+
+def merge_summaries(summaries: Iterable[Dict]) -> Dict:
+    """Combine per-device summaries into one fleet-wide summary"""
+    merged = {"records": 0, "aqi_sum": 0.0, "peak_power": 0.0, "start": None, "end": None}
+    for summary in summaries:
+        if not summary["records"]:
+            continue
+        merged["records"] += summary["records"]
+        merged["aqi_sum"] += summary["aqi_sum"]
+        merged["peak_power"] = max(merged["peak_power"], summary["peak_power"])
+        merged["start"] = summary["start"] if merged["start"] is None else min(merged["start"], summary["start"])
+        merged["end"] = summary["end"] if merged["end"] is None else max(merged["end"], summary["end"])
+    return merged
+
+class DeviceHistory:
+    """One purifier's history records in arrival order, with their own epoch/hour index
+
+    `generation` tells a partition recreated after its device aged out from the
+    earlier one, whose versions started from the same number.
+    """
+    def __init__(self, device_id: str, generation: int = 0):
+        self.device_id = device_id
+        self.generation = generation
+        self.records: List[Dict] = []
+        self.index = HistoryIndex()
+        self.version = 0
+        self.modified_at = time.time()
+        self._summary = (None, None)
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def append(self, entry: Dict):
+        self.records.append(entry)
+        self.index.append(entry["epoch"])
+        self._changed()
+
+    def trim(self, cutoff: float):
+        records = trim_expired(self.records, self.index, cutoff)
+        if records is not self.records:
+            self.records = records
+            self._changed()
+
+    def _changed(self):
+        self.version += 1
+        self.modified_at = time.time()
+
+    def select(self, start: Optional[float] = None, end: Optional[float] = None,
+               hours: Optional[Set[int]] = None):
+        """This device's records and the positions matching the filters (see HistoryIndex.select)"""
+        return self.records, self.index.select(start, end, hours)
+
+    def summary(self) -> Dict:
+        """summarize_records() of this device, recomputed only after a change"""
+        version, summary = self._summary
+        if version != self.version:
+            summary = summarize_records(self.records)
+            self._summary = (self.version, summary)
+        return summary
+
+class HistoryPartitions:
+    """History split by purifier ID so per-device queries only touch that device's records
+
+    Appends trim the partitions they touch; the rest are swept at most once a
+    minute, so idle devices still age out without an O(devices) pass per reading.
+    Partitions left empty by a trim are dropped.
+    """
+    def __init__(self):
+        self.devices: Dict[str, DeviceHistory] = {}
+        self._next_sweep = 0.0
+        self._created = 0
+
+    def __len__(self) -> int:
+        return len(self.devices)
+
+    def get(self, device_id: str) -> Optional[DeviceHistory]:
+        return self.devices.get(device_id)
+
+    def append(self, entries: List[Dict]) -> Set[str]:
+        """Route records to their device partitions; returns the device IDs touched"""
+        touched = set()
+        for entry in entries:
+            device_id = entry["device_id"]
+            partition = self.devices.get(device_id)
+            if partition is None:
+                self._created += 1
+                partition = self.devices[device_id] = DeviceHistory(device_id, self._created)
+            partition.append(entry)
+            touched.add(device_id)
+        return touched
+
+    def trim(self, cutoff: float, touched: Iterable[str] = ()):
+        if cutoff >= self._next_sweep:
+            self._next_sweep = cutoff + 60
+            touched = list(self.devices)
+        for device_id in touched:
+            partition = self.devices[device_id]
+            partition.trim(cutoff)
+            if not partition.records:
+                del self.devices[device_id]
+
+    def fleet_summary(self) -> Dict:
+        """Fleet-wide summary merged from the cached per-device summaries"""
+        return merge_summaries(partition.summary() for partition in self.devices.values())
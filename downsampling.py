@@ -0,0 +1,76 @@
+import numpy as np
+from typing import Sequence
+
+# Default cap on points per chart series
+DEFAULT_MAX_POINTS = 2000
+
+def lttb_indices(x, y, n_out: int) -> np.ndarray:
+    """Largest-Triangle-Three-Buckets: indices of the `n_out` points that best keep the shape of y(x)
+
+    x must be sorted ascending. The first and last points are always kept.
+    Bucket averages are computed in one vectorized pass; the remaining loop
+    does one NumPy argmax per output point.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if n_out >= n or n <= 2:
+        return np.arange(n)
+    if n_out < 3:
+        raise ValueError("n_out must be at least 3")
+
+    # Bucket i covers [edges[i], edges[i + 1]) of the interior points
+    every = (n - 2) / (n_out - 2)
+    edges = (np.arange(n_out - 1) * every).astype(np.int64) + 1
+    edges[-1] = n - 1
+
+    # Average point of the following bucket; the last bucket looks at the final point
+    x_sums = np.concatenate(([0.0], np.cumsum(x)))
+    y_sums = np.concatenate(([0.0], np.cumsum(y)))
+    lo, hi = edges[1:-1], edges[2:]
+    next_x = np.append((x_sums[hi] - x_sums[lo]) / (hi - lo), x[-1])
+    next_y = np.append((y_sums[hi] - y_sums[lo]) / (hi - lo), y[-1])
+
+    selected = np.empty(n_out, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(n_out - 2):
+        start, stop = edges[i], edges[i + 1]
+        ax, ay = x[a], y[a]
+        # Twice the triangle area between the previous pick, each candidate and the next average
+        area = np.abs(
+            (ax - next_x[i]) * (y[start:stop] - ay) -
+            (ax - x[start:stop]) * (next_y[i] - ay)
+        )
+        a = start + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+def lttb(x, y, n_out: int):
+    """Downsample a single series, returning the kept (x, y) points"""
+    indices = lttb_indices(x, y, n_out)
+    return np.asarray(x)[indices], np.asarray(y)[indices]
+
+def downsample_indices(x, series: Sequence, max_points: int) -> np.ndarray:
+    """Indices that keep the shape of every series in at most `max_points` rows (three per series minimum)
+
+    Each series gets an equal share of the budget and the picks are merged, so
+    rows shared by several traces stay aligned on the same x values.
+    """
+    n = len(x)
+    if max_points >= n:
+        return np.arange(n)
+    per_series = max(3, max_points // max(1, len(series)))
+    return np.unique(np.concatenate([lttb_indices(x, y, per_series) for y in series]))
+
+def downsample_frame(df, max_points: int = DEFAULT_MAX_POINTS, x_column: str = 'timestamp',
+                     columns: Sequence[str] = ('aqi_value', 'power_level')):
+    """Downsample a history DataFrame for plotting, keeping the shape of `columns`"""
+    if len(df) <= max_points:
+        return df
+    x = np.asarray(df[x_column])
+    if np.issubdtype(x.dtype, np.datetime64):
+        x = x.astype('datetime64[ns]').astype(np.int64)
+    indices = downsample_indices(x, [np.asarray(df[c], dtype=np.float64) for c in columns], max_points)
+    return df.iloc[indices]
@@ -0,0 +1,218 @@
+import json
+import os
+from bisect import bisect_right
+from typing import Dict, Iterable, Optional
+import numpy as np
+
+# Segments between readings longer than this are treated as the purifier being
+# unreported rather than running at the average of the two power levels
+DEFAULT_MAX_GAP_SECONDS = 600.0
+
+class EnergyProfile:
+    """Power draw and electricity tariff of one purifier model"""
+    def __init__(self, max_watts: float = 50.0, tariff_per_kwh: float = 0.12):
+        self.max_watts = max_watts
+        self.tariff_per_kwh = tariff_per_kwh
+
+    def to_dict(self) -> Dict:
+        return {"max_watts": self.max_watts, "tariff_per_kwh": self.tariff_per_kwh}
+
+DEFAULT_PROFILE = EnergyProfile()
+
+def segment_energy(epochs: np.ndarray, power_levels: np.ndarray,
+                   max_gap: float = DEFAULT_MAX_GAP_SECONDS) -> np.ndarray:
+    """Trapezoidal power-level-seconds between consecutive readings (length n - 1)"""
+    dt = np.diff(epochs)
+    area = (power_levels[1:] + power_levels[:-1]) * 0.5 * dt
+    return np.where(dt <= max_gap, area, 0.0)
+
+def cumulative_energy_wh(epochs, power_levels, profile: EnergyProfile = DEFAULT_PROFILE,
+                         max_gap: float = DEFAULT_MAX_GAP_SECONDS) -> np.ndarray:
+    """Energy in Wh used from the first reading up to each reading, for time-ordered readings"""
+    epochs = np.asarray(epochs, dtype=np.float64)
+    power_levels = np.asarray(power_levels, dtype=np.float64)
+    if len(epochs) == 0:
+        return np.zeros(0)
+    cumulative = np.concatenate([[0.0], np.cumsum(segment_energy(epochs, power_levels, max_gap))])
+    return cumulative * profile.max_watts / 3600
+
+def cost_for(energy_wh, profile: EnergyProfile = DEFAULT_PROFILE):
+    return energy_wh / 1000 * profile.tariff_per_kwh
+
+class DeviceLedger:
+    """Time-ordered power readings of one purifier with cumulative energy prefix sums
+
+    In-order readings append in O(1). Late readings are buffered and merged in
+    one pass, with the prefix sums rebuilt from the earliest of them, at the end
+    of a record_many() batch or before the next query or trim. Range queries
+    are two binary searches plus interpolation inside the boundary segments.
+    """
+    def __init__(self, max_gap: float = DEFAULT_MAX_GAP_SECONDS):
+        self.max_gap = max_gap
+        self.epochs = []
+        self.levels = []
+        # Power-level-seconds from the first reading to each reading
+        self.cumulative = []
+        self._dirty_from = None
+        # Late (epoch, power_level) readings not merged yet, in arrival order
+        self._late = []
+
+    def __len__(self) -> int:
+        return len(self.epochs) + len(self._late)
+
+    def record(self, epoch: float, power_level: float):
+        if self.epochs and epoch < self.epochs[-1]:
+            self._late.append((epoch, power_level))
+            return
+        if self._dirty_from is None and not self._late:
+            self.cumulative.append(self.cumulative[-1] + self._segment(len(self.epochs), epoch, power_level)
+                                   if self.epochs else 0.0)
+        self.epochs.append(epoch)
+        self.levels.append(power_level)
+
+    def record_many(self, epochs: Iterable[float], power_levels: Iterable[float]):
+        for epoch, power_level in zip(epochs, power_levels):
+            self.record(epoch, power_level)
+        self._settle()
+
+    def _merge(self):
+        """Merge the late readings into place; equal epochs keep arrival order, as with insertion"""
+        late = sorted(self._late, key=lambda reading: reading[0])
+        self._late = []
+        i = bisect_right(self.epochs, late[0][0])
+        merged = sorted(list(zip(self.epochs[i:], self.levels[i:])) + late, key=lambda reading: reading[0])
+        self.epochs[i:] = [epoch for epoch, _ in merged]
+        self.levels[i:] = [level for _, level in merged]
+        # Readings appended while these were pending have no prefix sums yet either
+        i = min(i, len(self.cumulative))
+        self._dirty_from = i if self._dirty_from is None else min(self._dirty_from, i)
+
+    def _settle(self):
+        if self._late:
+            self._merge()
+        if self._dirty_from is not None:
+            self._rebuild()
+
+    def _segment(self, i: int, epoch: float, power_level: float) -> float:
+        """Area of the segment from reading i - 1 to a reading at (epoch, power_level)"""
+        dt = epoch - self.epochs[i - 1]
+        if dt > self.max_gap:
+            return 0.0
+        return (self.levels[i - 1] + power_level) * 0.5 * dt
+
+    def _rebuild(self):
+        start = max(self._dirty_from - 1, 0)
+        epochs = np.array(self.epochs[start:])
+        levels = np.array(self.levels[start:])
+        base = self.cumulative[start] if start < len(self.cumulative) else 0.0
+        tail = base + np.concatenate([[0.0], np.cumsum(segment_energy(epochs, levels, self.max_gap))])
+        self.cumulative[start:] = tail.tolist()
+        self._dirty_from = None
+
+    def integral(self, t: float) -> float:
+        """Power-level-seconds from the first reading up to time t"""
+        self._settle()
+        k = bisect_right(self.epochs, t) - 1
+        if k < 0:
+            return 0.0
+        if k == len(self.epochs) - 1:
+            return self.cumulative[k]
+        e0, e1 = self.epochs[k], self.epochs[k + 1]
+        if e1 - e0 > self.max_gap:
+            return self.cumulative[k]
+        p0, p1 = self.levels[k], self.levels[k + 1]
+        p_t = p0 + (p1 - p0) * (t - e0) / (e1 - e0)
+        return self.cumulative[k] + (p0 + p_t) * 0.5 * (t - e0)
+
+    def trim(self, before: float):
+        """Forget readings older than `before`, keeping one so the boundary segment survives
+
+        Trimming waits until an eighth of the ledger has expired, so its cost is
+        amortized over the appends instead of paid on every call.
+        """
+        self._settle()
+        k = bisect_right(self.epochs, before) - 1
+        if k > len(self.epochs) // 8:
+            del self.epochs[:k], self.levels[:k], self.cumulative[:k]
+
+class EnergyLedger:
+    """Per-device energy ledgers with profiles looked up by purifier model
+
+    `profiles` maps a model name to its EnergyProfile and `device_models` maps a
+    device ID to its model; devices without an entry use the "default" profile.
+    """
+    def __init__(self, profiles: Optional[Dict[str, EnergyProfile]] = None,
+                 device_models: Optional[Dict[str, str]] = None,
+                 max_gap: float = DEFAULT_MAX_GAP_SECONDS):
+        self.profiles = {"default": DEFAULT_PROFILE}
+        self.profiles.update(profiles or {})
+        self.device_models = dict(device_models or {})
+        self.max_gap = max_gap
+        self.devices: Dict[str, DeviceLedger] = {}
+        self._next_trim = 0.0
+
+    def profile_for(self, device_id: str) -> EnergyProfile:
+        return self.profiles.get(self.device_models.get(device_id, "default"), self.profiles["default"])
+
+    def _ledger(self, device_id: str) -> DeviceLedger:
+        ledger = self.devices.get(device_id)
+        if ledger is None:
+            ledger = self.devices[device_id] = DeviceLedger(self.max_gap)
+        return ledger
+
+    def record(self, device_id: str, epoch: float, power_level: float):
+        self._ledger(device_id).record(epoch, power_level)
+
+    def record_many(self, device_ids: Iterable[str], epochs: Iterable[float], power_levels: Iterable[float]):
+        """Record a batch, merging each device's late readings once"""
+        batches = {}
+        for device_id, epoch, power_level in zip(device_ids, epochs, power_levels):
+            batch = batches.setdefault(device_id, ([], []))
+            batch[0].append(epoch)
+            batch[1].append(power_level)
+        for device_id, (device_epochs, device_levels) in batches.items():
+            self._ledger(device_id).record_many(device_epochs, device_levels)
+
+    def device_energy(self, device_id: str, start: float, end: float) -> Dict:
+        """Energy (Wh) and cost of one device over [start, end]"""
+        ledger = self.devices.get(device_id)
+        profile = self.profile_for(device_id)
+        level_seconds = ledger.integral(end) - ledger.integral(start) if ledger else 0.0
+        energy_wh = level_seconds * profile.max_watts / 3600
+        return {"energy_wh": energy_wh, "cost": cost_for(energy_wh, profile)}
+
+    def energy(self, start: float, end: float, device_id: Optional[str] = None) -> Dict:
+        """Energy and cost over [start, end] for one device or the whole fleet, with a per-device breakdown"""
+        device_ids = [device_id] if device_id is not None else sorted(self.devices)
+        devices = {d: self.device_energy(d, start, end) for d in device_ids}
+        return {
+            "start": start,
+            "end": end,
+            "energy_wh": sum(d["energy_wh"] for d in devices.values()),
+            "cost": sum(d["cost"] for d in devices.values()),
+            "devices": devices
+        }
+
+    def trim(self, before: float):
+        """Forget readings older than `before`; runs at most once a minute of ledger time"""
+        if before < self._next_trim:
+            return
+        self._next_trim = before + 60
+        for ledger in self.devices.values():
+            ledger.trim(before)
+
+def load_profiles(path: str):
+    """Read {"profiles": {model: {"max_watts", "tariff_per_kwh"}}, "devices": {device_id: model}}"""
+    with open(path) as f:
+        config = json.load(f)
+    profiles = {name: EnergyProfile(**values) for name, values in config.get("profiles", {}).items()}
+    return profiles, config.get("devices", {})
+
+def ledger_from_env() -> EnergyLedger:
+    """Ledger configured from ENERGY_PROFILES (path to a JSON file) and ENERGY_MAX_GAP_SECONDS"""
+    profiles, device_models = {}, {}
+    path = os.getenv("ENERGY_PROFILES")
+    if path:
+        profiles, device_models = load_profiles(path)
+    return EnergyLedger(profiles, device_models,
+                        float(os.getenv("ENERGY_MAX_GAP_SECONDS", str(DEFAULT_MAX_GAP_SECONDS))))
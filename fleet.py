@@ -0,0 +1,77 @@
+import json
+import os
+import time
+from bisect import bisect_right
+from typing import Dict, Iterable, List, Optional, Tuple
+
+class FleetGroups:
+    """Group and zone membership of purifiers, for selecting devices in bulk"""
+    def __init__(self, devices: Optional[Dict[str, Dict[str, str]]] = None):
+        self.groups: Dict[str, List[str]] = {}
+        self.zones: Dict[str, List[str]] = {}
+        for device_id, membership in (devices or {}).items():
+            if membership.get("group"):
+                self.groups.setdefault(membership["group"], []).append(device_id)
+            if membership.get("zone"):
+                self.zones.setdefault(membership["zone"], []).append(device_id)
+
+    def members(self, group: Optional[str] = None, zone: Optional[str] = None) -> List[str]:
+        """Devices of a group or zone; raises KeyError for an unknown one"""
+        if group is not None:
+            return self.groups[group]
+        return self.zones[zone]
+
+def groups_from_env() -> FleetGroups:
+    """Membership read from PURIFIER_GROUPS, a JSON file of {"devices": {device_id: {"group", "zone"}}}"""
+    path = os.getenv("PURIFIER_GROUPS")
+    if not path:
+        return FleetGroups()
+    with open(path) as f:
+        return FleetGroups(json.load(f).get("devices", {}))
+
+class CommandCoalescer:
+    """Drops a command identical to the last one sent to the same device within `window` seconds"""
+    def __init__(self, window: float = 5.0):
+        self.window = window
+        self.coalesced = 0
+        self._last: Dict[str, Tuple[tuple, float]] = {}
+        self._pruned_at = time.monotonic()
+
+    def select(self, device_ids: Iterable[str], command: Dict) -> Tuple[List[str], int]:
+        """Devices the command still has to be applied to, and the number coalesced
+
+        Duplicate IDs in one request are applied once.
+        """
+        now = time.monotonic()
+        if now - self._pruned_at >= self.window:
+            self._last = {device_id: last for device_id, last in self._last.items()
+                          if now - last[1] < self.window}
+            self._pruned_at = now
+        key = tuple(sorted(command.items()))
+        selected, coalesced = [], 0
+        for device_id in dict.fromkeys(device_ids):
+            last = self._last.get(device_id)
+            if last is not None and last[0] == key and now - last[1] < self.window:
+                coalesced += 1
+                continue
+            self._last[device_id] = (key, now)
+            selected.append(device_id)
+        self.coalesced += coalesced
+        return selected, coalesced
+
+def page(sorted_ids: List[str], cursor: Optional[str], limit: int) -> Tuple[List[str], Optional[str]]:
+    """Up to `limit` IDs after `cursor`, and the cursor of the next page (None on the last)"""
+    start = bisect_right(sorted_ids, cursor) if cursor is not None else 0
+    selected = sorted_ids[start:start + limit]
+    return selected, selected[-1] if start + limit < len(sorted_ids) else None
+
+class SortedIds:
+    """Sorted keys of a dict for cursor paging, re-sorted only when keys are added"""
+    def __init__(self):
+        self._ids: List[str] = []
+
+    def get(self, ids: Dict) -> List[str]:
+        # Purifiers are never removed, so a size change means new IDs
+        if len(self._ids) != len(ids):
+            self._ids = sorted(ids)
+        return self._ids
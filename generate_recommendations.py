@@ -1,12 +1,10 @@
-import requests
-import pandas as pd
+import sys
 import aiml
-from datetime import datetime
+from offline_analytics import add_derived_columns, history_metrics, load_frame
 
-def fetch_data():
-    """Fetch 24-hour analytics data"""
-    response = requests.get("http://127.0.0.1:8000/analytics/daily")
-    return response.json()
+def fetch_data(paths=()):
+    """Load history files as a DataFrame, or fetch the last 24 hours from the server"""
+    return load_frame(list(paths))
 
 def analyze_patterns(df):
     """Analyze usage patterns and identify optimization opportunities"""
@@ -45,23 +43,15 @@ def get_aiml_recommendations(kernel, metrics):
     
     return recommendations
 
-def calculate_potential_savings(df):
-    """Calculate potential energy and cost savings"""
-    # Assume we can reduce power by 10% during low AQI periods
-    low_aqi_periods = df[df['aqi_value'] <= 50]
-    potential_power_reduction = 0.1  # 10% reduction
-    
-    current_energy = (df['power_level'] * 50).sum()  # 50W max power
-    potential_energy = current_energy - (low_aqi_periods['power_level'] * 50 * potential_power_reduction).sum()
-    
-    savings = {
-        'energy_savings': current_energy - potential_energy,
-        'cost_savings': (current_energy - potential_energy) * 0.12 / 1000,  # $0.12 per kWh
-        'optimization_periods': len(low_aqi_periods)
+def calculate_potential_savings(metrics):
+    """Potential daily energy and cost savings from reducing power 10% while the AQI is good"""
+    return {
+        'energy_savings': metrics['daily_energy_savings_wh'],
+        'cost_savings': metrics['daily_cost_savings'],
+        'optimization_periods': metrics['optimization_periods']
     }
-    return savings
 
-def main():
+def main(paths=()):
     print("Generating Smart Air Purifier Recommendations")
     print("=" * 50)
     
@@ -70,20 +60,10 @@ def main():
     kernel.learn("aiml_brain/purifier_rules.aiml")
     
     # Fetch and process data
-    data = fetch_data()
-    df = pd.DataFrame(data)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
-    
-    # Calculate efficiency ratio
-    df['efficiency_ratio'] = df['aqi_value'] / (df['power_level'] * 100)
-    
-    # Calculate metrics
-    metrics = {
-        'avg_power': df['power_level'].mean(),
-        'avg_aqi': df['aqi_value'].mean(),
-        'peak_power_time': df.loc[df['power_level'].idxmax(), 'timestamp'],
-        'lowest_efficiency_time': df.loc[df['efficiency_ratio'].idxmin(), 'timestamp']
-    }
+    df = fetch_data(paths)
+    
+    # Calculate efficiency ratio, energy and the report metrics
+    metrics = history_metrics(add_derived_columns(df))
     
     # Get patterns
     patterns = analyze_patterns(df)
@@ -92,15 +72,15 @@ def main():
     recommendations = get_aiml_recommendations(kernel, metrics)
     
     # Calculate potential savings
-    savings = calculate_potential_savings(df)
+    savings = calculate_potential_savings(metrics)
     
     # Print recommendations report
     print("\n1. Current Performance Analysis:")
     print("-" * 50)
     print(f"Average Power Usage: {metrics['avg_power']*100:.1f}%")
     print(f"Average Air Quality Index: {metrics['avg_aqi']:.1f}")
-    print(f"Peak Power Usage: {df['power_level'].max()*100:.1f}% at {metrics['peak_power_time']}")
-    print(f"Lowest Efficiency: at {metrics['lowest_efficiency_time']}")
+    print(f"Peak Power Usage: {metrics['peak_power']*100:.1f}% at {metrics['peak_power_time']}")
+    print(f"Lowest Efficiency: at {metrics['lowest_efficiency']['timestamp']}")
     
     print("\n2. AI Recommendations:")
     print("-" * 50)
@@ -128,4 +108,4 @@ def main():
     print("• Update AI models with local air quality patterns")
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1:])
@@ -0,0 +1,96 @@
+import math
+import os
+import re
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, wait
+from typing import Dict, List, Optional
+from history_export import columns_to_npz, history_to_columns
+
+# history-<first epoch>-<last epoch>-<first seq>.npz
+SEGMENT_PATTERN = re.compile(r"^history-(\d+)-(\d+)-(\d+)\.npz$")
+
+class HistoryArchive:
+    """Append-only on-disk history written as columnar NPZ segments
+
+    Records are buffered and written in the export layout once the segment
+    is `segment_seconds` old or holds `segment_records` records. Writes run
+    on one background thread, so appends only pay for the buffer. A failed
+    write is logged and counted, and its records go back into the next
+    segment. Segment names carry the epoch range they cover, so readers
+    skip files outside a query range without opening them.
+    """
+    def __init__(self, directory: str, segment_seconds: float = 3600, segment_records: int = 50000):
+        self.directory = directory
+        self.segment_seconds = segment_seconds
+        self.segment_records = segment_records
+        self.buffer: List[Dict] = []
+        self.segments_written = 0
+        self.write_failures = 0
+        self._opened_at = time.time()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._futures = set()
+        # Records of failed writes, retried with the next segment
+        self._retry: List[Dict] = []
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def add(self, entries: List[Dict]):
+        self.buffer.extend(entries)
+        if len(self.buffer) >= self.segment_records or time.time() - self._opened_at >= self.segment_seconds:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            retry, self._retry = self._retry, []
+        records, self.buffer = retry + self.buffer, []
+        self._opened_at = time.time()
+        if records:
+            future = self._executor.submit(self._write, records)
+            self._futures.add(future)
+            future.add_done_callback(lambda done: self._written(done, records))
+
+    def _written(self, future: Future, records: List[Dict]):
+        self._futures.discard(future)
+        error = future.exception()
+        if error is not None:
+            print(f"History archive write failed, keeping {len(records)} records for the next segment: {error}")
+            with self._lock:
+                self.write_failures += 1
+                self._retry[:0] = records
+
+    def close(self):
+        """Write the buffered records and wait for pending segments, retrying failed ones once"""
+        self.flush()
+        wait(list(self._futures))
+        if self._retry:
+            self.flush()
+        self._executor.shutdown(wait=True)
+
+    def _write(self, records: List[Dict]):
+        epochs = [record["epoch"] for record in records]
+        name = f"history-{int(min(epochs))}-{math.ceil(max(epochs))}-{records[0]['seq']}.npz"
+        path = os.path.join(self.directory, name)
+        # Write under a temporary name so readers never see a partial segment
+        try:
+            with open(path + ".tmp", "wb") as f:
+                f.write(columns_to_npz(history_to_columns(records)))
+            os.replace(path + ".tmp", path)
+        except BaseException:
+            if os.path.exists(path + ".tmp"):
+                os.remove(path + ".tmp")
+            raise
+        self.segments_written += 1
+
+def segment_paths(directory: str, start: Optional[float] = None, end: Optional[float] = None) -> List[str]:
+    """Archive segments overlapping [start, end], oldest first"""
+    segments = []
+    for name in os.listdir(directory):
+        match = SEGMENT_PATTERN.match(name)
+        if match is None:
+            continue
+        first, last, seq = (int(group) for group in match.groups())
+        if (start is not None and last < start) or (end is not None and first > end):
+            continue
+        segments.append((first, seq, os.path.join(directory, name)))
+    return [path for _, _, path in sorted(segments)]
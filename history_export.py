@@ -0,0 +1,57 @@
+import io
+import numpy as np
+from typing import Dict, List
+
+# Sensor readings stored under "sensor_data" in each history record
+SENSOR_FIELDS = [
+    "pm25", "pm10", "no2", "so2", "co", "o3",
+    "temperature", "humidity", "wind_speed", "traffic_density"
+]
+
+# Columns of the flattened export, in order
+EXPORT_COLUMNS = ["timestamp", "device_id", "epoch", "aqi_value", "power_level"] + SENSOR_FIELDS
+
+# The float columns; timestamp and device_id are strings
+NUMERIC_COLUMNS = EXPORT_COLUMNS[2:]
+
+NPZ_MEDIA_TYPE = "application/x-npz"
+
+def history_to_columns(records: List[Dict]) -> Dict[str, np.ndarray]:
+    """Flatten history records into one NumPy array per column
+
+    The sensor_data fields become top-level columns; timestamps stay ISO strings.
+    """
+    n = len(records)
+    columns = {name: np.empty(n, dtype=np.float64) for name in NUMERIC_COLUMNS}
+    timestamps = [None] * n
+    device_ids = [None] * n
+    epoch = columns["epoch"]
+    aqi = columns["aqi_value"]
+    power = columns["power_level"]
+    sensors = [columns[name] for name in SENSOR_FIELDS]
+    for i, record in enumerate(records):
+        timestamps[i] = record["timestamp"]
+        device_ids[i] = record["device_id"]
+        epoch[i] = record["epoch"]
+        aqi[i] = record["aqi_value"]
+        power[i] = record["power_level"]
+        sensor_data = record["sensor_data"]
+        for field, column in zip(SENSOR_FIELDS, sensors):
+            column[i] = sensor_data[field]
+    columns["timestamp"] = np.array(timestamps, dtype=str)
+    columns["device_id"] = np.array(device_ids, dtype=str)
+    return {name: columns[name] for name in EXPORT_COLUMNS}
+
+def columns_to_npz(columns: Dict[str, np.ndarray], compress: bool = False) -> bytes:
+    """Serialize columns to an NPZ archive"""
+    buffer = io.BytesIO()
+    if compress:
+        np.savez_compressed(buffer, **columns)
+    else:
+        np.savez(buffer, **columns)
+    return buffer.getvalue()
+
+def npz_to_columns(content: bytes) -> Dict[str, np.ndarray]:
+    """Load columns from NPZ bytes produced by columns_to_npz"""
+    with np.load(io.BytesIO(content), allow_pickle=False) as archive:
+        return {name: archive[name] for name in archive.files}
@@ -0,0 +1,149 @@
+import time
+from bisect import bisect_left, bisect_right
+from typing import Dict, List, Optional, Sequence, Set
+
+def parse_hours(spec: str) -> Set[int]:
+    """Parse an hour-of-day filter like "7", "7-10" or "7-10,16-19" (inclusive, local time)"""
+    hours = set()
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        first, _, last = part.partition("-")
+        try:
+            first, last = int(first), int(last or first)
+        except ValueError:
+            raise ValueError(f"Invalid hour_of_day '{part}', expected e.g. 7 or 7-10")
+        if not (0 <= first <= 23 and 0 <= last <= 23 and first <= last):
+            raise ValueError(f"Invalid hour_of_day '{part}', hours must be 0-23")
+        hours.update(range(first, last + 1))
+    return hours
+
+def local_hour(epoch: float) -> int:
+    return time.localtime(epoch).tm_hour
+
+# Expired records are dropped in batches covering this many seconds, so a
+# full window costs one list copy per batch instead of one per append
+TRIM_BATCH_SECONDS = 60
+
+class HistoryIndex:
+    """Sorted-epoch and hour-of-day index over the history list
+
+    Entries are aligned with the history records, which stay in arrival
+    (sequence) order. Arrivals in timestamp order extend a sorted run, so
+    ranges are two binary searches; per-hour position lists give hour-of-day
+    filters without touching other rows. Late arrivals (older than the
+    newest epoch so far, e.g. from a device with a lagging clock) go into a
+    small side list kept sorted with insort, and ranges merge both lists.
+
+    Positions are absolute; `base` is the absolute position of the first
+    record, so trimming a prefix never rewrites the hour lists.
+    """
+    def __init__(self):
+        self.base = 0
+        self.epochs: List[float] = []
+        self.hour_positions = [[] for _ in range(24)]
+        # In-order arrivals: epochs and absolute positions, both ascending
+        self._run_epochs: List[float] = []
+        self._run_positions: List[int] = []
+        # Late arrivals sorted by epoch, with their absolute positions
+        self._late_epochs: List[float] = []
+        self._late_positions: List[int] = []
+
+    def __len__(self) -> int:
+        return len(self.epochs)
+
+    @property
+    def sorted(self) -> bool:
+        """True while the indexed epochs are in arrival order"""
+        return not self._late_epochs
+
+    def append(self, epoch: float):
+        position = self.base + len(self.epochs)
+        if self._run_epochs and epoch < self._run_epochs[-1]:
+            i = bisect_right(self._late_epochs, epoch)
+            self._late_epochs.insert(i, epoch)
+            self._late_positions.insert(i, position)
+        else:
+            self._run_epochs.append(epoch)
+            self._run_positions.append(position)
+        self.hour_positions[local_hour(epoch)].append(position)
+        self.epochs.append(epoch)
+
+    def expired_prefix(self, cutoff: float) -> int:
+        """Number of leading records (in arrival order) at or before `cutoff`
+
+        A late record behind a newer one is dropped once the records ahead
+        of it expire, so it outlives the window by at most how late it was.
+        """
+        if self.sorted:
+            return bisect_right(self.epochs, cutoff)
+        count = 0
+        for epoch in self.epochs:
+            if epoch > cutoff:
+                break
+            count += 1
+        return count
+
+    def drop_prefix(self, count: int):
+        if count <= 0:
+            return
+        del self.epochs[:count]
+        self.base += count
+        for positions in self.hour_positions:
+            del positions[:bisect_left(positions, self.base)]
+        expired_run = bisect_left(self._run_positions, self.base)
+        del self._run_epochs[:expired_run]
+        del self._run_positions[:expired_run]
+        if self._late_positions:
+            kept = [i for i, position in enumerate(self._late_positions) if position >= self.base]
+            self._late_epochs = [self._late_epochs[i] for i in kept]
+            self._late_positions = [self._late_positions[i] for i in kept]
+
+    def select(self, start: Optional[float] = None, end: Optional[float] = None,
+               hours: Optional[Set[int]] = None, first: int = 0) -> Sequence[int]:
+        """List positions, ascending, of records with start <= epoch <= end, a local hour
+        in `hours` and a position at or after `first`"""
+        n = len(self.epochs)
+        if self.sorted:
+            lo = bisect_left(self.epochs, start) if start is not None else 0
+            hi = bisect_right(self.epochs, end) if end is not None else n
+            lo = max(lo, first)
+            if hours is None:
+                return range(lo, max(lo, hi))
+            selected = []
+            for hour in sorted(hours):
+                positions = self.hour_positions[hour]
+                i = bisect_left(positions, self.base + lo)
+                j = bisect_left(positions, self.base + hi)
+                selected.extend(positions[i:j])
+            selected.sort()
+            return [p - self.base for p in selected]
+
+        # Late arrivals: the range from the sorted run and the side list, back in arrival order
+        positions = []
+        for epochs, absolute in ((self._run_epochs, self._run_positions),
+                                 (self._late_epochs, self._late_positions)):
+            lo = bisect_left(epochs, start) if start is not None else 0
+            hi = bisect_right(epochs, end) if end is not None else len(epochs)
+            positions.extend(absolute[lo:hi])
+        # Two runs (the second one small), which the sort merges in linear time
+        positions.sort()
+        positions = positions[bisect_left(positions, self.base + first):]
+        if hours is not None:
+            return [p - self.base for p in positions if local_hour(self.epochs[p - self.base]) in hours]
+        return [p - self.base for p in positions]
+
+def trim_expired(records: List[Dict], index: HistoryIndex, cutoff: float,
+                 batch_seconds: float = TRIM_BATCH_SECONDS) -> List[Dict]:
+    """Drop records at or before `cutoff` and keep `index` aligned
+
+    Nothing is dropped until the oldest record is `batch_seconds` past the
+    cutoff, then everything expired goes at once. Returns a new list when
+    anything expired rather than mutating `records`, so readers holding the
+    old list (and positions into it) stay consistent.
+    """
+    if not index.epochs or index.epochs[0] > cutoff - batch_seconds:
+        return records
+    expired = index.expired_prefix(cutoff)
+    if expired:
+        records = records[expired:]
+        index.drop_prefix(expired)
+    return records
@@ -0,0 +1,133 @@
+import asyncio
+import time
+from collections import deque
+from typing import Callable, Dict, List, Optional
+
+# Overflow policies for a full ingest queue
+DROP_OLDEST = "drop_oldest"
+LATEST_PER_DEVICE = "latest_per_device"
+REJECT = "reject"
+OVERFLOW_POLICIES = (DROP_OLDEST, LATEST_PER_DEVICE, REJECT)
+
+class IngestItem:
+    """A validated reading waiting for inference"""
+    __slots__ = ("device_id", "features", "timestamp", "epoch", "enqueued_at")
+
+    def __init__(self, device_id: str, features, timestamp: str, epoch: float):
+        self.device_id = device_id
+        self.features = features
+        self.timestamp = timestamp
+        # Parsed once at intake; downstream stages reuse it instead of re-parsing
+        self.epoch = epoch
+        self.enqueued_at = time.monotonic()
+
+class IngestQueue:
+    """Bounded FIFO between sensor intake and inference workers
+
+    put() never blocks, so intake stays fast during bursts. When the queue is
+    full the overflow policy decides what happens:
+      drop_oldest        - evict the oldest pending reading
+      latest_per_device  - replace the device's pending reading, else evict the oldest
+      reject             - refuse the new reading (the API answers 429)
+    """
+    def __init__(self, maxsize: int = 10000, policy: str = DROP_OLDEST):
+        if policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{policy}', expected one of {OVERFLOW_POLICIES}")
+        self.maxsize = maxsize
+        self.policy = policy
+        self._items = deque()
+        # device_id -> its pending item, for the latest_per_device policy
+        self._pending: Dict[str, IngestItem] = {}
+        # Created on first wait so it binds to the server's running loop
+        self._not_empty: Optional[asyncio.Event] = None
+        self.accepted = 0
+        self.dropped = 0
+        self.coalesced = 0
+        self.rejected = 0
+        self.processed = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    @property
+    def depth(self) -> int:
+        return len(self._items)
+
+    def lag(self) -> float:
+        """Seconds the oldest pending reading has been waiting"""
+        if not self._items:
+            return 0.0
+        return time.monotonic() - self._items[0].enqueued_at
+
+    def put(self, item: IngestItem) -> bool:
+        """Enqueue without blocking; returns False if the reading was rejected"""
+        if len(self._items) >= self.maxsize:
+            if self.policy == REJECT:
+                self.rejected += 1
+                return False
+            if self.policy == LATEST_PER_DEVICE:
+                pending = self._pending.get(item.device_id)
+                if pending is not None:
+                    # Keep the queue position, take the newer reading
+                    pending.features = item.features
+                    pending.timestamp = item.timestamp
+                    pending.epoch = item.epoch
+                    self.coalesced += 1
+                    self.accepted += 1
+                    return True
+            self._evict_oldest()
+        self._items.append(item)
+        if self.policy == LATEST_PER_DEVICE:
+            self._pending[item.device_id] = item
+        self.accepted += 1
+        if self._not_empty is not None:
+            self._not_empty.set()
+        return True
+
+    def _evict_oldest(self):
+        oldest = self._items.popleft()
+        if self._pending.get(oldest.device_id) is oldest:
+            del self._pending[oldest.device_id]
+        self.dropped += 1
+
+    async def get_batch(self, max_items: int) -> List[IngestItem]:
+        """Wait for at least one reading, then take up to `max_items`"""
+        if self._not_empty is None:
+            self._not_empty = asyncio.Event()
+        while not self._items:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+        batch = []
+        while self._items and len(batch) < max_items:
+            item = self._items.popleft()
+            if self._pending.get(item.device_id) is item:
+                del self._pending[item.device_id]
+            batch.append(item)
+        return batch
+
+    def stats(self) -> Dict:
+        return {
+            "policy": self.policy,
+            "maxsize": self.maxsize,
+            "depth": self.depth,
+            "lag_seconds": self.lag(),
+            "accepted": self.accepted,
+            "dropped": self.dropped,
+            "coalesced": self.coalesced,
+            "rejected": self.rejected,
+            "processed": self.processed
+        }
+
+async def run_worker(queue: IngestQueue, handler, batch_size: int = 64,
+                     on_error: Optional[Callable[[Exception], None]] = None):
+    """Drain the queue in batches into `handler(items)` until cancelled"""
+    while True:
+        batch = await queue.get_batch(batch_size)
+        try:
+            handler(batch)
+        except Exception as e:
+            if on_error is not None:
+                on_error(e)
+        queue.processed += len(batch)
+        # Let intake handlers run between batches
+        await asyncio.sleep(0)
@@ -0,0 +1,163 @@
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Latency buckets in seconds, tuned for sub-millisecond stages up to slow AIML lookups
+DEFAULT_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025,
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0
+)
+
+def _format_value(value: float) -> str:
+    """Format a sample value the way Prometheus expects"""
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    """Render a label set as {key="value",...}"""
+    if not labels:
+        return ""
+    escaped = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        escaped.append(f'{key}="{value}"')
+    return "{" + ",".join(escaped) + "}"
+
+class Counter:
+    """Monotonically increasing counter, either incremented here or read from a callback"""
+    def __init__(self, name: str, help_text: str, callback: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.help_text = help_text
+        self.callback = callback
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} counter",
+            f"{self.name} {_format_value(self.callback() if self.callback else self.value)}"
+        ]
+
+class LabeledCounter:
+    """Counters keyed by label values, read from a callback returning {label values: count}"""
+    def __init__(self, name: str, help_text: str, labels: Tuple[str, ...],
+                 callback: Callable[[], Dict[Tuple[str, ...], float]]):
+        self.name = name
+        self.help_text = help_text
+        self.labels = labels
+        self.callback = callback
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} counter"
+        ]
+        for label_values, value in self.callback().items():
+            labels = _format_labels(dict(zip(self.labels, label_values)))
+            lines.append(f"{self.name}{labels} {_format_value(value)}")
+        return lines
+
+class Gauge:
+    """Point-in-time value, either set directly or read from a callback at scrape time"""
+    def __init__(self, name: str, help_text: str, callback: Optional[Callable[[], float]] = None):
+        self.name = name
+        self.help_text = help_text
+        self.callback = callback
+        self.value = 0.0
+
+    def set(self, value: float):
+        self.value = value
+
+    def render(self) -> List[str]:
+        value = self.callback() if self.callback else self.value
+        return [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} gauge",
+            f"{self.name} {_format_value(value)}"
+        ]
+
+class Histogram:
+    """Latency histogram with one series per value of a single label"""
+    def __init__(self, name: str, help_text: str, label: str,
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label = label
+        self.buckets = tuple(sorted(buckets))
+        # label value -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[str, list] = {}
+
+    def observe(self, label_value: str, value: float):
+        series = self._series.get(label_value)
+        if series is None:
+            series = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            self._series[label_value] = series
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    @contextmanager
+    def time(self, label_value: str):
+        """Observe the wall time spent inside the with-block"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(label_value, time.perf_counter() - start)
+
+    def render(self) -> List[str]:
+        lines = [
+            f"# HELP {self.name} {self.help_text}",
+            f"# TYPE {self.name} histogram"
+        ]
+        for label_value, (counts, total, count) in self._series.items():
+            cumulative = 0
+            for upper, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                labels = _format_labels({self.label: label_value, "le": _format_value(upper)})
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels({self.label: label_value})
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+class MetricsRegistry:
+    """Collection of metrics rendered together in Prometheus text format"""
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name: str, help_text: str,
+                callback: Optional[Callable[[], float]] = None) -> Counter:
+        return self.register(Counter(name, help_text, callback))
+
+    def labeled_counter(self, name: str, help_text: str, labels: Tuple[str, ...],
+                        callback: Callable[[], Dict[Tuple[str, ...], float]]) -> LabeledCounter:
+        return self.register(LabeledCounter(name, help_text, labels, callback))
+
+    def gauge(self, name: str, help_text: str,
+              callback: Optional[Callable[[], float]] = None) -> Gauge:
+        return self.register(Gauge(name, help_text, callback))
+
+    def histogram(self, name: str, help_text: str, label: str,
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help_text, label, buckets))
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+# Content type for the Prometheus text exposition format
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
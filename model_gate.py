@@ -0,0 +1,234 @@
+import argparse
+import hashlib
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List, Tuple
+import numpy as np
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.preprocessing import StandardScaler
+from air_quality_model import MODEL_PATH, SCALER_PATH, AirQualityModel
+from aqi_engine import aqi_categories, compute_aqi
+from history_export import SENSOR_FIELDS
+from air_quality_scenarios import SCENARIOS as scenarios
+
+BASELINE_PATH = "model_baseline.json"
+
+# Golden dataset: readings per scenario, drawn between it and the next worse one, then jittered
+GOLDEN_SEED = 1234
+GOLDEN_ROWS_PER_SCENARIO = 2500
+GOLDEN_JITTER = 0.15
+
+# Allowed change from the baseline before the gate fails: relative increases for
+# errors, latency and load-time ratios and size, an absolute drop for category
+# agreement. Timings are gated as ratios to a reference forest timed in the same
+# run, so the baseline carries over between machines.
+DEFAULT_TOLERANCES = {
+    "mae": 0.05,
+    "category_agreement": 0.01,
+    "single_latency_ratio": 0.25,
+    "batch_latency_ratio": 0.25,
+    "load_ratio": 0.25,
+    "artifact_bytes": 0.10
+}
+
+# Metrics where lower is better; category agreement is the one where higher is
+LOWER_IS_BETTER = ("mae", "single_latency_ratio", "batch_latency_ratio", "load_ratio", "artifact_bytes")
+
+# Wall-clock timings depend on the machine; they are reported, and only warned about
+ADVISORY = ("single_latency_ms", "batch_latency_us_per_row", "load_seconds")
+ADVISORY_TOLERANCE = 0.25
+
+# Reference workload the timing ratios are relative to
+REFERENCE_TREES = 20
+REFERENCE_DEPTH = 8
+REFERENCE_ROWS = 2000
+
+def golden_dataset(seed: int = GOLDEN_SEED, rows_per_scenario: int = GOLDEN_ROWS_PER_SCENARIO
+                   ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Seeded readings spanning the air_quality_scenarios.py scenarios
+
+    Returns (features (n, 10), EPA AQI targets, scenario index per row).
+    """
+    rng = np.random.default_rng(seed)
+    anchors = np.array([[values[field] for field in SENSOR_FIELDS] for values in scenarios.values()])
+    features, labels = [], []
+    for i, anchor in enumerate(anchors):
+        following = anchors[min(i + 1, len(anchors) - 1)]
+        t = rng.uniform(0, 1, (rows_per_scenario, 1))
+        jitter = rng.lognormal(0, GOLDEN_JITTER, (rows_per_scenario, len(SENSOR_FIELDS)))
+        rows = (anchor + t * (following - anchor)) * jitter
+        for field, upper in (("humidity", 100), ("traffic_density", 1)):
+            column = SENSOR_FIELDS.index(field)
+            rows[:, column] = np.minimum(rows[:, column], upper)
+        features.append(rows)
+        labels.append(np.full(rows_per_scenario, i))
+    features = np.vstack(features)
+    return features, compute_aqi(features), np.concatenate(labels)
+
+def dataset_fingerprint(features: np.ndarray) -> str:
+    return hashlib.blake2b(np.ascontiguousarray(features).tobytes(), digest_size=16).hexdigest()
+
+def _median_seconds(fn, repeats: int) -> float:
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times)
+
+def time_predictions(model, features: np.ndarray, repeats: int, single_calls: int) -> Tuple[List[float], float]:
+    """Per-call seconds of single-row predict() calls, and the median seconds of one predict_batch()"""
+    step = max(1, len(features) // single_calls)
+    model.predict(features[:1])
+    single = []
+    for i in range(0, len(features), step):
+        start = time.perf_counter()
+        model.predict(features[i:i + 1])
+        single.append(time.perf_counter() - start)
+    return single, _median_seconds(lambda: model.predict_batch(features), repeats)
+
+def reference_model(features: np.ndarray, targets: np.ndarray, directory: str) -> AirQualityModel:
+    """A small fixed scaler and forest fit on the golden data and saved to `directory`,
+    timed alongside every candidate"""
+    rows = slice(None, None, max(1, len(features) // REFERENCE_ROWS))
+    reference = AirQualityModel.__new__(AirQualityModel)
+    reference.model_path = os.path.join(directory, "reference_model.joblib")
+    reference.scaler_path = os.path.join(directory, "reference_scaler.joblib")
+    reference.version = 0
+    reference.scaler = StandardScaler().fit(features[rows])
+    reference.model = RandomForestRegressor(n_estimators=REFERENCE_TREES, max_depth=REFERENCE_DEPTH, random_state=0)
+    reference.model.fit(reference.scaler.transform(features[rows]), targets[rows])
+    reference.save_model()
+    return reference
+
+def time_loads(model: AirQualityModel, reference: AirQualityModel, repeats: int) -> Tuple[float, float]:
+    """Median seconds of model.load_model() and median ratio to the reference's load time
+
+    The two loads alternate so both see the same page cache and machine load.
+    """
+    seconds, ratios = [], []
+    for _ in range(repeats):
+        candidate = _median_seconds(model.load_model, 1)
+        seconds.append(candidate)
+        ratios.append(candidate / _median_seconds(reference.load_model, 1))
+    return statistics.median(seconds), statistics.median(ratios)
+
+def score_model(model_path: str = MODEL_PATH, scaler_path: str = SCALER_PATH,
+                repeats: int = 5, single_calls: int = 200, load_repeats: int = 21) -> Dict:
+    """Accuracy, latency, load time and size of a model/scaler pair on the golden dataset"""
+    if not (os.path.exists(model_path) and os.path.exists(scaler_path)):
+        raise FileNotFoundError(f"No model at {model_path} and {scaler_path}")
+    features, targets, scenario = golden_dataset()
+
+    model = AirQualityModel(model_path, scaler_path)
+    with tempfile.TemporaryDirectory() as directory:
+        reference = reference_model(features, targets, directory)
+        load_seconds, load_ratio = time_loads(model, reference, load_repeats)
+        predictions = model.predict_batch(features)
+        errors = np.abs(predictions - targets)
+        agreement = aqi_categories(predictions) == aqi_categories(targets)
+
+        # Single-row latency as /predict pays it: one reading through scaler and forest
+        single, batch_seconds = time_predictions(model, features, repeats, single_calls)
+        reference_single, reference_batch = time_predictions(reference, features, repeats, single_calls)
+
+    return {
+        "dataset": dataset_fingerprint(features),
+        "rows": len(features),
+        "mae": float(errors.mean()),
+        "category_agreement": float(agreement.mean()),
+        "per_scenario_mae": {name: float(errors[scenario == i].mean()) for i, name in enumerate(scenarios)},
+        "single_latency_ratio": statistics.median(single) / statistics.median(reference_single),
+        "batch_latency_ratio": batch_seconds / reference_batch,
+        "load_ratio": load_ratio,
+        "single_latency_ms": statistics.median(single) * 1000,
+        "single_latency_p95_ms": float(np.percentile(single, 95)) * 1000,
+        "batch_latency_us_per_row": batch_seconds / len(features) * 1e6,
+        "load_seconds": load_seconds,
+        "artifact_bytes": os.path.getsize(model_path) + os.path.getsize(scaler_path)
+    }
+
+def compare(candidate: Dict, baseline: Dict, tolerances: Dict[str, float] = DEFAULT_TOLERANCES) -> List[str]:
+    """Regressions of the candidate beyond the tolerances, as readable lines (empty: passed)"""
+    if candidate["dataset"] != baseline["dataset"]:
+        return ["The golden dataset changed since the baseline was stored; rerun with --update-baseline"]
+    failures = []
+    for metric, tolerance in tolerances.items():
+        new, old = candidate[metric], baseline[metric]
+        if metric in LOWER_IS_BETTER:
+            limit = old * (1 + tolerance)
+            if new > limit:
+                failures.append(f"{metric}: {new:.4g} > {limit:.4g} (baseline {old:.4g} + {tolerance:.0%})")
+        else:
+            limit = old - tolerance
+            if new < limit:
+                failures.append(f"{metric}: {new:.4g} < {limit:.4g} (baseline {old:.4g} - {tolerance:g})")
+    return failures
+
+def advisories(candidate: Dict, baseline: Dict) -> List[str]:
+    """Wall-clock timings slower than the baseline's; informational, as they depend on the machine"""
+    return [f"{metric}: {candidate[metric]:.4g} vs baseline {baseline[metric]:.4g}"
+            for metric in ADVISORY if candidate[metric] > baseline[metric] * (1 + ADVISORY_TOLERANCE)]
+
+def load_baseline(path: str = BASELINE_PATH) -> Dict:
+    with open(path) as f:
+        return json.load(f)
+
+def save_baseline(scores: Dict, path: str = BASELINE_PATH):
+    with open(path, "w") as f:
+        json.dump(scores, f, indent=2)
+
+def print_scores(candidate: Dict, baseline: Dict = None):
+    print(f"{'metric':<28}{'candidate':>14}{'baseline':>14}")
+    for metric in ("mae", "category_agreement", "single_latency_ratio", "batch_latency_ratio",
+                   "load_ratio", "artifact_bytes", "single_latency_ms", "single_latency_p95_ms",
+                   "batch_latency_us_per_row", "load_seconds"):
+        old = f"{baseline[metric]:>14.4g}" if baseline else ""
+        print(f"{metric:<28}{candidate[metric]:>14.4g}{old}")
+    for name, mae in candidate["per_scenario_mae"].items():
+        print(f"  MAE {name}: {mae:.2f}")
+
+def gate(model_path: str = MODEL_PATH, scaler_path: str = SCALER_PATH, baseline_path: str = BASELINE_PATH,
+         tolerances: Dict[str, float] = DEFAULT_TOLERANCES) -> bool:
+    """Score a candidate against the stored baseline; prints the report and returns whether it passed"""
+    candidate = score_model(model_path, scaler_path)
+    baseline = load_baseline(baseline_path)
+    print_scores(candidate, baseline)
+    failures = compare(candidate, baseline, tolerances)
+    for advisory in advisories(candidate, baseline):
+        print(f"SLOWER (advisory) {advisory}")
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    print("Model gate " + ("failed" if failures else "passed"))
+    return not failures
+
+def main():
+    parser = argparse.ArgumentParser(description="Check an AQI model against the golden-dataset baseline")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--scaler", default=SCALER_PATH)
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--update-baseline", action="store_true",
+                        help="Store the model's scores as the new baseline instead of checking them")
+    for metric, tolerance in DEFAULT_TOLERANCES.items():
+        parser.add_argument(f"--max-{metric.replace('_', '-')}", dest=metric, type=float, default=tolerance,
+                            help=f"Allowed {'increase' if metric in LOWER_IS_BETTER else 'drop'} (default {tolerance:g})")
+    args = parser.parse_args()
+
+    if args.update_baseline:
+        scores = score_model(args.model, args.scaler)
+        save_baseline(scores, args.baseline)
+        print_scores(scores)
+        print(f"Saved baseline to {args.baseline}")
+        return
+    if not os.path.exists(args.baseline):
+        sys.exit(f"No baseline at {args.baseline}; store one with --update-baseline")
+    tolerances = {metric: getattr(args, metric) for metric in DEFAULT_TOLERANCES}
+    if not gate(args.model, args.scaler, args.baseline, tolerances):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
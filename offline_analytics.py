@@ -0,0 +1,263 @@
+import argparse
+import json
+import os
+from typing import Dict, List, Optional
+import numpy as np
+import pandas as pd
+from analytics_client import PEAK_HOURS, fetch_history_frame, history_frame
+from dashboards import DEFAULT_RENDER_MODE, RENDER_MODES, write_dashboard
+from energy import EnergyLedger, cost_for, ledger_from_env, segment_energy
+from history_archive import segment_paths
+from history_export import EXPORT_COLUMNS, SENSOR_FIELDS, npz_to_columns
+from history_index import parse_hours
+from serialization import parse_timestamp
+
+# Share of power assumed saveable while the AQI is good
+LOW_AQI_POWER_REDUCTION = 0.1
+
+def history_files(paths: List[str], start: Optional[float] = None, end: Optional[float] = None) -> List[str]:
+    """Expand archive directories into their segments overlapping [start, end]; files are kept as given"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(segment_paths(path, start, end))
+        else:
+            files.append(path)
+    return files
+
+def read_history_file(path: str) -> Dict[str, np.ndarray]:
+    """Export columns from an archive segment or export (.npz) or history records as JSON lines"""
+    if path.endswith(".npz"):
+        with open(path, "rb") as f:
+            columns = npz_to_columns(f.read())
+    else:
+        df = pd.read_json(path, lines=True, dtype=False, convert_dates=False)
+        sensors = pd.DataFrame(df.pop("sensor_data").tolist()) if "sensor_data" in df else df
+        columns = {name: df[name].to_numpy() for name in df.columns}
+        columns.update({field: sensors[field].to_numpy() for field in SENSOR_FIELDS})
+    if "device_id" not in columns:
+        columns["device_id"] = np.full(len(columns["timestamp"]), "default")
+    if "epoch" not in columns:
+        columns["epoch"] = np.array([parse_timestamp(t) for t in columns["timestamp"].tolist()])
+    missing = [name for name in EXPORT_COLUMNS if name not in columns]
+    if missing:
+        raise ValueError(f"{path} is not a history file, missing {missing}")
+    return {name: columns[name] for name in EXPORT_COLUMNS}
+
+def read_history(paths: List[str], start: Optional[float] = None, end: Optional[float] = None,
+                 device_id: Optional[str] = None) -> pd.DataFrame:
+    """Load history from archive directories and history files into one frame, oldest first
+
+    Archive segments outside [start, end] are skipped by name. Records seen in
+    more than one file (e.g. an export of archived data) are kept once.
+    """
+    files = history_files(paths, start, end)
+    if not files:
+        return history_frame({name: np.zeros(0) for name in EXPORT_COLUMNS})
+    parts = [read_history_file(path) for path in files]
+    columns = {name: np.concatenate([part[name] for part in parts]) for name in EXPORT_COLUMNS}
+    keep = np.ones(len(columns["epoch"]), dtype=bool)
+    if start is not None:
+        keep &= columns["epoch"] >= start
+    if end is not None:
+        keep &= columns["epoch"] <= end
+    if device_id is not None:
+        keep &= columns["device_id"] == device_id
+    columns = {name: column[keep] for name, column in columns.items()}
+    df = history_frame(columns)
+    if len(files) > 1:
+        df = df.drop_duplicates(subset=["device_id", "epoch"])
+    return df.sort_values("epoch", kind="stable").reset_index(drop=True)
+
+def load_frame(paths: List[str]) -> pd.DataFrame:
+    """History from files when any are given, else the last 24 hours from the running server"""
+    return read_history(paths) if paths else fetch_history_frame()
+
+def add_derived_columns(df: pd.DataFrame, ledger: Optional[EnergyLedger] = None) -> pd.DataFrame:
+    """Add efficiency ratio and per-reading energy (Wh) and cost, plus their running totals
+
+    Energy is integrated per device over the time since that device's previous
+    reading, with each device's wattage and tariff from the energy profiles
+    (ENERGY_PROFILES), so readings of several purifiers can be interleaved.
+    Running totals follow the frame's order.
+    """
+    ledger = ledger or ledger_from_env()
+    df['efficiency_ratio'] = df['aqi_value'] / (df['power_level'] * 100)
+    devices, codes = np.unique(df['device_id'].to_numpy(dtype=str), return_inverse=True)
+    codes = codes.reshape(-1)
+    epochs = df['epoch'].to_numpy(dtype=np.float64)
+    levels = df['power_level'].to_numpy(dtype=np.float64)
+
+    # Order by device, then time, so consecutive rows of one device form its segments
+    order = np.lexsort((epochs, codes))
+    same_device = codes[order][1:] == codes[order][:-1]
+    area = np.where(same_device, segment_energy(epochs[order], levels[order], ledger.max_gap), 0.0)
+    level_seconds = np.empty(len(df))
+    level_seconds[order] = np.concatenate([[0.0], area]) if len(df) else area
+
+    profiles = [ledger.profile_for(device) for device in devices.tolist()]
+    watts = np.array([profile.max_watts for profile in profiles])[codes] if profiles else 0.0
+    tariff = np.array([profile.tariff_per_kwh for profile in profiles])[codes] if profiles else 0.0
+    df['energy_wh'] = level_seconds * watts / 3600
+    df['cost'] = df['energy_wh'] / 1000 * tariff
+    df['cumulative_energy_wh'] = df['energy_wh'].cumsum()
+    df['cumulative_cost'] = df['cost'].cumsum()
+    return df
+
+def _row(df: pd.DataFrame, i) -> Dict:
+    row = df.loc[i]
+    return {
+        "timestamp": row['timestamp'],
+        "device_id": row['device_id'],
+        "aqi_value": float(row['aqi_value']),
+        "power_level": float(row['power_level']),
+        "efficiency_ratio": float(row['efficiency_ratio'])
+    }
+
+def history_metrics(df: pd.DataFrame, peak_hours: str = PEAK_HOURS) -> Dict:
+    """Every metric of the analytics reports, from a frame with add_derived_columns() applied"""
+    if df.empty:
+        raise ValueError("No history records to analyze")
+    aqi = df['aqi_value']
+    power = df['power_level']
+    efficiency = df['efficiency_ratio']
+    total_energy = float(df['energy_wh'].sum())
+    peak = df['timestamp'].dt.hour.isin(parse_hours(peak_hours))
+    low_aqi = aqi <= 50
+    energy_savings = float(df.loc[low_aqi, 'energy_wh'].sum()) * LOW_AQI_POWER_REDUCTION
+    # Savings are costed at the fleet's average tariff
+    cost_savings = energy_savings * float(df['cost'].sum()) / total_energy if total_energy else cost_for(energy_savings)
+    span_days = max((df['epoch'].max() - df['epoch'].min()) / 86400, 1 / 24)
+
+    per_device = df.groupby('device_id').agg(
+        readings=('aqi_value', 'size'),
+        avg_aqi=('aqi_value', 'mean'),
+        avg_power=('power_level', 'mean'),
+        energy_wh=('energy_wh', 'sum'),
+        cost=('cost', 'sum')
+    )
+    daily = df.groupby(df['timestamp'].dt.date).agg(
+        readings=('aqi_value', 'size'),
+        avg_aqi=('aqi_value', 'mean'),
+        max_aqi=('aqi_value', 'max'),
+        avg_power=('power_level', 'mean'),
+        energy_wh=('energy_wh', 'sum'),
+        cost=('cost', 'sum')
+    )
+    return {
+        "readings": len(df),
+        "devices": len(per_device),
+        "start": df['timestamp'].min(),
+        "end": df['timestamp'].max(),
+        "avg_aqi": float(aqi.mean()),
+        "max_aqi": float(aqi.max()),
+        "min_aqi": float(aqi.min()),
+        "avg_power": float(power.mean()),
+        "peak_power": float(power.max()),
+        "peak_power_time": df.loc[power.idxmax(), 'timestamp'],
+        "total_energy_wh": total_energy,
+        "total_cost": float(df['cost'].sum()),
+        "avg_efficiency": float(efficiency.mean()),
+        "best_efficiency": float(efficiency.max()),
+        "worst_efficiency": float(efficiency.min()),
+        "peak_efficiency": _row(df, efficiency.idxmax()),
+        "lowest_efficiency": _row(df, efficiency.idxmin()),
+        "peak_hours": peak_hours,
+        "peak_hours_avg_aqi": float(aqi[peak].mean()) if peak.any() else float("nan"),
+        "peak_hours_avg_power": float(power[peak].mean()) if peak.any() else float("nan"),
+        "optimization_periods": int(low_aqi.sum()),
+        "energy_savings_wh": energy_savings,
+        "cost_savings": cost_savings,
+        "daily_energy_savings_wh": energy_savings / span_days,
+        "daily_cost_savings": cost_savings / span_days,
+        "per_device": per_device,
+        "daily": daily
+    }
+
+def print_report(metrics: Dict):
+    print("\nOffline Analytics Report")
+    print("=" * 50)
+    print(f"Readings: {metrics['readings']} from {metrics['devices']} device(s)")
+    print(f"Period: {metrics['start']} to {metrics['end']}")
+
+    print("\nAir Quality Metrics:")
+    print(f"Average AQI: {metrics['avg_aqi']:.1f}")
+    print(f"Maximum AQI: {metrics['max_aqi']:.1f}")
+    print(f"Minimum AQI: {metrics['min_aqi']:.1f}")
+
+    print("\nPower Usage Metrics:")
+    print(f"Average Power Level: {metrics['avg_power'] * 100:.1f}%")
+    print(f"Peak Power Usage: {metrics['peak_power'] * 100:.1f}% at {metrics['peak_power_time']}")
+    print(f"Total Energy Consumption: {metrics['total_energy_wh']:.2f} Wh")
+    print(f"Total Operating Cost: ${metrics['total_cost']:.3f}")
+
+    print(f"\nPeak Hours ({metrics['peak_hours']}) Performance:")
+    print(f"Average AQI: {metrics['peak_hours_avg_aqi']:.1f}")
+    print(f"Average Power Level: {metrics['peak_hours_avg_power'] * 100:.1f}%")
+
+    print("\nEfficiency Metrics:")
+    print(f"Average Efficiency Ratio: {metrics['avg_efficiency']:.2f}")
+    print(f"Best Efficiency: {metrics['best_efficiency']:.2f} at {metrics['peak_efficiency']['timestamp']}")
+    print(f"Worst Efficiency: {metrics['worst_efficiency']:.2f} at {metrics['lowest_efficiency']['timestamp']}")
+
+    print("\nOptimization Opportunities:")
+    print(f"Identified {metrics['optimization_periods']} periods for power optimization")
+    print(f"Potential Daily Energy Savings: {metrics['daily_energy_savings_wh']:.2f} Wh")
+    print(f"Potential Monthly Cost Savings: ${metrics['daily_cost_savings'] * 30:.2f}")
+
+    print("\nPer Device:")
+    print(metrics['per_device'].to_string(float_format=lambda v: f"{v:.3f}"))
+    print("\nPer Day:")
+    print(metrics['daily'].to_string(float_format=lambda v: f"{v:.3f}"))
+
+def metrics_to_json(metrics: Dict) -> str:
+    def encode(value):
+        if isinstance(value, pd.DataFrame):
+            return value.reset_index().astype({value.index.name or "index": str}).to_dict(orient="records")
+        return str(value)
+    return json.dumps(metrics, default=encode, indent=2)
+
+def write_dashboards(df: pd.DataFrame, metrics: Dict, directory: str, render: str = DEFAULT_RENDER_MODE):
+    """Write the analytics, 24-hour and efficiency dashboards for the frame"""
+    from analyze_efficiency import create_efficiency_dashboard
+    from show_24hr_analytics import create_24hr_dashboard
+    from view_analytics import create_analytics_dashboard
+
+    os.makedirs(directory, exist_ok=True)
+    figures = {
+        "analytics_dashboard.html": create_analytics_dashboard(df, metrics, render)[0],
+        "24hr_analytics_dashboard.html": create_24hr_dashboard(df, render),
+        "efficiency_dashboard.html": create_efficiency_dashboard(df, metrics, render)
+    }
+    for name, fig in figures.items():
+        write_dashboard(fig, os.path.join(directory, name))
+        print(f"Dashboard saved to {os.path.join(directory, name)}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Analytics reports from archived or exported history files")
+    parser.add_argument("paths", nargs="+",
+                        help="HISTORY_ARCHIVE_DIR directories, .npz exports or .jsonl history records")
+    parser.add_argument("--start", help="ISO timestamp of the first reading to include")
+    parser.add_argument("--end", help="ISO timestamp of the last reading to include")
+    parser.add_argument("--device", help="Only this purifier's readings")
+    parser.add_argument("--peak-hours", default=PEAK_HOURS, help="Local hours counted as peak, e.g. 7-10,16-19")
+    parser.add_argument("--json", action="store_true", help="Print the metrics as JSON")
+    parser.add_argument("--dashboards", metavar="DIR", help="Also write the HTML dashboards to DIR")
+    parser.add_argument("--render", choices=RENDER_MODES, default=DEFAULT_RENDER_MODE,
+                        help="Dashboard traces: svg, webgl or auto (WebGL for long series)")
+    args = parser.parse_args()
+
+    df = read_history(args.paths, parse_timestamp(args.start) if args.start else None,
+                      parse_timestamp(args.end) if args.end else None, args.device)
+    if df.empty:
+        parser.exit(1, "No history records in the selected files and range\n")
+    metrics = history_metrics(add_derived_columns(df), args.peak_hours)
+    if args.json:
+        print(metrics_to_json(metrics))
+    else:
+        print_report(metrics)
+    if args.dashboards:
+        write_dashboards(df, metrics, args.dashboards, args.render)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, List, Optional
+import numpy as np
+from aqi_engine import CATEGORY_BOUNDS
+from history_export import SENSOR_FIELDS
+
+# Readings closer than these per-sensor steps share a cache entry, in model feature order
+DEFAULT_TOLERANCES = {
+    "pm25": 0.5,
+    "pm10": 1.0,
+    "no2": 1.0,
+    "so2": 1.0,
+    "co": 0.05,
+    "o3": 1.0,
+    "temperature": 0.2,
+    "humidity": 1.0,
+    "wind_speed": 0.2,
+    "traffic_density": 0.02
+}
+
+# Sensor conditions the recommendations switch on (see generate_recommendations);
+# readings on different sides of one never share an entry
+SENSOR_CONDITIONS = (("temperature", ">", 30.0), ("temperature", "<", 15.0), ("traffic_density", ">", 0.7))
+
+# Predictions this close to an AQI category bound (also where recommendations
+# change and power saturates) are not cached: a reading in the same bucket
+# could score on the other side of it
+DEFAULT_BOUNDARY_MARGIN = 5.0
+
+def parse_tolerances(spec: str) -> Dict[str, float]:
+    """Parse overrides like "pm25=1,co=0.1" on top of DEFAULT_TOLERANCES"""
+    tolerances = dict(DEFAULT_TOLERANCES)
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        field, _, value = item.partition("=")
+        field = field.strip()
+        if field not in tolerances:
+            raise ValueError(f"Unknown sensor field '{field}' in cache tolerances")
+        tolerances[field] = float(value)
+        if tolerances[field] <= 0:
+            raise ValueError(f"Cache tolerance for '{field}' must be positive")
+    return tolerances
+
+class PredictionCache:
+    """LRU cache of prediction results keyed on quantized sensor vectors
+
+    Entries expire after `ttl` seconds and the whole cache is dropped when the
+    model version passed to get()/put() changes, so a reloaded or retrained
+    model never serves stale predictions. Keys also record the side of each
+    SENSOR_CONDITIONS threshold, and predictions within `boundary_margin` of
+    an AQI category bound are not stored, so a cached answer never comes
+    from the other side of a recommendation or category change.
+    maxsize=0 disables caching.
+    """
+    def __init__(self, tolerances: Optional[Dict[str, float]] = None,
+                 maxsize: int = 4096, ttl: float = 300.0,
+                 boundary_margin: float = DEFAULT_BOUNDARY_MARGIN):
+        tolerances = tolerances or DEFAULT_TOLERANCES
+        self.steps = np.array([tolerances[field] for field in SENSOR_FIELDS], dtype=np.float64)
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.boundary_margin = boundary_margin
+        self.boundary_skips = 0
+        self._conditions = [(SENSOR_FIELDS.index(field), np.greater if op == ">" else np.less, value)
+                            for field, op, value in SENSOR_CONDITIONS]
+        self.model_version = None
+        # key -> (expires_at, value), least recently used first
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0
+
+    def keys(self, features: np.ndarray) -> List[Hashable]:
+        """Quantize an (n, 10) feature matrix into one hashable key per row"""
+        features = np.asarray(features, dtype=np.float64)
+        buckets = np.round(features / self.steps).astype(np.int64)
+        sides = [compare(features[:, column], value) for column, compare, value in self._conditions]
+        buckets = np.column_stack([buckets, *sides])
+        return [row.tobytes() for row in buckets]
+
+    def key(self, features: np.ndarray) -> Hashable:
+        return self.keys(np.reshape(features, (1, -1)))[0]
+
+    def _check_version(self, model_version):
+        if model_version != self.model_version:
+            self._entries.clear()
+            self.model_version = model_version
+
+    def get(self, key: Hashable, model_version) -> Optional[Dict]:
+        if not self.enabled:
+            return None
+        self._check_version(model_version)
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key: Hashable, value: Dict, model_version):
+        """Store a prediction dict (with its "aqi_value") unless it is too close to a category bound"""
+        if not self.enabled:
+            return
+        if np.min(np.abs(CATEGORY_BOUNDS - value["aqi_value"])) < self.boundary_margin:
+            self.boundary_skips += 1
+            return
+        self._check_version(model_version)
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate(self):
+        self._entries.clear()
+
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "size": len(self._entries),
+            "maxsize": self.maxsize,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "boundary_skips": self.boundary_skips,
+            "boundary_margin": self.boundary_margin,
+            "hit_rate": self.hit_rate(),
+            "tolerances": dict(zip(SENSOR_FIELDS, self.steps.tolist()))
+        }
@@ -0,0 +1,190 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+# Trace of the request currently being handled, None when debugging is off
+_current_trace: ContextVar = ContextVar("current_trace", default=None)
+
+# Shared no-op context manager so disabled spans cost a single ContextVar lookup
+_NULL_SPAN = nullcontext()
+
+def new_correlation_id() -> str:
+    """Generate a correlation ID for a request that did not bring its own"""
+    return uuid.uuid4().hex
+
+class Trace:
+    """Spans recorded for one request, tied together by a correlation ID"""
+    def __init__(self, correlation_id: str):
+        self.correlation_id = correlation_id
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.spans: List[Dict] = []
+
+    @contextmanager
+    def span(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.spans.append({
+                "name": name,
+                "start_ms": (start - self._start) * 1000,
+                "duration_ms": (end - start) * 1000
+            })
+
+    def to_dict(self) -> Dict:
+        return {
+            "correlation_id": self.correlation_id,
+            "started_at": self.started_at,
+            "duration_ms": (time.perf_counter() - self._start) * 1000,
+            "spans": self.spans
+        }
+
+def tracing() -> bool:
+    """True while the current request is being traced"""
+    return _current_trace.get() is not None
+
+def span(name: str):
+    """Record a span on the active trace, or do nothing when tracing is off"""
+    trace = _current_trace.get()
+    if trace is None:
+        return _NULL_SPAN
+    return trace.span(name)
+
+class SamplingProfiler:
+    """Wall-clock sampling profiler producing folded stacks for flamegraph.pl / speedscope
+
+    A background thread periodically captures the stack of the target thread
+    (the event loop thread that started the profiler). Nested start/stop calls
+    are reference counted so per-request and time-window profiling can overlap.
+    Time windows sample every `interval`; while a single request is being
+    profiled the sampler switches to the finer `request_interval`, as most
+    handlers finish in well under a window interval.
+    """
+    def __init__(self, interval: float = 0.005, request_interval: float = 0.0005):
+        self.interval = interval
+        self.request_interval = request_interval
+        self.samples = 0
+        self._stacks = Counter()
+        self._lock = threading.Lock()
+        self._users = 0
+        self._request_users = 0
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._target_thread_id: Optional[int] = None
+
+    @property
+    def running(self) -> bool:
+        return self._users > 0
+
+    def start(self, request: bool = False):
+        with self._lock:
+            self._users += 1
+            self._request_users += request
+            if self._users > 1:
+                return
+            self._target_thread_id = threading.get_ident()
+            self._stop_event = threading.Event()
+            self._thread = threading.Thread(
+                target=self._run, args=(self._stop_event,),
+                name="sampling-profiler", daemon=True
+            )
+            self._thread.start()
+
+    def stop(self, request: bool = False):
+        with self._lock:
+            if self._users == 0:
+                return
+            self._users -= 1
+            self._request_users -= request
+            if self._users > 0:
+                return
+            # Not joined: stop() runs on the event loop, and the sampler exits on
+            # its own at its next wake-up
+            self._stop_event.set()
+            self._thread = None
+
+    def _run(self, stop_event: threading.Event):
+        target = self._target_thread_id
+        while not stop_event.wait(self.request_interval if self._request_users else self.interval):
+            frame = sys._current_frames().get(target)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            key = ";".join(reversed(stack))
+            with self._lock:
+                self._stacks[key] += 1
+                self.samples += 1
+
+    def collapsed(self, reset: bool = False) -> str:
+        """Return samples in folded-stack format, one 'frame;frame;frame count' per line"""
+        with self._lock:
+            lines = [f"{stack} {count}" for stack, count in self._stacks.most_common()]
+            if reset:
+                self._stacks.clear()
+                self.samples = 0
+        return "\n".join(lines) + ("\n" if lines else "")
+
+class DebugMode:
+    """Per-request and time-window switch for tracing and sampling profiling"""
+    def __init__(self, profiler: SamplingProfiler, max_traces: int = 100):
+        self.profiler = profiler
+        self.recent_traces = deque(maxlen=max_traces)
+        self.window_until = 0.0
+        self._window_handle = None
+
+    def window_active(self) -> bool:
+        return self.window_until > time.monotonic()
+
+    def open_window(self, seconds: float):
+        """Trace and profile every request for the next `seconds`; must run on the event loop"""
+        loop = asyncio.get_running_loop()
+        if self._window_handle is not None:
+            self._window_handle.cancel()
+        else:
+            self.profiler.start()
+        self.window_until = time.monotonic() + seconds
+        self._window_handle = loop.call_later(seconds, self.close_window)
+
+    def close_window(self):
+        if self._window_handle is None:
+            return
+        self._window_handle.cancel()
+        self._window_handle = None
+        self.window_until = 0.0
+        self.profiler.stop()
+
+    @contextmanager
+    def request(self, requested: bool, correlation_id: Optional[str] = None):
+        """Trace (and profile) the enclosed request if debug was requested or a window is open
+
+        Yields the Trace, or None when debugging is off for this request.
+        """
+        if not requested and not self.window_active():
+            yield None
+            return
+        trace = Trace(correlation_id or new_correlation_id())
+        token = _current_trace.set(trace)
+        # Window mode already keeps the profiler running
+        profile = requested and not self.window_active()
+        if profile:
+            self.profiler.start(request=True)
+        try:
+            yield trace
+        finally:
+            if profile:
+                self.profiler.stop(request=True)
+            _current_trace.reset(token)
+            self.recent_traces.append(trace.to_dict())
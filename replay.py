@@ -0,0 +1,160 @@
+import argparse
+import asyncio
+import json
+import time
+from bisect import bisect_right
+from collections import Counter
+from datetime import datetime
+import numpy as np
+from history_export import SENSOR_FIELDS, npz_to_columns
+from serialization import parse_timestamp
+
+DEFAULT_DEVICE_ID = "replay"
+
+def load_jsonl(path):
+    """Load readings from JSONL: flat SensorData dicts or history records with nested sensor_data"""
+    rows, timestamps, device_ids = [], [], []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            sensors = record.get("sensor_data", record)
+            rows.append([sensors[field] for field in SENSOR_FIELDS])
+            timestamps.append(record.get("timestamp") or sensors["timestamp"])
+            device_ids.append(str(record.get("device_id", DEFAULT_DEVICE_ID)))
+    features = np.array(rows, dtype=np.float64).reshape(len(rows), len(SENSOR_FIELDS))
+    return features, timestamps, device_ids
+
+def load_npz(path):
+    """Load readings from the columnar export format (/analytics/export.npz)"""
+    with open(path, "rb") as f:
+        columns = npz_to_columns(f.read())
+    features = np.column_stack([columns[field].astype(np.float64) for field in SENSOR_FIELDS])
+    timestamps = columns["timestamp"].tolist()
+    if "device_id" in columns:
+        device_ids = columns["device_id"].astype(str).tolist()
+    else:
+        device_ids = [DEFAULT_DEVICE_ID] * len(timestamps)
+    return features, timestamps, device_ids
+
+def load_recording(path):
+    if path.endswith(".npz"):
+        return load_npz(path)
+    return load_jsonl(path)
+
+def fan_speed_for(power_level: float) -> int:
+    """Map a 0-1 power level onto fan speeds 1-5"""
+    return 1 + int(round(power_level * 4))
+
+async def replay(features, timestamps, device_ids, speed=None, batch_size=64, rebase=True):
+    """Push recorded readings through prediction, recommendations, history and control
+
+    `speed` is the replay rate relative to real time (1, 100, ...) or None for
+    as fast as possible. Readings are replayed in timestamp order with a stable
+    sort, so each device's readings keep their recorded order.
+    """
+    import app
+
+    epochs = np.array([parse_timestamp(t) for t in timestamps])
+    order = np.argsort(epochs, kind="stable")
+    features = features[order]
+    epochs = epochs[order]
+    device_ids = [device_ids[i] for i in order]
+    timestamps = [timestamps[i] for i in order]
+
+    # Shift the recording so it ends now; otherwise the 24-hour trim would drop old days
+    if rebase and len(epochs):
+        epochs = epochs + (time.time() - epochs[-1])
+        timestamps = [datetime.fromtimestamp(e).isoformat() for e in epochs]
+
+    n = len(epochs)
+    results = []
+    max_lag = 0.0
+    start = time.perf_counter()
+    i = 0
+    while i < n:
+        if speed is None:
+            j = min(i + batch_size, n)
+        else:
+            recording_time = epochs[0] + (time.perf_counter() - start) * speed
+            due = bisect_right(epochs, recording_time)
+            if due <= i:
+                await asyncio.sleep((epochs[i] - recording_time) / speed)
+                continue
+            max_lag = max(max_lag, (recording_time - epochs[i]) / speed)
+            j = min(due, i + batch_size)
+
+        batch = app.process_sensor_batch(features[i:j], timestamps[i:j], epochs[i:j].tolist(), device_ids[i:j])
+        for result, device_id in zip(batch, device_ids[i:j]):
+            await app.control_purifier(device_id, app.PurifierControl(
+                power_level=result["power_level"],
+                mode="auto",
+                fan_speed=fan_speed_for(result["power_level"])
+            ))
+        results.extend(batch)
+        i = j
+
+    elapsed = time.perf_counter() - start
+    return {
+        "readings": n,
+        "elapsed_seconds": elapsed,
+        "throughput": n / elapsed if elapsed > 0 else float("inf"),
+        "max_lag_seconds": max_lag,
+        "recorded_span_seconds": float(epochs[-1] - epochs[0]) if n else 0.0,
+        "devices": Counter(device_ids),
+        "results": results,
+        "efficiency": app.fleet_efficiency_metrics(),
+        "purifier_status": app.purifier_status
+    }
+
+def print_report(report):
+    print("\nReplay Report")
+    print("=" * 50)
+    print(f"Readings: {report['readings']} from {len(report['devices'])} device(s)")
+    print(f"Recorded span: {report['recorded_span_seconds'] / 3600:.2f} hours")
+    print(f"Replay time: {report['elapsed_seconds']:.2f} s")
+    print(f"Throughput: {report['throughput']:.1f} readings/s")
+    print(f"Max lag behind schedule: {report['max_lag_seconds'] * 1000:.1f} ms")
+
+    results = report["results"]
+    if results:
+        aqi = np.array([r["aqi_value"] for r in results])
+        categories = Counter(r["aqi_category"] for r in results)
+        print("\nAir Quality:")
+        print(f"Average AQI: {aqi.mean():.1f}")
+        print(f"Maximum AQI: {aqi.max():.1f}")
+        print(f"Minimum AQI: {aqi.min():.1f}")
+        for category, count in categories.most_common():
+            print(f"  {category}: {count} ({count / len(results) * 100:.1f}%)")
+
+    efficiency = report["efficiency"]
+    print("\nEnergy (last 24 hours of replayed history):")
+    print(f"Total Energy Consumption: {efficiency['total_energy_consumption']:.2f} Wh")
+    print(f"Peak Power Usage: {efficiency['peak_power_usage'] * 100:.1f}%")
+    print(f"Estimated Daily Cost: ${efficiency['estimated_daily_cost']:.3f}")
+
+    print("\nFinal Purifier States:")
+    for device_id, status in sorted(report["purifier_status"].items()):
+        print(f"  {device_id}: power {status['power_level'] * 100:.1f}%, fan {status['fan_speed']}, mode {status['mode']}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded sensor readings through the purifier pipeline")
+    parser.add_argument("recording", help="JSONL (readings or NDJSON history export) or NPZ export file")
+    parser.add_argument("--speed", default="max",
+                        help="Replay rate relative to real time, e.g. 1 or 100, or 'max' (default)")
+    parser.add_argument("--batch-size", type=int, default=64, help="Readings per model call")
+    parser.add_argument("--no-rebase", action="store_true",
+                        help="Keep recorded timestamps instead of shifting the recording to end now")
+    args = parser.parse_args()
+
+    speed = None if args.speed == "max" else float(args.speed)
+    print(f"Loading {args.recording}...")
+    features, timestamps, device_ids = load_recording(args.recording)
+    print(f"Replaying {len(timestamps)} readings at {'maximum' if speed is None else f'{speed:g}x'} speed...")
+    report = asyncio.run(replay(features, timestamps, device_ids, speed, args.batch_size, not args.no_rebase))
+    print_report(report)
+
+if __name__ == "__main__":
+    main()
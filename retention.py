@@ -0,0 +1,115 @@
+from typing import Dict, List, Optional
+import numpy as np
+from history_export import SENSOR_FIELDS
+
+# Values rolled up per bucket: the prediction outputs plus every sensor field
+ROLLUP_FIELDS = ["aqi_value", "power_level"] + SENSOR_FIELDS
+
+# Raw records are kept for this long by the app; rollup tiers take over after that
+RAW_RETENTION_SECONDS = 24 * 3600
+
+class RollupTier:
+    """Fixed-size round-robin array of time buckets holding count, sum, min and max per field
+
+    Bucket b lives in slot b % slots. A slot is reset the first time a newer
+    bucket lands on it, so memory is bounded by `retention / resolution` slots
+    and old buckets expire without any cleanup pass.
+    """
+    def __init__(self, name: str, resolution: int, retention: int, fields: List[str] = ROLLUP_FIELDS):
+        self.name = name
+        self.resolution = resolution
+        self.retention = retention
+        self.fields = list(fields)
+        self.slots = retention // resolution
+        width = len(self.fields)
+        self.buckets = np.full(self.slots, -1, dtype=np.int64)
+        self.count = np.zeros(self.slots, dtype=np.int64)
+        self.sum = np.zeros((self.slots, width))
+        self.min = np.full((self.slots, width), np.inf)
+        self.max = np.full((self.slots, width), -np.inf)
+
+    def add(self, epochs: np.ndarray, values: np.ndarray):
+        """Fold readings (epochs (n,), values (n, len(fields))) into their buckets"""
+        buckets = np.floor(np.asarray(epochs, dtype=np.float64) / self.resolution).astype(np.int64)
+        slots = buckets % self.slots
+
+        # Claim slots for buckets newer than what they hold, clearing the expired bucket
+        claimed = self.buckets.copy()
+        np.maximum.at(claimed, slots, buckets)
+        reset = np.flatnonzero(claimed != self.buckets)
+        if len(reset):
+            self.buckets[reset] = claimed[reset]
+            self.count[reset] = 0
+            self.sum[reset] = 0.0
+            self.min[reset] = np.inf
+            self.max[reset] = -np.inf
+
+        # Readings older than their slot's bucket have already expired from this tier
+        current = self.buckets[slots] == buckets
+        if not current.all():
+            slots, values = slots[current], values[current]
+        np.add.at(self.count, slots, 1)
+        np.add.at(self.sum, slots, values)
+        np.minimum.at(self.min, slots, values)
+        np.maximum.at(self.max, slots, values)
+
+    def query(self, start_epoch: float, end_epoch: float) -> Dict[str, np.ndarray]:
+        """Columns for the non-empty buckets overlapping [start_epoch, end_epoch], oldest first"""
+        first = np.floor(start_epoch / self.resolution)
+        last = np.floor(end_epoch / self.resolution)
+        selected = np.flatnonzero((self.buckets >= first) & (self.buckets <= last) & (self.count > 0))
+        selected = selected[np.argsort(self.buckets[selected])]
+        count = self.count[selected]
+        columns = {
+            "epoch": (self.buckets[selected] * self.resolution).astype(np.float64),
+            "count": count
+        }
+        # Field-major copies so every column is a contiguous array
+        means = (self.sum[selected] / count[:, None]).T.copy()
+        mins = self.min[selected].T.copy()
+        maxs = self.max[selected].T.copy()
+        for i, field in enumerate(self.fields):
+            columns[f"{field}_mean"] = means[i]
+            columns[f"{field}_min"] = mins[i]
+            columns[f"{field}_max"] = maxs[i]
+        return columns
+
+    def covers(self, start_epoch: float, now: float) -> bool:
+        return start_epoch >= now - self.retention
+
+class RetentionTiers:
+    """Rollup tiers from finest to coarsest, all updated on every append"""
+    def __init__(self, tiers: Optional[List[RollupTier]] = None):
+        self.tiers = tiers or [
+            RollupTier("1m", 60, 7 * 24 * 3600),
+            RollupTier("1h", 3600, 365 * 24 * 3600)
+        ]
+
+    def add(self, epochs: np.ndarray, values: np.ndarray):
+        for tier in self.tiers:
+            tier.add(epochs, values)
+
+    def get(self, name: str) -> RollupTier:
+        for tier in self.tiers:
+            if tier.name == name:
+                return tier
+        raise ValueError(f"Unknown tier '{name}', expected one of {[tier.name for tier in self.tiers]}")
+
+    def select(self, start_epoch: float, end_epoch: float, now: float, max_points: int) -> RollupTier:
+        """Cheapest tier for a range: the finest one that covers its start within `max_points`
+        buckets, else the coarsest tier that still covers it (or simply the coarsest)"""
+        covering = [tier for tier in self.tiers if tier.covers(start_epoch, now)] or self.tiers[-1:]
+        for tier in covering:
+            if (end_epoch - start_epoch) / tier.resolution <= max_points:
+                return tier
+        return covering[-1]
+
+def rollup_values(entries: List[Dict]) -> np.ndarray:
+    """(n, len(ROLLUP_FIELDS)) matrix of the rolled-up values of history records"""
+    values = np.empty((len(entries), len(ROLLUP_FIELDS)))
+    for i, entry in enumerate(entries):
+        sensor_data = entry["sensor_data"]
+        values[i, 0] = entry["aqi_value"]
+        values[i, 1] = entry["power_level"]
+        values[i, 2:] = [sensor_data[field] for field in SENSOR_FIELDS]
+    return values
@@ -0,0 +1,80 @@
+import orjson
+import numpy as np
+from datetime import datetime
+from fastapi.responses import ORJSONResponse
+from typing import Dict, List, Tuple
+from history_export import SENSOR_FIELDS
+
+# Response class for all JSON endpoints; orjson is several times faster than json
+FastJSONResponse = ORJSONResponse
+
+# Same options as ORJSONResponse, so numpy scalars from the model serialize directly
+_ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+def dumps(obj) -> bytes:
+    """Serialize to JSON bytes"""
+    return orjson.dumps(obj, option=_ORJSON_OPTIONS)
+
+def dumps_text(obj) -> str:
+    """Serialize to a JSON string, e.g. for WebSocket text frames"""
+    return orjson.dumps(obj, option=_ORJSON_OPTIONS).decode()
+
+loads = orjson.loads
+
+def parse_timestamp(timestamp: str) -> float:
+    """Parse an ISO timestamp (naive local time or with Z/offset) into epoch seconds"""
+    return datetime.fromisoformat(timestamp.replace("Z", "+00:00")).timestamp()
+
+def validate_batch(rows) -> Tuple[np.ndarray, List[str], List[float]]:
+    """Validate a batch of readings in bulk
+
+    Returns an (n, 10) float64 feature matrix in SENSOR_FIELDS order, the
+    timestamps and their parsed epochs. Numeric fields are converted with one
+    NumPy call instead of a pydantic model per reading.
+    """
+    if not isinstance(rows, list):
+        raise ValueError("batch payload must be a JSON array of readings")
+    for i, row in enumerate(rows):
+        if not isinstance(row, dict):
+            raise ValueError(f"reading {i} must be a JSON object")
+    try:
+        features = np.array(
+            [[row[field] for field in SENSOR_FIELDS] for row in rows],
+            dtype=np.float64
+        ).reshape(len(rows), len(SENSOR_FIELDS))
+        timestamps = [row["timestamp"] for row in rows]
+    except (KeyError, TypeError, ValueError):
+        raise ValueError(_invalid_reading(rows))
+    finite = np.isfinite(features)
+    if not finite.all():
+        row, column = np.argwhere(~finite)[0]
+        raise ValueError(f"reading {row} has a non-finite {SENSOR_FIELDS[column]}")
+    epochs = []
+    for i, timestamp in enumerate(timestamps):
+        if not isinstance(timestamp, str):
+            raise ValueError(f"reading {i} timestamp must be a string")
+        try:
+            epochs.append(parse_timestamp(timestamp))
+        except ValueError:
+            raise ValueError(f"reading {i} has an invalid timestamp '{timestamp}'")
+    return features, timestamps, epochs
+
+def _invalid_reading(rows: List[Dict]) -> str:
+    """Describe the first reading that failed the bulk conversion"""
+    for i, row in enumerate(rows):
+        for field in (*SENSOR_FIELDS, "timestamp"):
+            if field not in row:
+                return f"reading {i} is missing field '{field}'"
+        for field in SENSOR_FIELDS:
+            try:
+                float(row[field])
+            except (TypeError, ValueError):
+                return f"reading {i} has a non-numeric {field}"
+    return "invalid reading in batch"
+
+def sensor_dicts(features: np.ndarray, timestamps: List[str]) -> List[Dict]:
+    """Rebuild per-reading sensor dicts (same shape as SensorData.dict()) from a validated batch"""
+    return [
+        dict(zip(SENSOR_FIELDS, row), timestamp=timestamp)
+        for row, timestamp in zip(features.tolist(), timestamps)
+    ]
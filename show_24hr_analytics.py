@@ -1,18 +1,26 @@
-import requests
-import pandas as pd
-import plotly.graph_objects as go
+import sys
 from plotly.subplots import make_subplots
-from datetime import datetime, timedelta
+from analytics_client import peak_windows
+from dashboards import (DEFAULT_RENDER_MODE, bar_trace, line_trace, max_plot_points, time_values, values,
+                        write_dashboard)
+from downsampling import downsample_frame
+from offline_analytics import add_derived_columns, history_metrics, load_frame
 
-def fetch_analytics():
-    """Fetch 24-hour analytics data"""
-    response = requests.get("http://127.0.0.1:8000/analytics/daily")
-    return response.json()
+def fetch_analytics(paths=()):
+    """Load history files as a DataFrame, or fetch the last 24 hours from the server"""
+    return load_frame(list(paths))
 
-def create_24hr_dashboard(data):
-    """Create an interactive 24-hour analytics dashboard"""
-    df = pd.DataFrame(data)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
+def create_24hr_dashboard(df, render=DEFAULT_RENDER_MODE):
+    """Create an interactive 24-hour analytics dashboard
+
+    `render` is "svg", "webgl" or "auto" (WebGL for long series).
+    """
+    # Derived series are computed on the full history, then only the plotted
+    # points are downsampled (LTTB) so long histories render quickly
+    if 'cumulative_energy_wh' not in df:
+        add_derived_columns(df)
+    plot_df = downsample_frame(df, max_plot_points(len(df), render))
+    timestamps = time_values(plot_df['timestamp'])
     
     # Create figure with secondary y-axis
     fig = make_subplots(
@@ -30,9 +38,10 @@ def create_24hr_dashboard(data):
     
     # Plot 1: AQI and Power Level
     fig.add_trace(
-        go.Scatter(
-            x=df['timestamp'],
-            y=df['aqi_value'],
+        line_trace(
+            timestamps,
+            values(plot_df['aqi_value']),
+            render,
             name="AQI",
             line=dict(color="#1f77b4", width=2)
         ),
@@ -41,9 +50,10 @@ def create_24hr_dashboard(data):
     )
     
     fig.add_trace(
-        go.Scatter(
-            x=df['timestamp'],
-            y=[p * 100 for p in df['power_level']],
+        line_trace(
+            timestamps,
+            values(plot_df['power_level'] * 100),
+            render,
             name="Power Level (%)",
             line=dict(color="#d62728", width=2, dash='dash')
         ),
@@ -52,26 +62,24 @@ def create_24hr_dashboard(data):
     )
     
     # Plot 2: Hourly Performance
-    efficiency_ratio = df['aqi_value'] / (df['power_level'] * 100)
     fig.add_trace(
-        go.Bar(
-            x=df['timestamp'],
-            y=efficiency_ratio,
-            name="Efficiency Ratio",
-            marker_color="#2ecc71"
+        bar_trace(
+            timestamps,
+            values(plot_df['efficiency_ratio']),
+            "#2ecc71",
+            render,
+            name="Efficiency Ratio"
         ),
         row=2, col=1,
         secondary_y=False
     )
     
     # Plot 3: Cumulative Energy Usage
-    energy_consumption = df['power_level'].cumsum() * 50  # Assuming 50W max power
-    cost = energy_consumption * 0.12 / 1000  # $0.12 per kWh
-    
     fig.add_trace(
-        go.Scatter(
-            x=df['timestamp'],
-            y=energy_consumption,
+        line_trace(
+            timestamps,
+            values(plot_df['cumulative_energy_wh']),
+            render,
             name="Energy (Wh)",
             fill='tozeroy',
             line=dict(color="#3498db")
@@ -81,9 +89,10 @@ def create_24hr_dashboard(data):
     )
     
     fig.add_trace(
-        go.Scatter(
-            x=df['timestamp'],
-            y=cost,
+        line_trace(
+            timestamps,
+            values(plot_df['cumulative_cost']),
+            render,
             name="Cost ($)",
             line=dict(color="#e74c3c")
         ),
@@ -91,32 +100,18 @@ def create_24hr_dashboard(data):
         secondary_y=True
     )
     
-    # Add peak traffic period highlights
-    morning_peak_start = df['timestamp'].iloc[7]  # 7 AM
-    morning_peak_end = df['timestamp'].iloc[10]   # 10 AM
-    evening_peak_start = df['timestamp'].iloc[16] # 4 PM
-    evening_peak_end = df['timestamp'].iloc[19]   # 7 PM
-    
-    for row in [1, 2, 3]:
-        fig.add_vrect(
-            x0=morning_peak_start,
-            x1=morning_peak_end,
-            fillcolor="yellow",
-            opacity=0.2,
-            layer="below",
-            line_width=0,
-            row=row, col=1
-        )
-        
-        fig.add_vrect(
-            x0=evening_peak_start,
-            x1=evening_peak_end,
-            fillcolor="yellow",
-            opacity=0.2,
-            layer="below",
-            line_width=0,
-            row=row, col=1
-        )
+    # Add peak traffic period highlights (7-11 AM and 4-8 PM on each day shown)
+    for peak_start, peak_end in peak_windows(df['timestamp']):
+        for row in [1, 2, 3]:
+            fig.add_vrect(
+                x0=peak_start,
+                x1=peak_end,
+                fillcolor="yellow",
+                opacity=0.2,
+                layer="below",
+                line_width=0,
+                row=row, col=1
+            )
     
     # Update layout
     fig.update_layout(
@@ -127,6 +122,7 @@ def create_24hr_dashboard(data):
     )
     
     # Update y-axes titles
+    fig.update_xaxes(type="date")
     fig.update_yaxes(title_text="AQI Value", row=1, col=1, secondary_y=False)
     fig.update_yaxes(title_text="Power Level (%)", row=1, col=1, secondary_y=True)
     fig.update_yaxes(title_text="Efficiency Ratio", row=2, col=1, secondary_y=False)
@@ -141,59 +137,44 @@ def print_summary_stats(df):
     print("=" * 50)
     
     # Calculate metrics
-    avg_aqi = df['aqi_value'].mean()
-    max_aqi = df['aqi_value'].max()
-    min_aqi = df['aqi_value'].min()
-    avg_power = df['power_level'].mean() * 100
-    total_energy = df['power_level'].sum() * 50  # 50W max power
-    total_cost = total_energy * 0.12 / 1000  # $0.12 per kWh
+    metrics = history_metrics(add_derived_columns(df))
     
     # Air Quality Stats
     print("\nAir Quality Metrics:")
-    print(f"Average AQI: {avg_aqi:.1f}")
-    print(f"Maximum AQI: {max_aqi:.1f}")
-    print(f"Minimum AQI: {min_aqi:.1f}")
+    print(f"Average AQI: {metrics['avg_aqi']:.1f}")
+    print(f"Maximum AQI: {metrics['max_aqi']:.1f}")
+    print(f"Minimum AQI: {metrics['min_aqi']:.1f}")
     
     # Power Usage Stats
     print("\nPower Usage Metrics:")
-    print(f"Average Power Level: {avg_power:.1f}%")
-    print(f"Total Energy Consumption: {total_energy:.2f} Wh")
-    print(f"Total Operating Cost: ${total_cost:.3f}")
+    print(f"Average Power Level: {metrics['avg_power'] * 100:.1f}%")
+    print(f"Total Energy Consumption: {metrics['total_energy_wh']:.2f} Wh")
+    print(f"Total Operating Cost: ${metrics['total_cost']:.3f}")
     
     # Peak Hours Analysis
-    peak_hours_df = df[
-        (df['timestamp'].dt.hour.isin(range(7, 11))) |
-        (df['timestamp'].dt.hour.isin(range(16, 20)))
-    ]
-    
     print("\nPeak Hours Performance:")
-    print(f"Average AQI: {peak_hours_df['aqi_value'].mean():.1f}")
-    print(f"Average Power Level: {peak_hours_df['power_level'].mean() * 100:.1f}%")
+    print(f"Average AQI: {metrics['peak_hours_avg_aqi']:.1f}")
+    print(f"Average Power Level: {metrics['peak_hours_avg_power'] * 100:.1f}%")
     
     # Efficiency Analysis
-    efficiency_ratio = df['aqi_value'] / (df['power_level'] * 100)
     print("\nEfficiency Metrics:")
-    print(f"Average Efficiency Ratio: {efficiency_ratio.mean():.2f}")
-    print(f"Best Efficiency: {efficiency_ratio.max():.2f}")
-    print(f"Worst Efficiency: {efficiency_ratio.min():.2f}")
+    print(f"Average Efficiency Ratio: {metrics['avg_efficiency']:.2f}")
+    print(f"Best Efficiency: {metrics['best_efficiency']:.2f}")
+    print(f"Worst Efficiency: {metrics['worst_efficiency']:.2f}")
 
-def main():
+def main(paths=()):
     # Fetch data
     print("Fetching 24-hour analytics data...")
-    data = fetch_analytics()
-    
-    # Convert to DataFrame
-    df = pd.DataFrame(data)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
+    df = fetch_analytics(paths)
     
     # Print summary statistics
     print_summary_stats(df)
     
     # Create and save dashboard
-    fig = create_24hr_dashboard(data)
+    fig = create_24hr_dashboard(df)
     output_file = "24hr_analytics_dashboard.html"
-    fig.write_html(output_file)
+    write_dashboard(fig, output_file)
     print(f"\nInteractive dashboard saved to {output_file}")
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1:])
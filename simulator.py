@@ -0,0 +1,220 @@
+import argparse
+import io
+import json
+import time
+from datetime import datetime, timezone
+from typing import Dict, Iterator, List
+import numpy as np
+from history_export import SENSOR_FIELDS
+from serialization import parse_timestamp
+
+# Fixed default start (naive local time), so a seed always yields the same readings
+DEFAULT_START = "2024-01-01T00:00:00Z"
+
+def _ar1(shocks: np.ndarray, phi: float, state: np.ndarray) -> np.ndarray:
+    """Vectorized AR(1) filter x[t] = phi * x[t-1] + shocks[t] along axis 0
+
+    Works in blocks where x[i] = phi**(i+1) * state + sum_j phi**(i-j) * shocks[j]
+    is a scaled cumulative sum, so the Python loop runs once per block rather
+    than once per time step. Block length keeps phi**-block well inside float range.
+    """
+    steps = shocks.shape[0]
+    block = max(1, min(256, int(18 / -np.log(phi)))) if 0 < phi < 1 else 1
+    k = np.arange(block)
+    powers = (phi ** (k + 1))[:, None]
+    scale = (phi ** -k)[:, None]
+    inverse = (phi ** k)[:, None]
+    out = np.empty_like(shocks)
+    for start in range(0, steps, block):
+        m = min(block, steps - start)
+        partial = np.cumsum(shocks[start:start + m] * scale[:m], axis=0) * inverse[:m]
+        out[start:start + m] = partial + powers[:m] * state
+        state = out[start + m - 1]
+    return out
+
+class FleetSimulator:
+    """Seeded generator of correlated pollutant, weather and traffic series for N purifiers
+
+    Every call to generate() continues from where the previous call stopped, so
+    a run split into batches produces exactly the same readings as one big call.
+    """
+    _STREAMS = ("devices", "traffic", "arrivals", "jumps", "weather", "humidity", "wind",
+                "gusts", "pollution", "pm25", "pm10", "no2", "so2", "co", "o3")
+
+    def __init__(self, n_devices: int = 10, seed: int = 42, interval_seconds: float = 60.0,
+                 start: float = None, episode_rate_per_day: float = 1.5):
+        self.n_devices = n_devices
+        self.interval = interval_seconds
+        self.start = parse_timestamp(DEFAULT_START) if start is None else start
+        self.episode_rate = episode_rate_per_day
+        # One random stream per quantity, so draws don't depend on how a run is batched
+        streams = np.random.SeedSequence(seed).spawn(len(self._STREAMS))
+        self._rng = {name: np.random.default_rng(stream) for name, stream in zip(self._STREAMS, streams)}
+        rng = self._rng["devices"]
+        self.device_ids = np.array([f"purifier-{i:04d}" for i in range(n_devices)])
+
+        # Fixed per-device characteristics: how polluted and how busy each location is
+        self.location_factor = rng.lognormal(0.0, 0.35, n_devices)
+        self.traffic_exposure = rng.uniform(0.4, 1.0, n_devices)
+        self.temperature_offset = rng.normal(0.0, 1.5, n_devices)
+
+        # AR(1) states carried between generate() calls
+        self._pollution_state = np.zeros(n_devices)
+        self._weather_state = np.zeros(n_devices)
+        self._wind_state = np.zeros(1)
+        self._episode_state = np.zeros(1)
+        self.step = 0
+
+        # Daily patterns follow UTC hours, so readings don't depend on the machine's timezone
+        midnight = datetime.fromtimestamp(self.start, timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
+        self._midnight = midnight.timestamp()
+
+    def generate(self, n_steps: int) -> Dict[str, np.ndarray]:
+        """Generate the next `n_steps` time steps for every device
+
+        Returns time-major columns: "device_id", "epoch" and one array per
+        sensor field, each of length n_steps * n_devices.
+        """
+        n = self.n_devices
+        rng = self._rng
+        steps = self.step + np.arange(n_steps)
+        epochs = self.start + steps * self.interval
+        hours = ((epochs - self._midnight) / 3600.0) % 24
+        self.step += n_steps
+
+        # Traffic: morning and evening rush-hour peaks over a night-time baseline
+        rush = (np.exp(-0.5 * ((hours - 8.5) / 1.2) ** 2) +
+                0.9 * np.exp(-0.5 * ((hours - 17.5) / 1.5) ** 2))
+        daytime = np.clip(np.sin(np.pi * (hours - 5) / 18), 0, None)
+        traffic_profile = 0.1 + 0.25 * daytime + 0.6 * rush
+        traffic = np.clip(
+            traffic_profile[:, None] * self.traffic_exposure + rng["traffic"].normal(0, 0.05, (n_steps, n)),
+            0, 1
+        )
+
+        # Region-wide pollution episodes: Poisson arrivals that decay over a few hours
+        decay = np.exp(-self.interval / (3 * 3600))
+        arrival_probability = self.episode_rate * self.interval / 86400
+        arrivals = rng["arrivals"].random((n_steps, 1)) < arrival_probability
+        jumps = arrivals * rng["jumps"].exponential(1.5, (n_steps, 1))
+        episodes = _ar1(jumps, decay, self._episode_state)
+        self._episode_state = episodes[-1]
+
+        # Weather: diurnal temperature, humidity moving against it, gusty wind
+        weather_noise = _ar1(rng["weather"].normal(0, 0.3, (n_steps, n)), 0.98, self._weather_state)
+        self._weather_state = weather_noise[-1]
+        temperature = (22 + 6 * np.sin(2 * np.pi * (hours - 9) / 24))[:, None] + \
+            self.temperature_offset + weather_noise
+        humidity = np.clip(60 - 2.0 * (temperature - 22) + rng["humidity"].normal(0, 3, (n_steps, n)), 5, 100)
+        wind_noise = _ar1(rng["wind"].normal(0, 0.4, (n_steps, 1)), 0.99, self._wind_state)
+        self._wind_state = wind_noise[-1]
+        wind_speed = np.clip(3 + wind_noise + rng["gusts"].gamma(1.5, 0.5, (n_steps, n)), 0, 20)
+
+        # Shared latent pollution level drives correlated pollutants; wind disperses it
+        pollution_noise = _ar1(rng["pollution"].normal(0, 0.08, (n_steps, n)), 0.97, self._pollution_state)
+        self._pollution_state = pollution_noise[-1]
+        latent = (self.location_factor * (1 + 1.5 * traffic) * (1 + episodes) *
+                  np.exp(pollution_noise) / (1 + 0.15 * wind_speed))
+
+        def jitter(name, sigma):
+            return np.exp(rng[name].normal(0, sigma, (n_steps, n)))
+
+        pm25 = np.clip(15 * latent * jitter("pm25", 0.1), 0, 500)
+        pm10 = np.clip(pm25 * 1.7 * jitter("pm10", 0.1), 0, 600)
+        no2 = np.clip((10 + 40 * traffic) * latent ** 0.5 * jitter("no2", 0.1), 0, 200)
+        so2 = np.clip(5 * latent * jitter("so2", 0.2), 0, 100)
+        co = np.clip((0.3 + 1.5 * traffic) * latent ** 0.5 * jitter("co", 0.1), 0, 50)
+        # Ozone forms in warm sunlight and is consumed by NO2
+        o3 = np.clip((20 + 2.5 * np.clip(temperature - 15, 0, None)) * (1 + daytime[:, None]) -
+                     0.3 * no2 + rng["o3"].normal(0, 4, (n_steps, n)), 0, 200)
+
+        columns = {
+            "device_id": np.tile(self.device_ids, n_steps),
+            "epoch": np.repeat(epochs, n),
+        }
+        for name, values in zip(SENSOR_FIELDS, (pm25, pm10, no2, so2, co, o3, temperature,
+                                                humidity, wind_speed, traffic)):
+            columns[name] = values.reshape(-1)
+        return columns
+
+    def batches(self, n_steps: int, steps_per_batch: int) -> Iterator[Dict[str, np.ndarray]]:
+        """Yield `n_steps` of readings in batches of `steps_per_batch` time steps"""
+        remaining = n_steps
+        while remaining > 0:
+            size = min(steps_per_batch, remaining)
+            remaining -= size
+            yield self.generate(size)
+
+def iso_timestamps(epochs: np.ndarray) -> np.ndarray:
+    """Vectorized epoch -> ISO-8601 UTC strings"""
+    return np.datetime_as_string((epochs * 1e6).astype("datetime64[us]"), unit="s", timezone="UTC")
+
+def to_readings(columns: Dict[str, np.ndarray]) -> List[Dict]:
+    """Convert generated columns into SensorData-style dicts (plus device_id) for /ingest or /predict"""
+    timestamps = iso_timestamps(columns["epoch"]).tolist()
+    values = np.column_stack([columns[field] for field in SENSOR_FIELDS]).tolist()
+    device_ids = columns["device_id"].tolist()
+    return [
+        dict(zip(SENSOR_FIELDS, row), timestamp=timestamp, device_id=device_id)
+        for row, timestamp, device_id in zip(values, timestamps, device_ids)
+    ]
+
+def write_npz(path: str, batches: Iterator[Dict[str, np.ndarray]]):
+    """Write generated readings in the columnar export layout (plus device_id), loadable by replay.py"""
+    parts = list(batches)
+    columns = {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+    columns["timestamp"] = iso_timestamps(columns.pop("epoch"))
+    np.savez(path, **columns)
+
+def write_jsonl(path: str, batches: Iterator[Dict[str, np.ndarray]]):
+    """Write generated readings as JSON lines, one reading per line"""
+    with open(path, "w") as f:
+        for columns in batches:
+            buffer = io.StringIO()
+            for reading in to_readings(columns):
+                buffer.write(json.dumps(reading))
+                buffer.write("\n")
+            f.write(buffer.getvalue())
+
+def benchmark(n_devices: int, n_steps: int, seed: int):
+    simulator = FleetSimulator(n_devices, seed)
+    start = time.perf_counter()
+    columns = simulator.generate(n_steps)
+    elapsed = time.perf_counter() - start
+    readings = len(columns["epoch"])
+    print(f"Generated {readings} readings in {elapsed:.3f} s ({readings / elapsed / 1e6:.2f} M readings/s)")
+
+def main():
+    parser = argparse.ArgumentParser(description="Deterministic sensor fleet simulator")
+    parser.add_argument("--devices", type=int, default=10, help="Number of virtual purifiers")
+    parser.add_argument("--hours", type=float, default=24, help="Simulated duration in hours")
+    parser.add_argument("--interval", type=float, default=60, help="Seconds between readings")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--start", default=DEFAULT_START,
+                        help="ISO timestamp of the first reading, e.g. 2024-06-01T00:00:00Z (without an offset it is "
+                             "local time); readings depend only on it and --seed")
+    parser.add_argument("--out", help="Output file (.npz or .jsonl)")
+    parser.add_argument("--benchmark", action="store_true", help="Measure generation throughput")
+    args = parser.parse_args()
+
+    n_steps = int(args.hours * 3600 / args.interval)
+    if args.benchmark:
+        benchmark(args.devices, n_steps, args.seed)
+        return
+    if not args.out:
+        parser.error("--out is required unless --benchmark is given")
+
+    try:
+        start = parse_timestamp(args.start)
+    except ValueError:
+        parser.error(f"--start must be an ISO timestamp, got '{args.start}'")
+    simulator = FleetSimulator(args.devices, args.seed, args.interval, start=start)
+    batches = simulator.batches(n_steps, steps_per_batch=1440)
+    if args.out.endswith(".npz"):
+        write_npz(args.out, batches)
+    else:
+        write_jsonl(args.out, batches)
+    print(f"Wrote {n_steps * args.devices} readings for {args.devices} devices to {args.out}")
+
+if __name__ == "__main__":
+    main()
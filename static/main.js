@@ -3,6 +3,13 @@ let ws = null;
 let powerGauge = null;
 let analyticsChart = null;
 
+// Cap on points per chart series; the server downsamples with LTTB
+const ANALYTICS_MAX_POINTS = 2000;
+// Poll for new history records every 10 seconds
+const ANALYTICS_POLL_INTERVAL = 10000;
+// Delta-sync cursor ("<boot ID>-<seq>") of the last history record seen
+let analyticsCursor = null;
+
 // Initialize dashboard
 document.addEventListener('DOMContentLoaded', function() {
     initializeWebSocket();
@@ -60,39 +67,71 @@ function initializePowerGauge() {
 }
 
 function initializeAnalyticsChart() {
-    fetch('/analytics/daily')
+    fetch(`/analytics/daily?since=0&max_points=${ANALYTICS_MAX_POINTS}`)
+        .then(response => response.json())
+        .then(page => {
+            analyticsCursor = page.cursor;
+            renderAnalyticsChart(page.records);
+            setInterval(pollAnalytics, ANALYTICS_POLL_INTERVAL);
+        });
+}
+
+function renderAnalyticsChart(data) {
+    const timestamps = data.map(d => d.timestamp);
+    const aqiValues = data.map(d => d.aqi_value);
+    const powerLevels = data.map(d => d.power_level * 100);
+    
+    const trace1 = {
+        x: timestamps,
+        y: aqiValues,
+        name: 'AQI',
+        type: 'scatter',
+        line: { color: '#3498db' }
+    };
+    
+    const trace2 = {
+        x: timestamps,
+        y: powerLevels,
+        name: 'Power Level (%)',
+        type: 'scatter',
+        line: { color: '#e74c3c' }
+    };
+    
+    const layout = {
+        showlegend: true,
+        legend: { orientation: 'h' },
+        margin: { t: 10, l: 40, r: 40, b: 40 },
+        xaxis: { title: 'Time' },
+        yaxis: { title: 'Value' }
+    };
+    
+    Plotly.newPlot('analytics-chart', [trace1, trace2], layout);
+    analyticsChart = document.getElementById('analytics-chart');
+}
+
+function pollAnalytics() {
+    // Only records added after the cursor are sent, so polling cost scales with new data.
+    // Deltas are fetched in full; extendTraces below keeps the chart at ANALYTICS_MAX_POINTS
+    fetch(`/analytics/daily?since=${analyticsCursor}`)
         .then(response => response.json())
-        .then(data => {
-            const timestamps = data.map(d => d.timestamp);
-            const aqiValues = data.map(d => d.aqi_value);
-            const powerLevels = data.map(d => d.power_level * 100);
-            
-            const trace1 = {
-                x: timestamps,
-                y: aqiValues,
-                name: 'AQI',
-                type: 'scatter',
-                line: { color: '#3498db' }
-            };
-            
-            const trace2 = {
-                x: timestamps,
-                y: powerLevels,
-                name: 'Power Level (%)',
-                type: 'scatter',
-                line: { color: '#e74c3c' }
-            };
-            
-            const layout = {
-                showlegend: true,
-                legend: { orientation: 'h' },
-                margin: { t: 10, l: 40, r: 40, b: 40 },
-                xaxis: { title: 'Time' },
-                yaxis: { title: 'Value' }
-            };
-            
-            Plotly.newPlot('analytics-chart', [trace1, trace2], layout);
-            analyticsChart = document.getElementById('analytics-chart');
+        .then(page => {
+            analyticsCursor = page.cursor;
+            if (page.reset) {
+                // Server history restarted; redraw from scratch
+                renderAnalyticsChart(page.records);
+                return;
+            }
+            if (page.records.length === 0) {
+                return;
+            }
+            const timestamps = page.records.map(d => d.timestamp);
+            Plotly.extendTraces('analytics-chart', {
+                x: [timestamps, timestamps],
+                y: [
+                    page.records.map(d => d.aqi_value),
+                    page.records.map(d => d.power_level * 100)
+                ]
+            }, [0, 1], ANALYTICS_MAX_POINTS);
         });
 }
 
@@ -0,0 +1,174 @@
+import os
+import threading
+import time
+from typing import Dict, List
+from serialization import dumps, loads
+
+SNAPSHOT_FILE = "status-snapshot.json"
+LOG_FILE = "status.log"
+
+def _fsync_directory(directory: str):
+    """Make a rename in `directory` durable (no-op where directories can't be opened)"""
+    if not hasattr(os, "O_DIRECTORY"):
+        return
+    fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+class StatusStore:
+    """Write-behind persistence of purifier status
+
+    Every change is a {"seq", "id" (or "ids"), "set"} record appended to an
+    in-memory buffer; requests never wait on the disk. A background thread
+    appends the buffer to an NDJSON log and fsyncs it once per
+    `flush_seconds`, so a crash loses at most that window. The thread also
+    applies the records to its own copy of the state and, once
+    `snapshot_records` records are in the log, writes that copy as a
+    snapshot and starts a new log. Startup reads the snapshot and replays
+    the short log tail after it.
+    """
+    def __init__(self, directory: str, flush_seconds: float = 1.0, snapshot_records: int = 10000):
+        self.directory = directory
+        self.flush_seconds = flush_seconds
+        self.snapshot_records = snapshot_records
+        self.seq = 0
+        # Last seq applied to the writer's copy of the state
+        self._applied_seq = 0
+        self.flushes = 0
+        self.snapshots = 0
+        self.restore_seconds = 0.0
+        self._pending: List[bytes] = []
+        self._lock = threading.Lock()
+        self._state: Dict[str, Dict] = {}
+        self._log_records = 0
+        self._log = None
+        self._closed = threading.Event()
+        self._thread = None
+        os.makedirs(directory, exist_ok=True)
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def load(self) -> Dict[str, Dict]:
+        """Restore the state from the snapshot and log, then start the writer thread"""
+        started = time.perf_counter()
+        snapshot_path = os.path.join(self.directory, SNAPSHOT_FILE)
+        if os.path.exists(snapshot_path):
+            with open(snapshot_path, "rb") as f:
+                snapshot = loads(f.read())
+            self.seq = self._applied_seq = snapshot["seq"]
+            self._state = snapshot["devices"]
+
+        log_path = os.path.join(self.directory, LOG_FILE)
+        valid_end = 0
+        if os.path.exists(log_path):
+            with open(log_path, "rb") as f:
+                for line in f:
+                    # A write cut short by a crash, even one that parses, is dropped with everything after it
+                    if not line.endswith(b"\n"):
+                        break
+                    try:
+                        record = loads(line)
+                    except ValueError:
+                        break
+                    valid_end += len(line)
+                    self._log_records += 1
+                    # Records already in the snapshot remain if a crash hit between snapshot and new log
+                    if record["seq"] > self.seq:
+                        self.seq = self._applied_seq = record["seq"]
+                        self._apply(record)
+        self._log = open(log_path, "ab")
+        self._log.truncate(valid_end)
+        self.restore_seconds = time.perf_counter() - started
+
+        self._thread = threading.Thread(target=self._run, name="status-store", daemon=True)
+        self._thread.start()
+        # The server works on its own copy; the writer thread keeps this one
+        return {device_id: dict(status) for device_id, status in self._state.items()}
+
+    def record(self, device_id: str, changes: Dict):
+        """Queue a change for the log; costs one serialization, no I/O"""
+        with self._lock:
+            self.seq += 1
+            self._pending.append(dumps({"seq": self.seq, "id": device_id, "set": changes}))
+
+    def record_many(self, device_ids: List[str], changes: Dict):
+        """Queue one change applied to many devices as a single record"""
+        with self._lock:
+            self.seq += 1
+            self._pending.append(dumps({"seq": self.seq, "ids": device_ids, "set": changes}))
+
+    def flush(self):
+        """Append and fsync the pending records, and snapshot when the log is long enough"""
+        with self._lock:
+            records, self._pending = self._pending, []
+        if records:
+            end = os.fstat(self._log.fileno()).st_size
+            try:
+                self._log.write(b"\n".join(records) + b"\n")
+                self._log.flush()
+                os.fsync(self._log.fileno())
+            except OSError:
+                # Drop any partial write and keep the records queued for the next attempt
+                self._log.truncate(end)
+                with self._lock:
+                    self._pending[:0] = records
+                raise
+            self.flushes += 1
+            for line in records:
+                record = loads(line)
+                self._apply(record)
+                self._applied_seq = record["seq"]
+            self._log_records += len(records)
+        if self._log_records >= self.snapshot_records:
+            self._snapshot()
+
+    def _apply(self, record: Dict):
+        for device_id in record["ids"] if "ids" in record else (record["id"],):
+            self._state.setdefault(device_id, {}).update(record["set"])
+
+    def _snapshot(self):
+        path = os.path.join(self.directory, SNAPSHOT_FILE)
+        with open(path + ".tmp", "wb") as f:
+            f.write(dumps({"seq": self._applied_seq, "devices": self._state}))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        _fsync_directory(self.directory)
+        # Only now that the snapshot is durable can the log be emptied
+        self._log.truncate(0)
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        self._log_records = 0
+        self.snapshots += 1
+
+    def _run(self):
+        while not self._closed.wait(self.flush_seconds):
+            try:
+                self.flush()
+            except OSError as e:
+                # Keep the server up; the records stay queued for the next attempt
+                print(f"Status store flush failed: {e}")
+
+    def close(self):
+        """Stop the writer thread and make every recorded change durable"""
+        self._closed.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._log is not None:
+            self.flush()
+            self._log.close()
+            self._log = None
+
+    def stats(self) -> Dict:
+        return {
+            "seq": self.seq,
+            "pending": self.pending,
+            "log_records": self._log_records,
+            "flushes": self.flushes,
+            "snapshots": self.snapshots,
+            "restore_seconds": self.restore_seconds
+        }
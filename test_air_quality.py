@@ -2,6 +2,7 @@ import requests
 import json
 import time
 from datetime import datetime
+from air_quality_scenarios import SCENARIOS as scenarios
 
 BASE_URL = "http://127.0.0.1:8000"
 
@@ -27,58 +28,6 @@ def test_air_quality_scenario(scenario_name, data):
     except Exception as e:
         print(f"Error: {str(e)}")
 
-# Test Scenarios
-scenarios = {
-    "Good Air Quality": {
-        "pm25": 10.0,
-        "pm10": 20.0,
-        "no2": 15.0,
-        "so2": 10.0,
-        "co": 0.5,
-        "o3": 20.0,
-        "temperature": 22.0,
-        "humidity": 50.0,
-        "wind_speed": 5.0,
-        "traffic_density": 0.2
-    },
-    "Moderate Pollution": {
-        "pm25": 35.0,
-        "pm10": 75.0,
-        "no2": 45.0,
-        "so2": 30.0,
-        "co": 1.2,
-        "o3": 45.0,
-        "temperature": 25.0,
-        "humidity": 60.0,
-        "wind_speed": 3.0,
-        "traffic_density": 0.5
-    },
-    "Heavy Pollution": {
-        "pm25": 150.0,
-        "pm10": 250.0,
-        "no2": 120.0,
-        "so2": 75.0,
-        "co": 4.5,
-        "o3": 90.0,
-        "temperature": 30.0,
-        "humidity": 70.0,
-        "wind_speed": 1.5,
-        "traffic_density": 0.8
-    },
-    "Critical Pollution": {
-        "pm25": 300.0,
-        "pm10": 450.0,
-        "no2": 200.0,
-        "so2": 150.0,
-        "co": 9.0,
-        "o3": 180.0,
-        "temperature": 35.0,
-        "humidity": 80.0,
-        "wind_speed": 1.0,
-        "traffic_density": 0.9
-    }
-}
-
 if __name__ == "__main__":
     print("Starting Air Quality Scenario Tests")
     print("=" * 50)
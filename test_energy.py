@@ -0,0 +1,111 @@
+import sys
+import time
+import numpy as np
+from energy import DEFAULT_MAX_GAP_SECONDS, DeviceLedger, EnergyLedger
+
+def brute_force_integral(readings, t: float, max_gap: float = DEFAULT_MAX_GAP_SECONDS) -> float:
+    """Trapezoidal power-level-seconds up to t, summed segment by segment over the sorted readings"""
+    readings = sorted(readings, key=lambda reading: reading[0])
+    total = 0.0
+    for (e0, p0), (e1, p1) in zip(readings, readings[1:]):
+        if e0 >= t:
+            break
+        if e1 - e0 > max_gap:
+            continue
+        if e1 <= t:
+            total += (p0 + p1) * 0.5 * (e1 - e0)
+        else:
+            p_t = p0 + (p1 - p0) * (t - e0) / (e1 - e0)
+            total += (p0 + p_t) * 0.5 * (t - e0)
+    return total
+
+def readings_with_late(rng, n: int, late_share: float):
+    """Readings every ~30 s with gaps, a share of them delivered late"""
+    epochs = np.cumsum(rng.exponential(30, n)) + 1_700_000_000
+    gaps = rng.random(n) < 0.005
+    epochs += np.cumsum(gaps * 1200.0)
+    levels = np.round(rng.uniform(0, 1, n), 2)
+    order = np.arange(n, dtype=np.float64)
+    late = rng.random(n) < late_share
+    order[late] += rng.uniform(1, 200, late.sum())
+    arrival = np.argsort(order, kind="stable")
+    duplicates = rng.choice(n, n // 100)
+    epochs[duplicates[duplicates > 0]] = epochs[duplicates[duplicates > 0] - 1]
+    return [(float(epochs[i]), float(levels[i])) for i in arrival]
+
+def check(ledger: DeviceLedger, readings, rng, queries: int = 300):
+    epochs = [epoch for epoch, _ in readings]
+    for t in rng.uniform(min(epochs) - 60, max(epochs) + 60, queries):
+        expected = brute_force_integral(readings, t)
+        assert abs(ledger.integral(t) - expected) <= 1e-6 * max(1.0, abs(expected)), \
+            f"integral({t}) = {ledger.integral(t)}, brute force {expected}"
+
+def test_trapezoid_totals():
+    """Ledger integrals against a brute-force trapezoid sum, with late readings"""
+    print("\n1. Testing Trapezoid Totals Against Brute Force...")
+
+    rng = np.random.default_rng(7)
+    for late_share in (0.0, 0.1, 0.5):
+        readings = readings_with_late(rng, 2000, late_share)
+
+        one_by_one = DeviceLedger()
+        for epoch, level in readings:
+            one_by_one.record(epoch, level)
+        check(one_by_one, readings, rng)
+
+        # Batches, with queries between them so merges land on partly settled ledgers
+        batched = DeviceLedger()
+        for start in range(0, len(readings), 250):
+            batch = readings[start:start + 250]
+            batched.record_many([epoch for epoch, _ in batch], [level for _, level in batch])
+            check(batched, readings[:start + 250], rng, queries=20)
+        assert batched.epochs == one_by_one.epochs and batched.levels == one_by_one.levels
+        print(f"{late_share:.0%} late: totals match")
+
+def test_fleet_totals():
+    """EnergyLedger.record_many over interleaved devices against per-device brute force"""
+    print("\n2. Testing Fleet Batches...")
+
+    rng = np.random.default_rng(11)
+    devices = {f"purifier-{i:02d}": readings_with_late(rng, 500, 0.2) for i in range(5)}
+    # Interleave the devices, each keeping its own arrival order
+    rows = sorted((key, device_id, epoch, level) for device_id, readings in devices.items()
+                  for key, (epoch, level) in zip(np.sort(rng.random(len(readings))), readings))
+    rows = [row[1:] for row in rows]
+    ledger = EnergyLedger()
+    for start in range(0, len(rows), 400):
+        batch = rows[start:start + 400]
+        ledger.record_many(*zip(*batch))
+    for device_id, readings in devices.items():
+        check(ledger.devices[device_id], readings, rng, queries=50)
+    print("Per-device totals match")
+
+def test_late_burst():
+    """A burst of late readings costs one merge, not one rebuild per reading"""
+    print("\n3. Testing Late Burst...")
+
+    ledger = DeviceLedger()
+    n = 200_000
+    ledger.record_many(np.arange(n, dtype=np.float64) * 10, np.full(n, 0.5))
+    late = np.arange(n // 2, dtype=np.float64) * 10 + 5
+    started = time.perf_counter()
+    ledger.record_many(late, np.full(len(late), 0.5))
+    elapsed = time.perf_counter() - started
+    print(f"Merged {len(late)} late readings into {n} in {elapsed:.3f} s")
+    assert abs(ledger.integral(n * 10) - (n - 1) * 10 * 0.5) < 1e-3
+    assert elapsed < 5, "Late burst took too long"
+
+if __name__ == "__main__":
+    print("Starting Energy Ledger Tests...")
+    print("=" * 50)
+
+    try:
+        test_trapezoid_totals()
+        test_fleet_totals()
+        test_late_burst()
+
+        print("\nAll tests completed successfully!")
+        print("=" * 50)
+    except Exception as e:
+        print(f"\nError during testing: {str(e)}")
+        sys.exit(1)
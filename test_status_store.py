@@ -0,0 +1,140 @@
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+from status_store import LOG_FILE, SNAPSHOT_FILE, StatusStore
+
+# Runs in a child process: records statuses, flushes some of them, then dies
+# with SIGKILL so nothing after the last flush reaches the disk
+WRITER = """
+import json, os, signal, sys
+from status_store import StatusStore
+
+directory, devices, updates, snapshot_records = sys.argv[1], int(sys.argv[2]), int(sys.argv[3]), int(sys.argv[4])
+store = StatusStore(directory, flush_seconds=3600, snapshot_records=snapshot_records)
+expected = store.load()
+for i in range(updates):
+    device_id = f"purifier-{i % devices:04d}"
+    changes = {"power_level": round((i % 100) / 100, 2), "mode": ("auto", "manual", "sleep")[i % 3]}
+    if i % 50 == 49:
+        ids = [f"purifier-{j:04d}" for j in range(0, devices, 7)]
+        store.record_many(ids, {"fan_speed": i % 5})
+        for device_id in ids:
+            expected.setdefault(device_id, {})["fan_speed"] = i % 5
+    else:
+        store.record(device_id, changes)
+        expected.setdefault(device_id, {}).update(changes)
+    if i % 1000 == 999:
+        store.flush()
+store.flush()
+print(json.dumps(expected), flush=True)
+
+# Never flushed: lost with the process
+for i in range(100):
+    store.record(f"purifier-{i:04d}", {"power_level": 0.0})
+os.kill(os.getpid(), signal.SIGKILL)
+"""
+
+def run_writer(directory: str, devices: int = 200, updates: int = 5000, snapshot_records: int = 100000) -> dict:
+    """Run the writer until it kills itself, and return the status it had made durable"""
+    process = subprocess.run(
+        [sys.executable, "-c", WRITER, directory, str(devices), str(updates), str(snapshot_records)],
+        capture_output=True, text=True, cwd=os.path.dirname(os.path.abspath(__file__)),
+        env={**os.environ, "PYTHONPATH": os.path.dirname(os.path.abspath(__file__))}
+    )
+    assert process.returncode == -signal.SIGKILL, f"Writer exited with {process.returncode}: {process.stderr}"
+    return json.loads(process.stdout)
+
+def reload(directory: str) -> dict:
+    store = StatusStore(directory, flush_seconds=3600)
+    state = store.load()
+    print(f"Restored {len(state)} purifiers in {store.restore_seconds * 1000:.1f} ms "
+          f"(seq {store.seq}, {store.stats()['log_records']} log records)")
+    store.close()
+    return state
+
+def test_log_replay():
+    """Kill the writer after a flush and replay the log"""
+    print("\n1. Testing Log Replay After SIGKILL...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        expected = run_writer(directory)
+        assert not os.path.exists(os.path.join(directory, SNAPSHOT_FILE))
+        assert reload(directory) == expected
+    print("Restored status matches")
+
+def test_torn_write():
+    """A record cut short by the crash is dropped, and the log stays appendable"""
+    print("\n2. Testing Torn Last Record...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        expected = run_writer(directory)
+        log_path = os.path.join(directory, LOG_FILE)
+        size = os.path.getsize(log_path)
+        with open(log_path, "ab") as f:
+            f.write(b'{"seq": 999999, "id": "purifier-0000", "se')
+        assert reload(directory) == expected
+        assert os.path.getsize(log_path) == size, "Torn record was not truncated"
+
+        # Records written after the truncation replay too
+        store = StatusStore(directory, flush_seconds=3600)
+        store.load()
+        store.record("purifier-0000", {"mode": "turbo"})
+        store.close()
+        expected["purifier-0000"]["mode"] = "turbo"
+        assert reload(directory) == expected
+    print("Torn record dropped, later records replayed")
+
+def test_unterminated_record():
+    """A last record that parses but lacks its newline is dropped, so later appends start on a new line"""
+    print("\n3. Testing Unterminated Last Record...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        expected = run_writer(directory)
+        log_path = os.path.join(directory, LOG_FILE)
+        size = os.path.getsize(log_path)
+        with open(log_path, "ab") as f:
+            f.write(b'{"seq": 999999, "id": "purifier-0000", "set": {"mode": "lost"}}')
+        assert reload(directory) == expected
+        assert os.path.getsize(log_path) == size, "Unterminated record was not truncated"
+
+        store = StatusStore(directory, flush_seconds=3600)
+        store.load()
+        store.record("purifier-0001", {"mode": "turbo"})
+        store.close()
+        expected["purifier-0001"]["mode"] = "turbo"
+        assert reload(directory) == expected
+    print("Unterminated record dropped, earlier and later records replayed")
+
+def test_snapshot_and_tail():
+    """Compaction into a snapshot, then replay of the log tail after it"""
+    print("\n4. Testing Snapshot Plus Log Tail...")
+
+    with tempfile.TemporaryDirectory() as directory:
+        expected = run_writer(directory, snapshot_records=2000)
+        assert os.path.exists(os.path.join(directory, SNAPSHOT_FILE)), "No snapshot was written"
+        assert os.path.getsize(os.path.join(directory, LOG_FILE)) > 0, "No log tail after the snapshot"
+        assert reload(directory) == expected
+
+        # A second crashing run on top of the restored state
+        expected = run_writer(directory, updates=3000, snapshot_records=2000)
+        assert reload(directory) == expected
+    print("Snapshot and log tail restored")
+
+if __name__ == "__main__":
+    print("Starting Status Store Tests...")
+    print("=" * 50)
+
+    try:
+        test_log_replay()
+        test_torn_write()
+        test_unterminated_record()
+        test_snapshot_and_tail()
+
+        print("\nAll tests completed successfully!")
+        print("=" * 50)
+    except Exception as e:
+        print(f"\nError during testing: {str(e)}")
+        sys.exit(1)
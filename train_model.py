@@ -0,0 +1,260 @@
+import argparse
+import os
+import resource
+import sys
+import time
+from typing import Dict, Iterator, List, Tuple
+import joblib
+import numpy as np
+import pandas as pd
+from sklearn.ensemble import RandomForestRegressor
+from sklearn.linear_model import SGDRegressor
+from sklearn.preprocessing import StandardScaler
+from air_quality_model import MODEL_PATH, SCALER_PATH
+from aqi_engine import compute_aqi
+from history_archive import segment_paths
+from history_export import SENSOR_FIELDS, npz_to_columns
+
+DEFAULT_CHUNK_ROWS = 100_000
+
+# Target computed from the sensor columns with the EPA breakpoint tables
+EPA_TARGET = "epa"
+
+STRATEGIES = ("forest", "sgd")
+
+def training_files(paths: List[str]) -> List[str]:
+    """Expand HISTORY_ARCHIVE_DIR directories into their segments; files are kept as given"""
+    files = []
+    for path in paths:
+        files.extend(segment_paths(path) if os.path.isdir(path) else [path])
+    return files
+
+def _iter_frames(path: str, chunk_rows: int, columns: List[str]) -> Iterator[Dict[str, np.ndarray]]:
+    """Column chunks of one file with at most `chunk_rows` rows each"""
+    if path.endswith(".csv") or path.endswith(".csv.gz"):
+        for chunk in pd.read_csv(path, usecols=columns, chunksize=chunk_rows):
+            yield {name: chunk[name].to_numpy() for name in columns}
+    elif path.endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValueError(f"Reading {path} needs pyarrow (pip install pyarrow)")
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_rows, columns=columns):
+            yield {name: batch.column(name).to_numpy(zero_copy_only=False) for name in columns}
+    elif path.endswith(".npz"):
+        # Export and archive files are bounded in size; slice them into chunks
+        with open(path, "rb") as f:
+            data = npz_to_columns(f.read())
+        n = len(data[columns[0]])
+        for i in range(0, n, chunk_rows):
+            yield {name: data[name][i:i + chunk_rows] for name in columns}
+    else:
+        raise ValueError(f"Unsupported training file {path}, expected .csv, .parquet or .npz")
+
+def iter_chunks(paths: List[str], target: str = "aqi_value",
+                chunk_rows: int = DEFAULT_CHUNK_ROWS) -> Iterator[Tuple[np.ndarray, np.ndarray]]:
+    """Stream (features (n, 10), target (n,)) chunks from recorded readings
+
+    `target` is a column name, or "epa" to compute the AQI from the sensor
+    columns. Rows with a missing or non-finite value are skipped.
+    """
+    columns = SENSOR_FIELDS + ([] if target == EPA_TARGET else [target])
+    for path in training_files(paths):
+        for data in _iter_frames(path, chunk_rows, columns):
+            features = np.column_stack([np.asarray(data[field], dtype=np.float64) for field in SENSOR_FIELDS])
+            y = compute_aqi(features) if target == EPA_TARGET else np.asarray(data[target], dtype=np.float64)
+            valid = np.isfinite(features).all(axis=1) & np.isfinite(y)
+            if not valid.all():
+                features, y = features[valid], y[valid]
+            if len(y):
+                yield features, y
+
+def holdout_mask(chunk_index: int, n: int, fraction: float, seed: int) -> np.ndarray:
+    """Rows of a chunk held out for validation; the same rows on every pass"""
+    return np.random.default_rng([seed, chunk_index]).random(n) < fraction
+
+def peak_memory_mb() -> float:
+    """Peak resident memory of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+class PassStats:
+    """Rows and seconds of each pass over the data"""
+    def __init__(self):
+        self.passes = []
+
+    def run(self, name: str, chunks: Iterator) -> Iterator:
+        start, rows = time.perf_counter(), 0
+        for chunk in chunks:
+            rows += len(chunk[1])
+            yield chunk
+        elapsed = time.perf_counter() - start
+        self.passes.append({"name": name, "rows": rows, "seconds": elapsed,
+                            "rows_per_second": rows / elapsed if elapsed > 0 else float("inf")})
+        print(f"  {name}: {rows} rows in {elapsed:.1f} s ({rows / max(elapsed, 1e-9):,.0f} rows/s), "
+              f"peak RSS {peak_memory_mb():.0f} MB")
+
+def fit_scaler(chunks, holdout: float, seed: int) -> Tuple[StandardScaler, int]:
+    """Scaler statistics accumulated chunk by chunk (StandardScaler.partial_fit)"""
+    scaler = StandardScaler()
+    train_rows = 0
+    for i, (features, _) in enumerate(chunks):
+        train = ~holdout_mask(i, len(features), holdout, seed)
+        if train.any():
+            scaler.partial_fit(features[train])
+            train_rows += int(train.sum())
+    if not train_rows:
+        raise ValueError("No training rows in the given files")
+    return scaler, train_rows
+
+def sample_pass(chunks, rows: int, train_rows: int, holdout: float, seed: int, pass_index: int):
+    """Bernoulli sample of about `rows` training rows, drawn in one pass into a preallocated buffer"""
+    p = min(1.0, rows / train_rows)
+    capacity = min(train_rows, int(rows * 1.05) + 1000)
+    features = np.empty((capacity, len(SENSOR_FIELDS)))
+    y = np.empty(capacity)
+    filled = 0
+    rng = np.random.default_rng([seed, 1_000_000 + pass_index])
+    for i, (chunk_features, chunk_y) in enumerate(chunks):
+        keep = ~holdout_mask(i, len(chunk_y), holdout, seed) & (rng.random(len(chunk_y)) < p)
+        take = min(int(keep.sum()), capacity - filled)
+        features[filled:filled + take] = chunk_features[keep][:take]
+        y[filled:filled + take] = chunk_y[keep][:take]
+        filled += take
+    return features[:filled], y[:filled]
+
+def train_forest(source, scaler: StandardScaler, train_rows: int, stats: PassStats, n_estimators: int = 100,
+                 trees_per_pass: int = 10, sample_rows: int = 200_000, max_depth: int = 10,
+                 holdout: float = 0.05, seed: int = 42) -> RandomForestRegressor:
+    """Random forest where each group of trees is fit on its own random sample of the data
+
+    Every pass draws a fresh sample of `sample_rows` rows and adds
+    `trees_per_pass` bootstrapped trees to the forest (warm start), so memory
+    is bounded by one sample while the forest as a whole sees the full dataset.
+    """
+    model = RandomForestRegressor(n_estimators=0, max_depth=max_depth, random_state=seed,
+                                  warm_start=True, n_jobs=-1)
+    for pass_index in range(0, -(-n_estimators // trees_per_pass)):
+        features, y = sample_pass(stats.run(f"trees pass {pass_index + 1}", source()), sample_rows,
+                                  train_rows, holdout, seed, pass_index)
+        model.set_params(n_estimators=min(n_estimators, model.n_estimators + trees_per_pass))
+        model.fit(scaler.transform(features), y)
+        del features, y
+    model.set_params(warm_start=False)
+    return model
+
+def train_sgd(source, scaler: StandardScaler, stats: PassStats, epochs: int = 5,
+              holdout: float = 0.05, seed: int = 42) -> SGDRegressor:
+    """Linear model fit incrementally with SGDRegressor.partial_fit over every chunk"""
+    model = SGDRegressor(random_state=seed)
+    for epoch in range(epochs):
+        for i, (features, y) in enumerate(stats.run(f"sgd epoch {epoch + 1}", source())):
+            train = ~holdout_mask(i, len(y), holdout, seed)
+            if train.any():
+                model.partial_fit(scaler.transform(features[train]), y[train])
+    return model
+
+def evaluate(chunks, model, scaler: StandardScaler, holdout: float, seed: int) -> Dict:
+    """Mean absolute error and RMSE on the held-out rows"""
+    count, abs_sum, sq_sum = 0, 0.0, 0.0
+    for i, (features, y) in enumerate(chunks):
+        held = holdout_mask(i, len(y), holdout, seed)
+        if held.any():
+            error = np.clip(model.predict(scaler.transform(features[held])), 0, 500) - y[held]
+            count += len(error)
+            abs_sum += float(np.abs(error).sum())
+            sq_sum += float((error ** 2).sum())
+    if not count:
+        return {"rows": 0, "mae": float("nan"), "rmse": float("nan")}
+    return {"rows": count, "mae": abs_sum / count, "rmse": (sq_sum / count) ** 0.5}
+
+def train(paths: List[str], target: str = "aqi_value", strategy: str = "forest",
+          chunk_rows: int = DEFAULT_CHUNK_ROWS, holdout: float = 0.05, seed: int = 42,
+          **options) -> Dict:
+    """Out-of-core training run; returns the fitted model and scaler with per-pass statistics"""
+    if strategy not in STRATEGIES:
+        raise ValueError(f"Invalid strategy '{strategy}', expected one of {list(STRATEGIES)}")
+    started = time.perf_counter()
+    stats = PassStats()
+
+    def source():
+        return iter_chunks(paths, target, chunk_rows)
+
+    scaler, train_rows = fit_scaler(stats.run("scaler", source()), holdout, seed)
+    if strategy == "forest":
+        model = train_forest(source, scaler, train_rows, stats, holdout=holdout, seed=seed, **options)
+    else:
+        model = train_sgd(source, scaler, stats, holdout=holdout, seed=seed, **options)
+    validation = evaluate(stats.run("validation", source()), model, scaler, holdout, seed)
+    return {
+        "model": model,
+        "scaler": scaler,
+        "train_rows": train_rows,
+        "validation": validation,
+        "passes": stats.passes,
+        "seconds": time.perf_counter() - started,
+        "peak_memory_mb": peak_memory_mb()
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the AQI model out of core from recorded readings")
+    parser.add_argument("paths", nargs="+",
+                        help="CSV, Parquet or NPZ files, or HISTORY_ARCHIVE_DIR directories")
+    parser.add_argument("--target", default="aqi_value",
+                        help="Target column, or 'epa' to compute the AQI from the sensor columns")
+    parser.add_argument("--strategy", choices=STRATEGIES, default="forest",
+                        help="forest: sampled-per-pass random forest; sgd: incremental linear model")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS)
+    parser.add_argument("--holdout", type=float, default=0.05, help="Share of rows held out for validation")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--trees", type=int, default=100, help="forest: number of trees")
+    parser.add_argument("--trees-per-pass", type=int, default=10, help="forest: trees fit per data pass")
+    parser.add_argument("--sample-rows", type=int, default=200_000, help="forest: rows sampled per pass")
+    parser.add_argument("--max-depth", type=int, default=10, help="forest: tree depth")
+    parser.add_argument("--epochs", type=int, default=5, help="sgd: passes over the data")
+    parser.add_argument("--model-out", default=MODEL_PATH)
+    parser.add_argument("--scaler-out", default=SCALER_PATH)
+    parser.add_argument("--gate", action="store_true",
+                        help="Only replace the model if it passes model_gate.py against the stored baseline")
+    args = parser.parse_args()
+    if args.gate:
+        from model_gate import BASELINE_PATH
+        if not os.path.exists(BASELINE_PATH):
+            parser.error(f"--gate needs a baseline at {BASELINE_PATH}; store one with model_gate.py --update-baseline")
+
+    if args.strategy == "forest":
+        options = dict(n_estimators=args.trees, trees_per_pass=args.trees_per_pass,
+                       sample_rows=args.sample_rows, max_depth=args.max_depth)
+    else:
+        options = dict(epochs=args.epochs)
+    print(f"Training {args.strategy} model on {len(training_files(args.paths))} file(s)...")
+    result = train(args.paths, args.target, args.strategy, args.chunk_rows, args.holdout, args.seed, **options)
+
+    # A gated model is written beside the current one until it has passed
+    model_out, scaler_out = args.model_out, args.scaler_out
+    if args.gate:
+        model_out, scaler_out = model_out + ".candidate", scaler_out + ".candidate"
+    joblib.dump(result["model"], model_out)
+    joblib.dump(result["scaler"], scaler_out)
+    rows = sum(p["rows"] for p in result["passes"])
+    validation = result["validation"]
+    print("\nTraining Report")
+    print("=" * 50)
+    print(f"Training rows: {result['train_rows']}")
+    print(f"Passes over the data: {len(result['passes'])} ({rows} rows read)")
+    print(f"Throughput: {rows / result['seconds']:,.0f} rows/s over {result['seconds']:.1f} s")
+    print(f"Peak memory: {result['peak_memory_mb']:.0f} MB")
+    print(f"Validation: MAE {validation['mae']:.2f}, RMSE {validation['rmse']:.2f} on {validation['rows']} rows")
+    if args.gate:
+        from model_gate import gate
+        print("\nModel gate")
+        print("=" * 50)
+        if not gate(model_out, scaler_out):
+            sys.exit(f"Kept the candidate as {model_out} and {scaler_out}; the current model was not replaced")
+        os.replace(model_out, args.model_out)
+        os.replace(scaler_out, args.scaler_out)
+    print(f"Saved model to {args.model_out} and scaler to {args.scaler_out}; restart the server to load them")
+
+if __name__ == "__main__":
+    main()
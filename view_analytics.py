@@ -1,28 +1,35 @@
-import requests
-import pandas as pd
-import plotly.graph_objects as go
+import sys
 from plotly.subplots import make_subplots
-from datetime import datetime
+from analytics_client import peak_windows
+from dashboards import DEFAULT_RENDER_MODE, line_trace, max_plot_points, time_values, values, write_dashboard
+from downsampling import downsample_frame
+from offline_analytics import add_derived_columns, history_metrics, load_frame
 
-def fetch_analytics():
-    """Fetch 24-hour analytics data from the API"""
-    response = requests.get("http://127.0.0.1:8000/analytics/daily")
-    return response.json()
+def fetch_analytics(paths=()):
+    """Load history files as a DataFrame, or fetch the last 24 hours from the API"""
+    return load_frame(list(paths))
 
-def create_analytics_dashboard(data):
-    """Create an interactive analytics dashboard"""
-    # Convert data to pandas DataFrame
-    df = pd.DataFrame(data)
-    df['timestamp'] = pd.to_datetime(df['timestamp'])
+def create_analytics_dashboard(df, metrics=None, render=DEFAULT_RENDER_MODE):
+    """Create an interactive analytics dashboard
+
+    `render` is "svg", "webgl" or "auto" (WebGL for long series).
+    """
+    if metrics is None:
+        metrics = history_metrics(add_derived_columns(df))
+    
+    # Plot a shape-preserving subset (LTTB) so long histories render quickly
+    plot_df = downsample_frame(df, max_plot_points(len(df), render))
+    timestamps = time_values(plot_df['timestamp'])
     
     # Create figure with secondary y-axis
     fig = make_subplots(specs=[[{"secondary_y": True}]])
     
     # Add AQI trace
     fig.add_trace(
-        go.Scatter(
-            x=df['timestamp'],
-            y=df['aqi_value'],
+        line_trace(
+            timestamps,
+            values(plot_df['aqi_value']),
+            render,
             name="Air Quality Index",
             line=dict(color="#1f77b4", width=2)
         ),
@@ -31,42 +38,34 @@ def create_analytics_dashboard(data):
     
     # Add Power Level trace
     fig.add_trace(
-        go.Scatter(
-            x=df['timestamp'],
-            y=[p * 100 for p in df['power_level']],  # Convert to percentage
+        line_trace(
+            timestamps,
+            values(plot_df['power_level'] * 100),  # Convert to percentage
+            render,
             name="Purifier Power Level (%)",
             line=dict(color="#d62728", width=2, dash='dash')
         ),
         secondary_y=True
     )
     
-    # Add shapes for time periods
-    fig.add_vrect(
-        x0=df['timestamp'].iloc[7],  # 7 AM
-        x1=df['timestamp'].iloc[10],  # 10 AM
-        fillcolor="yellow",
-        opacity=0.2,
-        layer="below",
-        line_width=0,
-        annotation_text="Morning Peak",
-        annotation_position="top left"
-    )
-    
-    fig.add_vrect(
-        x0=df['timestamp'].iloc[16],  # 4 PM
-        x1=df['timestamp'].iloc[19],  # 7 PM
-        fillcolor="yellow",
-        opacity=0.2,
-        layer="below",
-        line_width=0,
-        annotation_text="Evening Peak",
-        annotation_position="top left"
-    )
+    # Add shapes for the peak periods (7-11 AM and 4-8 PM on each day shown)
+    for peak_start, peak_end in peak_windows(df['timestamp']):
+        fig.add_vrect(
+            x0=peak_start,
+            x1=peak_end,
+            fillcolor="yellow",
+            opacity=0.2,
+            layer="below",
+            line_width=0,
+            annotation_text="Morning Peak" if peak_start.hour < 12 else "Evening Peak",
+            annotation_position="top left"
+        )
     
     # Update layout
     fig.update_layout(
         title="24-Hour Air Quality and Purifier Performance Analysis",
         xaxis_title="Time",
+        xaxis_type="date",
         yaxis_title="Air Quality Index",
         yaxis2_title="Power Level (%)",
         hovermode='x unified',
@@ -76,23 +75,19 @@ def create_analytics_dashboard(data):
     
     # Calculate key statistics
     stats = {
-        "Average AQI": df['aqi_value'].mean(),
-        "Max AQI": df['aqi_value'].max(),
-        "Min AQI": df['aqi_value'].min(),
-        "Average Power": df['power_level'].mean() * 100,
-        "Peak Hours Power": df.loc[
-            (df['timestamp'].dt.hour.isin(range(7, 11))) |
-            (df['timestamp'].dt.hour.isin(range(16, 20))),
-            'power_level'
-        ].mean() * 100
+        "Average AQI": metrics['avg_aqi'],
+        "Max AQI": metrics['max_aqi'],
+        "Min AQI": metrics['min_aqi'],
+        "Average Power": metrics['avg_power'] * 100,
+        "Peak Hours Power": metrics['peak_hours_avg_power'] * 100
     }
     
     return fig, stats
 
-def main():
+def main(paths=()):
     # Fetch data
     print("Fetching analytics data...")
-    data = fetch_analytics()
+    data = fetch_analytics(paths)
     
     # Create dashboard
     fig, stats = create_analytics_dashboard(data)
@@ -108,9 +103,9 @@ def main():
     
     # Save the plot as HTML
     output_file = "analytics_dashboard.html"
-    fig.write_html(output_file)
+    write_dashboard(fig, output_file)
     print(f"\nAnalytics dashboard saved to {output_file}")
     print("Open this file in your web browser to view the interactive visualization")
 
 if __name__ == "__main__":
-    main()
+    main(sys.argv[1:])